@@ -0,0 +1,102 @@
+"""Persistent, content-addressed cache of generated analyses.
+
+Entries live in a SQLite database keyed by `report.analysis_key`, store the
+report text zlib-compressed, expire after a per-entry TTL and are evicted
+least-recently-used first once the cache exceeds its size budget.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+CACHE_DIR = os.getenv('ARTRESTORER_CACHE_DIR', '.artrestorer_cache')
+DEFAULT_TTL = float(os.getenv('ARTRESTORER_CACHE_TTL', 7 * 24 * 3600))
+DEFAULT_MAX_BYTES = int(float(os.getenv('ARTRESTORER_CACHE_MAX_MB', 64)) * 1024 * 1024)
+
+
+class AnalysisCache:
+    """SQLite-backed LRU/TTL cache mapping analysis keys to report text."""
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL):
+        if path is None:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            path = os.path.join(CACHE_DIR, 'analyses.sqlite3')
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'writes': 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " key TEXT PRIMARY KEY,"
+            " body BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " expires REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS analyses_accessed ON analyses (accessed)")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached report for ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, expires FROM analyses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            body, expires = row
+            if expires <= now:
+                self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._conn.execute("UPDATE analyses SET accessed = ? WHERE key = ?", (now, key))
+            self.stats['hits'] += 1
+        return zlib.decompress(body).decode('utf-8')
+
+    def put(self, key: str, text: str, ttl: Optional[float] = None) -> None:
+        """Store ``text`` under ``key`` and evict entries over the size budget."""
+        body = zlib.compress(text.encode('utf-8'), 6)
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, body, size, created, expires, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, body, len(body), now, expires, now),
+            )
+            self.stats['writes'] += 1
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM analyses WHERE expires <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM analyses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM analyses ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM analyses WHERE key = ?", (key,))
+            total -= size
+            self.stats['evictions'] += 1
+
+    def metrics(self) -> Dict[str, float]:
+        """Hit/miss counters plus current entry count and stored bytes."""
+        with self._lock:
+            entries, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses"
+            ).fetchone()
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats, entries=entries, bytes=stored,
+                    hit_rate=self.stats['hits'] / lookups if lookups else 0.0)
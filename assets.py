@@ -0,0 +1,79 @@
+"""Minified, content-hashed stylesheet for the Streamlit app.
+
+The stylesheet sources are `assets/app.css` and `assets/report.css`, the
+latter holding the rules for rendered reports, which the HTML export inlines
+too. They are concatenated and minified once per process
+and written to `static/app.<hash>.css`, which Streamlit serves at
+``app/static/...`` when ``server.enableStaticServing`` is on. Pages then
+reference it with a single ``<link>`` tag, so browsers fetch it once and
+cache it, and a changed stylesheet gets a new URL.
+"""
+import glob
+import hashlib
+import os
+import re
+from typing import Optional, Sequence
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+REPORT_STYLESHEET = os.path.join(ROOT, 'assets', 'report.css')
+STYLESHEET_SOURCES = (os.path.join(ROOT, 'assets', 'app.css'), REPORT_STYLESHEET)
+# Streamlit serves the `static` directory next to the main script
+STATIC_DIR = os.path.join(ROOT, 'static')
+STATIC_URL = 'app/static'
+
+_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_SPACE = re.compile(r"\s+")
+_AROUND_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(css: str) -> str:
+    """Drop comments and redundant whitespace; the rules themselves are unchanged."""
+    css = _COMMENT.sub("", css)
+    css = _SPACE.sub(" ", css)
+    css = _AROUND_PUNCTUATION.sub(r"\1", css)
+    # Only after colons: a space before one is a descendant selector (`a :hover`)
+    css = css.replace(": ", ":").replace(";}", "}")
+    return css.strip()
+
+
+class Stylesheet:
+    """A minified stylesheet and, when it could be written, its static URL."""
+
+    def __init__(self, css: str, digest: str, url: Optional[str]):
+        self.css = css
+        self.digest = digest
+        self.url = url
+
+    def link_tag(self) -> str:
+        return f'<link rel="stylesheet" href="{self.url}">'
+
+    def style_tag(self) -> str:
+        return f"<style>{self.css}</style>"
+
+
+def read_css(path: str) -> str:
+    """The minified contents of one stylesheet."""
+    with open(path, encoding='utf-8') as fh:
+        return minify_css(fh.read())
+
+
+def build_stylesheet(sources: Sequence[str] = STYLESHEET_SOURCES, static_dir: str = STATIC_DIR) -> Stylesheet:
+    """Minify ``sources`` and publish them as ``<static_dir>/app.<hash>.css``, removing older builds."""
+    css = "".join(read_css(source) for source in sources)
+    digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+    filename = f"app.{digest}.css"
+    path = os.path.join(static_dir, filename)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(static_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                fh.write(css)
+            os.replace(tmp_path, path)
+        for stale in glob.glob(os.path.join(static_dir, 'app.*.css')):
+            if os.path.basename(stale) != filename:
+                os.remove(stale)
+    except OSError:
+        # Read-only deployment: the caller falls back to inlining the CSS
+        return Stylesheet(css, digest, None)
+    return Stylesheet(css, digest, f"{STATIC_URL}/{filename}")
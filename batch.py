@@ -0,0 +1,229 @@
+"""Bulk analysis of collection condition surveys.
+
+A survey is a CSV or JSONL file with the same fields as the Restoration
+Assistant form. Rows are analysed with bounded concurrency; every finished
+row is appended to a checkpoint file, so re-running the same survey after a
+crash resumes where it stopped. Rows that failed or fell back to the offline
+template are not checkpointed, so a resumed run tries them again. Results are packaged as JSONL, with each
+report both as text and as its structured ``analysis``, and as a ZIP of
+per-object reports with a throughput/latency summary.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from analysis_cache import CACHE_DIR
+from knowledge import resolve_feature
+
+BATCH_DIR = os.path.join(CACHE_DIR, 'batches')
+DEFAULT_CONCURRENCY = int(os.getenv('ARTRESTORER_BATCH_CONCURRENCY', 4))
+
+# Accepted column names for each analysis field
+FIELD_ALIASES = {
+    'object_id': ('object_id', 'id', 'object', 'accession', 'accession_number'),
+    'description': ('description', 'artwork_description', 'artwork description'),
+    'art_style': ('art_style', 'style', 'art style', 'period', 'style/period'),
+    'damage_type': ('damage_type', 'damage', 'damage type'),
+    'cultural_context': ('cultural_context', 'context', 'cultural context'),
+    'feature': ('feature', 'analysis_type', 'analysis type', 'feature_select'),
+    'temperature': ('temperature', 'creativity', 'creativity_level'),
+}
+
+# Returns the row's `report_model.Report` and its generation stats
+Analyzer = Callable[[Dict[str, Any]], Tuple[Any, Dict[str, Any]]]
+
+
+def _normalize_row(raw: Dict[str, Any], number: int) -> Dict[str, Any]:
+    lowered = {str(k).strip().lower(): v for k, v in raw.items() if k is not None}
+    row: Dict[str, Any] = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            value = lowered.get(alias)
+            if value not in (None, ""):
+                row[field] = value.strip() if isinstance(value, str) else value
+                break
+    if not row.get('description'):
+        raise ValueError(f"row {number}: a description is required")
+    try:
+        row['temperature'] = min(max(float(row.get('temperature', 0.6)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        raise ValueError(f"row {number}: temperature must be a number between 0 and 1")
+    row['feature'] = resolve_feature(row.get('feature'))
+    row['object_id'] = str(row.get('object_id') or f"object-{number:05d}")
+    return row
+
+
+def read_rows(data: bytes, filename: str) -> List[Dict[str, Any]]:
+    """Parse a CSV or JSONL survey into normalized analysis requests."""
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        raw_rows = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip():
+                raw = json.loads(line)
+                if not isinstance(raw, dict):
+                    raise ValueError(f"line {number}: expected an object")
+                raw_rows.append(raw)
+    else:
+        raw_rows = list(csv.DictReader(io.StringIO(text)))
+    return [_normalize_row(raw, number) for number, raw in enumerate(raw_rows, start=1)]
+
+
+def batch_id(data: bytes) -> str:
+    """Identity of a survey file; the same file resumes the same checkpoint."""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+# Ids of the batches being run in this process; a survey runs once at a time
+_RUNNING = set()
+_RUNNING_LOCK = threading.Lock()
+
+
+def _finished(record: Dict[str, Any]) -> bool:
+    # Failed and offline-template rows are redone when the survey is resumed
+    return not record['error'] and record['source'] != 'template'
+
+
+class BatchRun:
+    """One survey being analysed, resumable from its checkpoint file."""
+
+    def __init__(self, rows: List[Dict[str, Any]], run_id: str, directory: str = BATCH_DIR):
+        self.rows = rows
+        self.id = run_id
+        self.directory = os.path.join(directory, run_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.checkpoint_path = os.path.join(self.directory, 'checkpoint.jsonl')
+        self.results: Dict[int, Dict[str, Any]] = self._load_checkpoint()
+        self.resumed = len(self.results)
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _load_checkpoint(self) -> Dict[int, Dict[str, Any]]:
+        results = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as fh:
+                for line in fh:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash; the row is simply redone
+                        continue
+                    if _finished(record):
+                        results[record['row']] = record
+        return results
+
+    def _checkpoint(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self.results[record['row']] = record
+            if not _finished(record):
+                return
+            with open(self.checkpoint_path, 'a', encoding='utf-8') as fh:
+                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+                fh.flush()
+                os.fsync(fh.fileno())
+
+    @property
+    def done(self) -> int:
+        return len(self.results)
+
+    def run(self, analyze: Analyzer, concurrency: int = DEFAULT_CONCURRENCY,
+            on_progress: Optional[Callable[['BatchRun'], None]] = None) -> Dict[str, Any]:
+        """Analyse every row not yet checkpointed and return the summary.
+
+        Raises RuntimeError if the same survey is already being run in this process.
+        """
+        with _RUNNING_LOCK:
+            if self.id in _RUNNING:
+                raise RuntimeError(f"batch {self.id} is already running")
+            _RUNNING.add(self.id)
+        try:
+            return self._run(analyze, concurrency, on_progress)
+        finally:
+            with _RUNNING_LOCK:
+                _RUNNING.discard(self.id)
+
+    def _run(self, analyze: Analyzer, concurrency: int,
+             on_progress: Optional[Callable[['BatchRun'], None]]) -> Dict[str, Any]:
+        self.started = time.time()
+        todo = [index for index in range(len(self.rows)) if index not in self.results]
+
+        def work(index: int) -> Dict[str, Any]:
+            row = self.rows[index]
+            started = time.perf_counter()
+            try:
+                report, stats = analyze(row)
+                text, analysis, error = report.to_text(), report.to_dict(), None
+            except Exception as exc:
+                text, analysis, stats, error = "", None, {}, str(exc)
+            return {
+                'row': index,
+                'object_id': row['object_id'],
+                'input': row,
+                'report': text,
+                'analysis': analysis,
+                'source': stats.get('source'),
+                'latency': time.perf_counter() - started,
+                'error': error,
+            }
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"batch-{self.id}") as pool:
+            for future in as_completed([pool.submit(work, index) for index in todo]):
+                self._checkpoint(future.result())
+                if on_progress is not None:
+                    on_progress(self)
+        self.finished = time.time()
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        """Throughput of this run and per-object latency percentiles."""
+        latencies = [r['latency'] for r in self.results.values() if not r['error']]
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        processed = self.done - self.resumed
+        failed = sum(1 for r in self.results.values() if r['error'])
+        return {
+            'batch_id': self.id,
+            'objects': len(self.rows),
+            # Rows with a report, and rows whose analysis raised; together they are every processed row
+            'completed': self.done - failed,
+            'resumed_from_checkpoint': self.resumed,
+            'failed': failed,
+            'elapsed_seconds': round(elapsed, 3),
+            'objects_per_minute': round(processed / elapsed * 60, 2) if elapsed else 0.0,
+            'latency_p50': round(_percentile(latencies, 0.50), 3),
+            'latency_p95': round(_percentile(latencies, 0.95), 3),
+            'latency_max': round(max(latencies), 3) if latencies else 0.0,
+        }
+
+    def to_jsonl(self) -> bytes:
+        """All results in row order, one JSON object per line."""
+        lines = [json.dumps(self.results[i], ensure_ascii=False) for i in sorted(self.results)]
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+    def to_zip(self) -> bytes:
+        """Per-object text reports plus results.jsonl and summary.json."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index in sorted(self.results):
+                record = self.results[index]
+                safe_id = re.sub(r"[^A-Za-z0-9._-]+", "_", record['object_id'])
+                body = record['report'] if not record['error'] else f"Analysis failed: {record['error']}\n"
+                archive.writestr(f"reports/{index + 1:05d}_{safe_id}.txt", body)
+            archive.writestr('results.jsonl', self.to_jsonl())
+            archive.writestr('summary.json', json.dumps(self.summary(), indent=2))
+        return buffer.getvalue()
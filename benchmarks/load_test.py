@@ -0,0 +1,327 @@
+"""Multi-session load test for the ArtRestorer AI Streamlit app.
+
+Drives N concurrent simulated sessions in one process with Streamlit's
+app-testing harness, so they share every `st.cache_resource` singleton
+exactly as browser sessions on one server do. Each session walks the real
+flow (landing, welcome, main, generate, results) and then opens and works
+the Cost Calculator and Feature Gallery quiz tabs. Analyses go to the local
+stand-in LLM unless ``--backend`` says otherwise.
+
+Reported: rerun latency p50/p95/p99 overall and per step, reruns/s and
+sessions/min, process CPU seconds per rerun and resident memory per
+session. Results are written as JSON (one file per run, named after the
+commit) and can be compared with ``--compare``.
+
+    python benchmarks/load_test.py --sessions 20
+    python benchmarks/load_test.py --sessions 20 --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, 'app.py')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# Metrics compared by --compare; lower is better for all of them
+COMPARED = ['rerun_p50', 'rerun_p95', 'rerun_p99', 'cpu_seconds_per_rerun', 'rss_mb_per_session']
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        'count': len(values),
+        'p50': round(_percentile(values, 0.50), 4),
+        'p95': round(_percentile(values, 0.95), 4),
+        'p99': round(_percentile(values, 0.99), 4),
+        'max': round(max(values), 4) if values else 0.0,
+    }
+
+
+def _rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        # Peak rather than current RSS, in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Session:
+    """One simulated browser session walking the app."""
+
+    def __init__(self, index: int, timeout: float, sections: bool, unique: bool):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.timeout = timeout
+        self.sections = sections
+        self.unique = unique
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.reruns = 0
+        self.generation_seconds = 0.0
+        self.error: Optional[str] = None
+
+    def _run(self, step: str, action=None) -> None:
+        started = time.perf_counter()
+        (action or self.at.run)()
+        self.timings[step].append(time.perf_counter() - started)
+        self.reruns += 1
+        if self.at.exception:
+            raise RuntimeError(f"{step}: {self.at.exception[0].message}")
+
+    def walk(self) -> None:
+        at = self.at
+        self._run('landing')
+        self._run('welcome', at.button(key='landing_continue').click().run)
+        at.text_input(key='name_input').input(f"Load tester {self.index}")
+        at.selectbox(key='artwork_input').select_index(1)
+        at.selectbox(key='role_input').select_index(1)
+        at.selectbox(key='goal_input').select_index(1)
+        self._run('main', at.button(key='begin_btn').click().run)
+
+        description = "Oil portrait with water stains and flaking varnish in the lower right corner"
+        if self.unique:
+            # Distinct descriptions so every session does a real generation instead of a cache hit
+            description += f", inventory {self.index}"
+        self._run('describe', at.text_area(key='description_input').input(description).run)
+        if self.sections:
+            at.toggle(key='parallel_sections').set_value(True)
+        started = time.perf_counter()
+        self._run('generate', at.button(key='generate_btn').click().run)
+        deadline = started + self.timeout
+        while not at.session_state.loaded_job_id:
+            if time.perf_counter() > deadline:
+                raise TimeoutError("analysis did not finish in time")
+            time.sleep(0.2)
+            self._run('results_poll')
+        self.generation_seconds = time.perf_counter() - started
+        self._run('results')
+        self._run('back_to_main', at.button(key='back_btn').click().run)
+
+        # Conservation Cost Calculator; only the open tab is rendered, so switch to it first
+        at.session_state['main_section'] = "💰 Conservation Cost Calculator"
+        self._run('switch_tab')
+        self._run('calculator', at.number_input(key='width_input_calc').set_value(120).run)
+        self._run('calculator', at.select_slider(key='damage_severity_calc').set_value(3).run)
+        services = at.multiselect(key='services_calc')
+        self._run('calculator', services.select(services.options[0]).run)
+
+        # Feature Gallery quiz: answer three questions
+        at.session_state['main_section'] = "📚 Feature Gallery"
+        self._run('switch_tab')
+        for _ in range(3):
+            question = at.session_state.q_index
+            if question >= len(at.session_state.quiz_questions):
+                break
+            try:
+                choice = at.radio(key=f'choice_{question}')
+            except KeyError:
+                # The quiz advances with a rerun request that the harness leaves to the next run
+                self._run('quiz')
+                choice = at.radio(key=f'choice_{question}')
+            choice.set_value(choice.options[0])
+            self._run('quiz', at.button(key=f'submit_{question}').click().run)
+
+
+def _share_harness_globals() -> None:
+    """Set up once the process-wide state the harness otherwise swaps on every run.
+
+    Each run installs a fresh mock runtime as the singleton and clears it
+    afterwards, and patches ``config.get_option`` for its duration. With
+    concurrent sessions those swaps interleave, leaving runs without a runtime
+    or without test mode halfway through. Sessions on a server share one
+    runtime too.
+    """
+    import contextlib
+    from unittest.mock import MagicMock, patch
+
+    from streamlit import config
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    runtime.dataframe_source_mgr = DataframeSourceManager()
+    runtime.bidi_component_registry = BidiComponentManager()
+    runtime.bidi_component_registry.discover_and_register_components(start_file_watching=False)
+    Runtime._instance = runtime
+
+    class PerRunRuntime(Runtime):
+        """Absorbs the per-run install and reset of the singleton."""
+
+    app_test.Runtime = PerRunRuntime
+    patch.object(config, 'get_option', new=build_mock_config_get_option({'global.appTest': True})).start()
+    app_test.patch_config_options = lambda overrides: contextlib.nullcontext()
+
+
+def run_load_test(sessions: int, concurrency: int, timeout: float, sections: bool, unique: bool) -> Dict[str, Any]:
+    """Run ``sessions`` simulated sessions, ``concurrency`` at a time, and summarise them."""
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import AppTest, local_script_runner
+
+    # The harness compiles the script afresh on every run; a server keeps one bytecode
+    # cache per process. Share one here too, which also avoids concurrent compiles.
+    shared_script_cache = ScriptCache()
+    local_script_runner.ScriptCache = lambda: shared_script_cache
+    _share_harness_globals()
+
+    # One serial run first builds the process-wide singletons; it is reported as the cold start
+    cold_started = time.perf_counter()
+    AppTest.from_file(APP_PATH, default_timeout=timeout).run()
+    cold_start = time.perf_counter() - cold_started
+
+    rss_before = _rss_bytes()
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+    peak_rss = [rss_before]
+    stop_sampling = threading.Event()
+
+    def sample_memory() -> None:
+        while not stop_sampling.wait(0.25):
+            peak_rss[0] = max(peak_rss[0], _rss_bytes())
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+
+    def one(index: int) -> Session:
+        session = Session(index, timeout, sections, unique)
+        try:
+            session.walk()
+        except Exception as exc:
+            session.error = f"{type(exc).__name__}: {exc}"
+        return session
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load-session") as pool:
+        finished = list(pool.map(one, range(sessions)))
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_before
+    stop_sampling.set()
+    sampler.join()
+    peak_rss[0] = max(peak_rss[0], _rss_bytes())
+
+    by_step: Dict[str, List[float]] = defaultdict(list)
+    for session in finished:
+        for step, values in session.timings.items():
+            by_step[step].extend(values)
+    everything = [value for values in by_step.values() for value in values]
+    reruns = sum(session.reruns for session in finished)
+    succeeded = [session for session in finished if session.error is None]
+    overall = _latency_summary(everything)
+    return {
+        'sessions': sessions,
+        'cold_start_seconds': round(cold_start, 3),
+        'succeeded': len(succeeded),
+        'errors': [session.error for session in finished if session.error][:10],
+        'elapsed_seconds': round(elapsed, 3),
+        'reruns': reruns,
+        'reruns_per_second': round(reruns / elapsed, 2) if elapsed else 0.0,
+        'sessions_per_minute': round(len(succeeded) / elapsed * 60, 2) if elapsed else 0.0,
+        'rerun_p50': overall['p50'],
+        'rerun_p95': overall['p95'],
+        'rerun_p99': overall['p99'],
+        'rerun_max': overall['max'],
+        'generation': _latency_summary([session.generation_seconds for session in succeeded]),
+        'steps': {step: _latency_summary(values) for step, values in sorted(by_step.items())},
+        'cpu_seconds_per_rerun': round(cpu / reruns, 4) if reruns else 0.0,
+        'rss_mb_per_session': round((peak_rss[0] - rss_before) / sessions / 2 ** 20, 2),
+        'rss_mb_peak': round(peak_rss[0] / 2 ** 20, 1),
+    }
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """Print the change of the headline metrics against an earlier result file."""
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+    print(f"\nvs {baseline.get('commit') or baseline_path} ({baseline['results']['sessions']} sessions):")
+    for name in COMPARED:
+        before, after = baseline['results'].get(name), current['results'].get(name)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"  {name:<24} {before:>10} -> {after:<10} {change}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the ArtRestorer AI app with simulated sessions.")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, help="sessions active at once (default: all)")
+    parser.add_argument('--timeout', type=float, default=120, help="seconds allowed per rerun and per analysis")
+    parser.add_argument('--sections', action='store_true', help="use parallel section generation")
+    parser.add_argument('--repeat-descriptions', action='store_true',
+                        help="give every session the same description, exercising caching and coalescing")
+    parser.add_argument('--backend', default='standin', help="LLM backend (default: embedded stand-in)")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument('--compare', help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    # Must be set before the app (and its backend/cache singletons) is first imported
+    os.environ['ARTRESTORER_LLM_BACKEND'] = args.backend
+    os.environ.setdefault('ARTRESTORER_CACHE_DIR', os.path.join(RESULTS_DIR, '.cache'))
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+
+    results = run_load_test(args.sessions, args.concurrency or args.sessions, args.timeout,
+                            args.sections, not args.repeat_descriptions)
+    commit = _git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {'sessions': args.sessions, 'concurrency': args.concurrency or args.sessions,
+                   'sections': args.sections, 'repeat_descriptions': args.repeat_descriptions,
+                   'backend': args.backend},
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nocommit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+    print(json.dumps({name: results[name] for name in
+                      ['succeeded', 'elapsed_seconds', 'reruns_per_second', 'sessions_per_minute', *COMPARED]},
+                     indent=2))
+    if results['errors']:
+        print("errors:", *results['errors'], sep="\n  ", file=sys.stderr)
+    print(f"results written to {output}")
+    if args.compare:
+        compare(report, args.compare)
+    return 0 if results['succeeded'] == results['sessions'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
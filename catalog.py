@@ -0,0 +1,170 @@
+"""Versioned reference-data catalog.
+
+The analysis features, the style/damage/context vocabularies, the cultural
+insights and the conservation price list live in `data/catalog.json`
+(``ARTRESTORER_CATALOG`` points elsewhere), so adding a style or an insight
+is a data change. `get_catalog` reads and validates the file once per
+process and returns it frozen: mappings are read-only views and lists are
+tuples, so every session shares the same objects. A catalog that fails
+validation raises `CatalogError` at startup instead of breaking a page later.
+"""
+import functools
+import hashlib
+import json
+import os
+from types import MappingProxyType
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CATALOG_PATH = os.getenv('ARTRESTORER_CATALOG') or os.path.join(ROOT, 'data', 'catalog.json')
+# Bumped when the layout of the file changes, not when entries are added
+SCHEMA_VERSION = 1
+
+_INSIGHT_TEXT_FIELDS = ('emoji', 'period', 'background', 'importance', 'restoration')
+
+
+class CatalogError(ValueError):
+    """The catalog file is unreadable, of another schema version or inconsistent."""
+
+
+def freeze(value: Any) -> Any:
+    """Deep read-only copy: dicts become mapping proxies and lists tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def _is_text(value: Any) -> bool:
+    return isinstance(value, str) and bool(value.strip())
+
+
+def _is_positive(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def _check_names(problems: List[str], where: str, names: Any) -> None:
+    if not isinstance(names, list) or not names:
+        problems.append(f"{where}: expected a non-empty list")
+        return
+    if not all(_is_text(name) for name in names):
+        problems.append(f"{where}: every entry must be a non-empty string")
+    duplicates = sorted({name for name in names if names.count(name) > 1}, key=str)
+    if duplicates:
+        problems.append(f"{where}: duplicate entries {duplicates}")
+
+
+def _check_records(problems: List[str], where: str, records: Any, text_fields: Tuple[str, ...],
+                   list_fields: Tuple[str, ...], unique: str) -> None:
+    if not isinstance(records, list) or not records:
+        problems.append(f"{where}: expected a non-empty list")
+        return
+    for index, record in enumerate(records):
+        label = f"{where}[{index}]"
+        if not isinstance(record, dict):
+            problems.append(f"{label}: expected an object")
+            continue
+        problems.extend(f"{label}.{field}: expected a non-empty string"
+                        for field in text_fields if not _is_text(record.get(field)))
+        for field in list_fields:
+            _check_names(problems, f"{label}.{field}", record.get(field))
+    _check_names(problems, f"{where} {unique}s", [r.get(unique) for r in records if isinstance(r, dict)])
+
+
+def _check_prices(problems: List[str], where: str, prices: Any, allow_zero: bool = False) -> None:
+    if not isinstance(prices, dict) or not prices:
+        problems.append(f"{where}: expected a non-empty object")
+        return
+    for name, price in prices.items():
+        if not (_is_positive(price) or (allow_zero and price == 0 and not isinstance(price, bool))):
+            problems.append(f"{where}[{name!r}]: expected a {'non-negative' if allow_zero else 'positive'} number")
+
+
+def validate(data: Any) -> List[str]:
+    """Every problem found in parsed catalog ``data``; empty when it is usable."""
+    if not isinstance(data, dict):
+        return ["catalog: expected a JSON object"]
+    if data.get('schema_version') != SCHEMA_VERSION:
+        return [f"schema_version: expected {SCHEMA_VERSION}, found {data.get('schema_version')!r}"]
+    problems: List[str] = []
+    if not _is_text(data.get('version')):
+        problems.append("version: expected a non-empty string")
+    _check_records(problems, 'features', data.get('features'), ('key', 'icon', 'title', 'description'),
+                   ('cases',), 'title')
+    _check_names(problems, 'feature keys', [f.get('key') for f in data.get('features') or [] if isinstance(f, dict)])
+    for name in ('art_styles', 'damage_types', 'cultural_contexts'):
+        _check_names(problems, name, data.get(name))
+    _check_records(problems, 'cultural_insights', data.get('cultural_insights'), ('name',) + _INSIGHT_TEXT_FIELDS,
+                   ('techniques', 'famous_works'), 'name')
+
+    costing = data.get('costing')
+    if not isinstance(costing, dict):
+        problems.append("costing: expected an object")
+        return problems
+    artwork_types = costing.get('artwork_types')
+    if not isinstance(artwork_types, dict) or not artwork_types:
+        problems.append("costing.artwork_types: expected a non-empty object")
+    else:
+        for name, rates in artwork_types.items():
+            if not isinstance(rates, dict) or not all(_is_positive(rates.get(f)) for f in ('base_rate', 'complexity')):
+                problems.append(f"costing.artwork_types[{name!r}]: expected positive base_rate and complexity")
+    levels = costing.get('damage_levels')
+    if not isinstance(levels, list) or not levels:
+        problems.append("costing.damage_levels: expected a non-empty list")
+    elif not all(isinstance(level, dict) and _is_text(level.get('label')) and _is_positive(level.get('multiplier'))
+                 for level in levels):
+        problems.append("costing.damage_levels: every level needs a label and a positive multiplier")
+    _check_prices(problems, 'costing.urgency_options', costing.get('urgency_options'))
+    _check_prices(problems, 'costing.services', costing.get('services'), allow_zero=True)
+    return problems
+
+
+class Catalog:
+    """Frozen, validated contents of one catalog file."""
+
+    def __init__(self, data: Dict[str, Any], digest: str, path: str):
+        frozen = freeze(data)
+        self.path = path
+        self.digest = digest
+        self.version = frozen['version']
+        self.features = frozen['features']
+        self.art_styles = frozen['art_styles']
+        self.damage_types = frozen['damage_types']
+        self.cultural_contexts = frozen['cultural_contexts']
+        self.cultural_insights = MappingProxyType({insight['name']: insight for insight in frozen['cultural_insights']})
+        self.costing = frozen['costing']
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'schema_version': SCHEMA_VERSION,
+            'sha256': self.digest[:12],
+            'features': len(self.features),
+            'art_styles': len(self.art_styles),
+            'damage_types': len(self.damage_types),
+            'cultural_contexts': len(self.cultural_contexts),
+            'cultural_insights': len(self.cultural_insights),
+            'artwork_types': len(self.costing['artwork_types']),
+            'services': len(self.costing['services']),
+        }
+
+
+def load_catalog(path: str = CATALOG_PATH) -> Catalog:
+    """Read and validate the catalog at ``path``; raises CatalogError listing every problem."""
+    try:
+        with open(path, 'rb') as fh:
+            raw = fh.read()
+        data = json.loads(raw)
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise CatalogError(f"cannot read catalog {path}: {exc}") from exc
+    problems = validate(data)
+    if problems:
+        raise CatalogError(f"invalid catalog {path}:\n  " + "\n  ".join(problems))
+    return Catalog(data, hashlib.sha256(raw).hexdigest(), path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_catalog(path: str = CATALOG_PATH) -> Catalog:
+    """The catalog at ``path``, loaded once per process."""
+    return load_catalog(path)
@@ -0,0 +1,65 @@
+"""Conservation cost estimates.
+
+Rates and multipliers behind the Conservation Cost Calculator, from the
+data `catalog`, and `estimate_cost`, which turns a project description
+into a quote.
+"""
+from typing import Any, Dict, Iterable
+
+from catalog import get_catalog
+
+_costing = get_catalog().costing
+
+# Artwork type -> base_rate (per m2) and complexity factor
+ARTWORK_TYPES = _costing['artwork_types']
+DAMAGE_LEVELS = tuple(level['label'] for level in _costing['damage_levels'])
+DAMAGE_MULTIPLIERS = tuple(level['multiplier'] for level in _costing['damage_levels'])
+URGENCY_OPTIONS = _costing['urgency_options']
+# The first urgency level is the default
+DEFAULT_URGENCY = next(iter(URGENCY_OPTIONS))
+SERVICES = _costing['services']
+
+LABOR_HOURS_PER_M2 = 20
+LABOR_RATE = 45
+MATERIALS_SHARE = 0.3
+# Quotes are given as a range of +/-15% around the estimate
+ESTIMATE_MARGIN = 0.15
+
+
+def estimate_cost(width_cm: float, height_cm: float, artwork_type: str, damage_index: int,
+                  urgency: str = DEFAULT_URGENCY, services: Iterable[str] = ()) -> Dict[str, Any]:
+    """Itemised cost, labour and timeline estimate for one restoration project.
+
+    ``damage_index`` indexes DAMAGE_LEVELS; unknown artwork types, urgency
+    levels or services raise KeyError.
+    """
+    artwork = ARTWORK_TYPES[artwork_type]
+    damage_mult = DAMAGE_MULTIPLIERS[damage_index]
+    urgency_mult = URGENCY_OPTIONS[urgency]
+    area = (width_cm * height_cm) / 10000
+    base_cost = artwork["base_rate"] * area * artwork["complexity"]
+    damage_cost = base_cost * damage_mult
+    labor_hours = (area * LABOR_HOURS_PER_M2) * damage_mult
+    labor_cost = labor_hours * LABOR_RATE
+    materials_cost = base_cost * MATERIALS_SHARE * damage_mult
+    services_cost = sum(SERVICES[service] for service in services)
+    total_cost = (damage_cost + labor_cost + materials_cost + services_cost) * urgency_mult
+    return {
+        'artwork_type': artwork_type,
+        'area_m2': area,
+        'complexity': artwork["complexity"],
+        'damage_level': DAMAGE_LEVELS[damage_index],
+        'damage_multiplier': damage_mult,
+        'urgency': urgency,
+        'urgency_multiplier': urgency_mult,
+        'base_cost': base_cost,
+        'damage_cost': damage_cost,
+        'labor_hours': labor_hours,
+        'labor_cost': labor_cost,
+        'materials_cost': materials_cost,
+        'services_cost': services_cost,
+        'total_cost': total_cost,
+        'min_estimate': total_cost * (1 - ESTIMATE_MARGIN),
+        'max_estimate': total_cost * (1 + ESTIMATE_MARGIN),
+        'timeline_weeks': (6 + (damage_index * 1.5)) * urgency_mult,
+    }
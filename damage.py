@@ -0,0 +1,367 @@
+"""Damage indicators and palette measured from an artwork photograph.
+
+The image is reduced to a working copy of at most `WORK_EDGE` pixels on its
+longest side (large scans are reduced through their tile pyramid, see
+`images`), and every indicator is computed with whole-array NumPy
+operations on it:
+
+* fading / UV loss: how little saturation is left and how compressed the
+  luminance range is;
+* yellowing: the CIELAB b* (blue-yellow) shift of the light areas, where
+  discoloured varnish shows first;
+* cracks: thin lines darker than the pixels on both sides of them, kept
+  only where they connect into lines;
+* spots (foxing, mould): compact blobs darker than a ring around them,
+  counted by their strongest pixel;
+* losses: flat, featureless patches that stand out from their
+  neighbourhood, as exposed ground or fills do.
+
+The working copy is measured in `_TILE`-pixel tiles on a thread pool
+(NumPy releases the GIL), each read with a `_HALO` margin so the local
+detectors see the same neighbourhood they would in the whole image. Tiles
+return counts and histograms, which add up to the same indicators, and the
+share of each `CELL`-pixel cell covered by cracks, spots and losses, which
+make up the damage maps that `vision` picks regions of interest from.
+
+They are measurements of the photograph, not a diagnosis. Lighting, the
+camera and the artwork's own palette all move them, so the findings are
+worded as indications for the conservator to check.
+"""
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from images import ImageError, load_rgb
+from tiles import WORKERS
+
+# Longest side of the working copy; cracks thinner than original_edge / WORK_EDGE pixels are not resolved
+WORK_EDGE = 2048
+# Side of the square blocks the loss detector looks at
+BLOCK = 16
+# Side of the square cells of the damage maps, a divisor of the tile side
+CELL = 64
+# Colours reported in the palette
+PALETTE_SIZE = 5
+
+SEVERITIES = ((0.15, 'none'), (0.4, 'slight'), (0.7, 'moderate'), (float('inf'), 'severe'))
+
+_CRACK_CONTRAST = 0.07
+_SPOT_CONTRAST = 0.06
+# (inside, around) sampling distances; together they find spots about 3 to 15 px across
+_SPOT_RINGS = ((1, 4), (3, 8))
+_FLAT_STD = 0.012
+_LOSS_CONTRAST = 0.12
+# Tile side (a multiple of BLOCK) and margin: two loss blocks, more than the spot rings and crack reach need
+_TILE = 512
+_HALO = 2 * BLOCK
+# Bins of the saturation and luminance histograms the percentiles are read from
+_HISTOGRAM_BINS = 1024
+# Palette colours closer than this (RGB distance) count as one
+_PALETTE_SPREAD = 48
+
+# sRGB value -> linear light, for the CIELAB conversion
+_LINEAR = np.where(np.arange(256) / 255 <= 0.04045, np.arange(256) / 255 / 12.92,
+                   ((np.arange(256) / 255 + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+
+def severity(score: float) -> str:
+    return next(label for limit, label in SEVERITIES if score < limit)
+
+
+def _box_mean(values: np.ndarray, radius: int) -> np.ndarray:
+    """Mean over the (2*radius+1)^2 window around every pixel, from an integral image."""
+    size = 2 * radius + 1
+    padded = np.pad(values, radius, mode='edge').astype(np.float64)
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+    np.cumsum(np.cumsum(padded, axis=0), axis=1, out=integral[1:, 1:])
+    sums = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return (sums / (size * size)).astype(np.float32)
+
+
+def _window_max(values: np.ndarray, radius: int) -> np.ndarray:
+    """Maximum over the (2*radius+1)^2 window around every pixel, as two passes of shifted maxima."""
+    height, width = values.shape
+    padded = np.pad(values, radius, mode='edge')
+    rows = padded[:, :width].copy()
+    for offset in range(1, 2 * radius + 1):
+        np.maximum(rows, padded[:, offset:offset + width], out=rows)
+    window = rows[:height].copy()
+    for offset in range(1, 2 * radius + 1):
+        np.maximum(window, rows[offset:offset + height], out=window)
+    return window
+
+
+def _neighbours(mask: np.ndarray) -> np.ndarray:
+    """How many of the 8 surrounding pixels are set, for every pixel."""
+    height, width = mask.shape
+    padded = np.pad(mask, 1).astype(np.uint8)
+    count = np.zeros((height, width), dtype=np.uint8)
+    for dy in range(3):
+        for dx in range(3):
+            if dy != 1 or dx != 1:
+                count += padded[dy:dy + height, dx:dx + width]
+    return count
+
+
+def _histogram(values: np.ndarray) -> np.ndarray:
+    bins = np.minimum((values * _HISTOGRAM_BINS).astype(np.int32), _HISTOGRAM_BINS - 1)
+    return np.bincount(bins.ravel(), minlength=_HISTOGRAM_BINS)
+
+
+def _percentile(histogram: np.ndarray, q: float) -> float:
+    cumulative = np.cumsum(histogram)
+    index = int(np.searchsorted(cumulative, q / 100 * cumulative[-1]))
+    return (index + 0.5) / _HISTOGRAM_BINS
+
+
+def _colour(rgb8: np.ndarray, luminance: np.ndarray, saturation: np.ndarray) -> Dict[str, Any]:
+    # Histograms and sums for fading, yellowing and the palette; colour statistics do not need every pixel
+    rgb8, luminance, saturation = rgb8[::2, ::2], luminance[::2, ::2], saturation[::2, ::2]
+    linear = _LINEAR[rgb8]
+    y = linear @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    z = linear @ np.array([0.0193, 0.1192, 0.9505], dtype=np.float32) / 1.08883
+    fy = np.where(y > 0.008856, np.cbrt(y), 7.787 * y + 16 / 116)
+    fz = np.where(z > 0.008856, np.cbrt(z), 7.787 * z + 16 / 116)
+    light = (116 * fy - 16) > 65
+    b_star = 200 * (fy - fz)
+    # 16 levels per channel
+    bins = ((rgb8[..., 0] >> 4).astype(np.int32) << 8 | (rgb8[..., 1] >> 4).astype(np.int32) << 4
+            | (rgb8[..., 2] >> 4)).ravel()
+    return {
+        'pixels': luminance.size,
+        'saturation': _histogram(saturation), 'saturation_sum': float(saturation.sum(dtype=np.float64)),
+        'luminance': _histogram(luminance),
+        'b_star_sum': float(b_star.sum(dtype=np.float64)), 'light': int(light.sum()),
+        'b_star_light_sum': float(b_star[light].sum(dtype=np.float64)),
+        'colours': np.bincount(bins, minlength=4096),
+        'colour_sums': np.stack([np.bincount(bins, rgb8[..., channel].ravel(), minlength=4096)
+                                 for channel in range(3)], axis=1),
+    }
+
+
+def _crack_mask(luminance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Crack and ridge pixels of ``luminance``, without its 2-pixel border."""
+    centre = luminance[2:-2, 2:-2]
+    # How much darker a pixel is than both neighbours 1 and 2 pixels away, across and along
+    depth = np.maximum.reduce([
+        np.minimum(luminance[2:-2, 1:-3], luminance[2:-2, 3:-1]) - centre,
+        np.minimum(luminance[1:-3, 2:-2], luminance[3:-1, 2:-2]) - centre,
+        np.minimum(luminance[2:-2, :-4], luminance[2:-2, 4:]) - centre,
+        np.minimum(luminance[:-4, 2:-2], luminance[4:, 2:-2]) - centre,
+    ])
+    ridge = depth > _CRACK_CONTRAST
+    # Crack pixels continue into a line: at least two more ridge pixels around them
+    return ridge & (_neighbours(ridge) >= 2), ridge
+
+
+def _ring(padded: np.ndarray, reach: int, distance: int, shape: Tuple[int, int]) -> List[np.ndarray]:
+    # The eight pixels `distance` away from every pixel, as shifted views of `padded`
+    height, width = shape
+    return [padded[reach + dy * distance:reach + dy * distance + height,
+                   reach + dx * distance:reach + dx * distance + width]
+            for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def _spot_masks(luminance: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Spot pixels and spot centres of ``luminance``, its edges extended beyond the border."""
+    reach = max(outer for _, outer in _SPOT_RINGS)
+    padded = np.pad(luminance, reach, mode='edge')
+    depth = np.full(luminance.shape, -1.0, dtype=np.float32)
+    for inner, outer in _SPOT_RINGS:
+        # The brightest pixel just inside a spot is still darker than the darkest one around it;
+        # lines and edges fail this, since some inner pixels lie off the line or across the edge
+        inside = np.maximum.reduce(_ring(padded, reach, inner, luminance.shape) + [luminance])
+        around = np.minimum.reduce(_ring(padded, reach, outer, luminance.shape))
+        np.maximum(depth, around - inside, out=depth)
+    spots = depth > _SPOT_CONTRAST
+    return spots, spots & (depth >= _window_max(depth, 3))
+
+
+def _loss_blocks(luminance: np.ndarray, saturation: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Loss and flat masks over the BLOCK-pixel blocks of ``luminance``, its edges extended beyond the border."""
+    rows, cols = luminance.shape[0] // BLOCK, luminance.shape[1] // BLOCK
+    if not rows or not cols:
+        # Narrower than a block: nothing to compare
+        return np.zeros((rows, cols), dtype=bool), np.zeros((rows, cols), dtype=bool)
+    blocks = luminance[:rows * BLOCK, :cols * BLOCK].reshape(rows, BLOCK, cols, BLOCK)
+    mean = blocks.mean(axis=(1, 3))
+    std = blocks.std(axis=(1, 3))
+    block_sat = saturation[:rows * BLOCK, :cols * BLOCK].reshape(rows, BLOCK, cols, BLOCK).mean(axis=(1, 3))
+    flat = std < _FLAT_STD
+    # Compared with the 5x5 blocks around them, ignoring flat blocks (a plain background is not a loss)
+    textured = (~flat).astype(np.float32)
+    weight = _box_mean(textured, 2)
+    around = np.divide(_box_mean(mean * textured, 2), weight, out=mean.copy(), where=weight > 0)
+    return flat & (np.abs(mean - around) > _LOSS_CONTRAST) & (block_sat < 0.25), flat
+
+
+def _cells(mask: np.ndarray) -> np.ndarray:
+    # Set pixels of ``mask`` per CELL-pixel cell, the last row and column of cells possibly smaller
+    rows, cols = range(0, mask.shape[0], CELL), range(0, mask.shape[1], CELL)
+    return np.add.reduceat(np.add.reduceat(mask.astype(np.int32), rows, axis=0), cols, axis=1)
+
+
+def _local(luminance: np.ndarray, saturation: np.ndarray,
+           box: Tuple[int, int, int, int]) -> Tuple[Dict[str, int], np.ndarray]:
+    # Counts of the local detectors inside ``box``, read with a halo so they match a whole-image pass,
+    # and the crack, spot and loss pixels of each of its cells
+    height, width = luminance.shape
+    x0, y0, x1, y1 = box
+    hx0, hy0, hx1, hy1 = max(0, x0 - _HALO), max(0, y0 - _HALO), min(width, x1 + _HALO), min(height, y1 + _HALO)
+    lum, sat = luminance[hy0:hy1, hx0:hx1], saturation[hy0:hy1, hx0:hx1]
+    counts = {}
+    # Cracks are not looked for within 2 px of the image border
+    cracks, ridge = _crack_mask(lum)
+    inner = (slice(max(y0, 2) - hy0 - 2, min(y1, height - 2) - hy0 - 2),
+             slice(max(x0, 2) - hx0 - 2, min(x1, width - 2) - hx0 - 2))
+    counts['crack'], counts['ridge'] = int(cracks[inner].sum()), int(ridge[inner].sum())
+    crack_pixels = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+    crack_pixels[max(y0, 2) - y0:min(y1, height - 2) - y0, max(x0, 2) - x0:min(x1, width - 2) - x0] = cracks[inner]
+    spots, centres = _spot_masks(lum)
+    core = (slice(y0 - hy0, y1 - hy0), slice(x0 - hx0, x1 - hx0))
+    counts['spot'], counts['centre'] = int(spots[core].sum()), int(centres[core].sum())
+    # Only whole blocks of the image count; tile and halo edges fall on block boundaries
+    by1, bx1 = min(hy1, height // BLOCK * BLOCK), min(hx1, width // BLOCK * BLOCK)
+    losses, flat = _loss_blocks(lum[:by1 - hy0, :bx1 - hx0], sat[:by1 - hy0, :bx1 - hx0])
+    blocks = (slice((y0 - hy0) // BLOCK, (min(y1, by1) - hy0) // BLOCK),
+              slice((x0 - hx0) // BLOCK, (min(x1, bx1) - hx0) // BLOCK))
+    counts['loss'], counts['flat'] = int(losses[blocks].sum()), int(flat[blocks].sum())
+    loss_pixels = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+    covered = np.kron(losses[blocks], np.ones((BLOCK, BLOCK), dtype=bool))
+    loss_pixels[:covered.shape[0], :covered.shape[1]] = covered
+    return counts, np.stack([_cells(crack_pixels), _cells(spots[core]), _cells(loss_pixels)])
+
+
+def _palette(colours: np.ndarray, colour_sums: np.ndarray) -> List[Tuple[str, float]]:
+    # The most common colour bins, skipping ones close to a colour already picked; every pixel then
+    # counts towards its nearest picked colour
+    used = np.flatnonzero(colours)
+    counts = colours[used]
+    means = colour_sums[used] / counts[:, None]
+    picked: List[np.ndarray] = []
+    for index in np.argsort(counts)[::-1]:
+        if all(np.linalg.norm(means[index] - colour) >= _PALETTE_SPREAD for colour in picked):
+            picked.append(means[index])
+            if len(picked) == PALETTE_SIZE:
+                break
+    if not picked:
+        return []
+    centres = np.array(picked)
+    nearest = np.argmin(((means[:, None, :] - centres[None]) ** 2).sum(axis=2), axis=1)
+    shares = np.bincount(nearest, counts, minlength=len(centres)) / counts.sum()
+    return sorted((('#%02x%02x%02x' % tuple(int(round(value)) for value in colour), float(share))
+                   for colour, share in zip(centres, shares)), key=lambda entry: -entry[1])
+
+
+class DamageAssessment:
+    """Indicator scores (0 = no sign, 1 = strong sign), the measurements behind them, the palette and damage maps."""
+
+    def __init__(self, scores: Dict[str, float], measurements: Dict[str, float], size: Tuple[int, int],
+                 palette: List[Tuple[str, float]] = (), maps: Optional[Dict[str, np.ndarray]] = None):
+        self.scores = scores
+        self.measurements = measurements
+        # Of the working copy, which the maps and their cells refer to
+        self.size = size
+        # (hex colour, share of the surface), most common first
+        self.palette = list(palette)
+        # 'cracks', 'spots', 'losses': share of each CELL-pixel cell of the working copy they cover
+        self.maps = maps or {}
+
+    def severities(self) -> Dict[str, str]:
+        return {name: severity(score) for name, score in self.scores.items()}
+
+    def findings(self) -> List[str]:
+        """One plain-language line per indicator, then the palette, for the CONDITION ASSESSMENT section."""
+        m, s = self.measurements, self.severities()
+        findings = [
+            f"Fading/UV loss: {s['fading']} (95th-percentile saturation {m['saturation_p95']:.2f}, "
+            f"luminance range {m['luminance_range']:.2f})",
+            f"Yellowing: {s['yellowing']} (mean b* {m['b_star_light_mean']:+.1f} in light areas)",
+            f"Cracks: {s['cracks']} (crack lines cover {m['crack_density']:.1%} of the surface)",
+            f"Spots (foxing/mould): {s['spots']} ({m['spot_count']} spots, {m['spot_coverage']:.1%} of the surface)",
+            f"Losses: {s['losses']} (flat, contrasting patches cover {m['loss_fraction']:.1%} of the surface)",
+        ]
+        if self.palette:
+            findings.append("Dominant colours: " + ", ".join(f"{colour} ({share:.0%})"
+                                                             for colour, share in self.palette))
+        return findings
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'scores': self.scores, 'severities': self.severities(), 'measurements': self.measurements,
+                'palette': [{'colour': colour, 'share': share} for colour, share in self.palette],
+                'working_size': list(self.size)}
+
+
+def assess(rgb8: np.ndarray, workers: int = WORKERS) -> DamageAssessment:
+    """Indicators for an RGB ``uint8`` array of shape (height, width, 3), measured tile by tile."""
+    height, width = rgb8.shape[:2]
+    luminance = np.empty((height, width), dtype=np.float32)
+    saturation = np.empty((height, width), dtype=np.float32)
+    boxes = [(x, y, min(width, x + _TILE), min(height, y + _TILE))
+             for y in range(0, height, _TILE) for x in range(0, width, _TILE)]
+
+    def convert(box):
+        x0, y0, x1, y1 = box
+        rgb = rgb8[y0:y1, x0:x1].astype(np.float32) / 255
+        red, green, blue = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        lum = rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+        high, low = np.maximum(np.maximum(red, green), blue), np.minimum(np.minimum(red, green), blue)
+        sat = np.divide(high - low, high, out=np.zeros_like(high), where=high > 0.02)
+        luminance[y0:y1, x0:x1], saturation[y0:y1, x0:x1] = lum, sat
+        return _colour(rgb8[y0:y1, x0:x1], lum, sat)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='damage') as pool:
+        # The local detectors read into neighbouring tiles, so every tile is converted before any is measured
+        colour = list(pool.map(convert, boxes))
+        local = list(pool.map(lambda box: _local(luminance, saturation, box), boxes))
+    total = {key: sum(part[key] for part in colour) for key in colour[0]}
+    counts = {key: sum(part[key] for part, _ in local) for key in local[0][0]}
+    cells = np.zeros((3, -(-height // CELL), -(-width // CELL)), dtype=np.int64)
+    for (x0, y0, _, _), (_, part) in zip(boxes, local):
+        cells[:, y0 // CELL:y0 // CELL + part.shape[1], x0 // CELL:x0 // CELL + part.shape[2]] = part
+    # Pixels per cell, the cells along the right and bottom edges possibly smaller
+    area = np.outer(np.diff(np.minimum(np.arange(cells.shape[1] + 1) * CELL, height)),
+                    np.diff(np.minimum(np.arange(cells.shape[2] + 1) * CELL, width)))
+    maps = {name: (cells[index] / area).astype(np.float32) for index, name in enumerate(('cracks', 'spots', 'losses'))}
+
+    sat_p95 = _percentile(total['saturation'], 95)
+    lum_range = _percentile(total['luminance'], 99) - _percentile(total['luminance'], 1)
+    light_fraction = total['light'] / total['pixels']
+    b_mean = total['b_star_sum'] / total['pixels']
+    b_light = total['b_star_light_sum'] / total['light'] if light_fraction > 0.02 else b_mean
+    crack_area = max(1, (height - 4) * (width - 4))
+    density = counts['crack'] / crack_area
+    per_megapixel = counts['centre'] / (height * width / 1e6)
+    blocks = max(1, (height // BLOCK) * (width // BLOCK))
+    loss_fraction = counts['loss'] / blocks
+    scores = {
+        'fading': 0.6 * np.clip((0.45 - sat_p95) / 0.35, 0, 1) + 0.4 * np.clip((0.85 - lum_range) / 0.55, 0, 1),
+        'yellowing': np.clip((b_light - 8) / 22, 0, 1),
+        'cracks': np.clip(density / 0.04, 0, 1),
+        'spots': np.clip(per_megapixel / 120, 0, 1),
+        'losses': np.clip(loss_fraction / 0.05, 0, 1),
+    }
+    measurements = {
+        'saturation_p95': sat_p95, 'saturation_mean': total['saturation_sum'] / total['pixels'],
+        'luminance_range': lum_range,
+        'b_star_light_mean': b_light, 'b_star_mean': b_mean, 'light_fraction': light_fraction,
+        'crack_density': density, 'ridge_density': counts['ridge'] / crack_area,
+        'spot_count': counts['centre'], 'spots_per_megapixel': per_megapixel,
+        'spot_coverage': counts['spot'] / (height * width),
+        'loss_fraction': loss_fraction, 'flat_fraction': counts['flat'] / blocks,
+    }
+    return DamageAssessment({name: round(float(score), 3) for name, score in scores.items()}, measurements,
+                            (width, height), _palette(total['colours'], total['colour_sums']), maps)
+
+
+@functools.lru_cache(maxsize=256)
+def assess_image(path: str) -> DamageAssessment:
+    """Indicators for the image file at ``path``; stored images are named by content hash, so this is memoized."""
+    try:
+        rgb = np.asarray(load_rgb(path, WORK_EDGE))
+    except (Image.DecompressionBombError, OSError) as exc:
+        raise ImageError(f"cannot decode image: {exc}") from exc
+    return assess(rgb)
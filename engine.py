@@ -0,0 +1,229 @@
+"""Headless ArtRestorer AI engine and command-line interface.
+
+`Engine` runs analyses, collection batches and cost quotes without
+Streamlit, so they can be driven from scripts, cron jobs, worker processes
+and benchmarks. Importing this module only loads the plain-data modules;
+the OpenAI client, caches and NumPy are imported the first time they are
+needed.
+
+    python -m engine analyze --description "..." [--feature 3] [--sections] [--image scan.jpg]
+    python -m engine batch survey.csv --out results/
+    python -m engine quote --width 50 --height 70 --type "Oil Painting" --severity 2
+"""
+import json
+import os
+import sys
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from costing import ARTWORK_TYPES, DAMAGE_LEVELS, DEFAULT_URGENCY, URGENCY_OPTIONS, estimate_cost
+from knowledge import resolve_feature
+
+
+class Engine:
+    """Analyses, batches and quotes sharing one client and one cache per process."""
+
+    def __init__(self, backend: Optional[str] = None, model: Optional[str] = None, use_cache: bool = True):
+        self.backend_name = backend
+        self.model = model
+        self.use_cache = use_cache
+        self._backend = None
+        self._backend_resolved = False
+        self._client = None
+        self._runner = None
+        self._caches: Optional[Tuple[Any, Any]] = None
+
+    @property
+    def backend(self):
+        """The `llm_backend.LLMBackend` in use, or None to serve template reports."""
+        if not self._backend_resolved:
+            from llm_backend import get_backend
+            self._backend = get_backend(self.backend_name)
+            self._backend_resolved = True
+        return self._backend
+
+    @property
+    def client(self):
+        if self._client is None and self.backend is not None:
+            self._client = self.backend.create_client()
+        return self._client
+
+    @property
+    def runner(self):
+        if self._runner is None and self.backend is not None:
+            self._runner = self.backend.create_runner()
+        return self._runner
+
+    @property
+    def caches(self) -> Tuple[Any, Any]:
+        """The (exact, semantic) analysis caches, or (None, None) when caching is off."""
+        if self._caches is None:
+            if self.use_cache:
+                from analysis_cache import AnalysisCache
+                from semantic_cache import SemanticCache
+                cache = AnalysisCache()
+                self._caches = (cache, SemanticCache(cache))
+            else:
+                self._caches = (None, None)
+        return self._caches
+
+    def _model_kwargs(self) -> Dict[str, Any]:
+        return {'model': self.model} if self.model else {}
+
+    def analyze(self, inputs: Dict[str, Any], on_chunk: Optional[Callable[[str], None]] = None,
+                gate=None) -> Tuple[Any, Dict[str, Any]]:
+        """Generate the report for ``inputs``; returns the `report_model.Report` and its generation stats.
+
+        ``inputs['mode'] == 'sections'`` requests every section in parallel;
+        ``on_chunk`` then receives each finished section instead of stream chunks.
+        """
+        from generation import generate_sections, stream_analysis
+
+        cache, semantic = self.caches
+        stats: Dict[str, Any] = {}
+        if inputs.get('mode') == 'sections':
+            runner = self.runner
+            on_section = None
+            if on_chunk is not None:
+                on_section = lambda index, title, body: on_chunk(f"{title}\n{body}\n\n")
+            # Without a key every section falls back to the template, no event loop needed
+            loop_kwargs = {'runner': runner.run} if runner else {}
+            report = generate_sections(runner.client if runner else None, inputs, on_section, stats,
+                                       cache=cache, semantic=semantic, gate=gate, **loop_kwargs,
+                                       **self._model_kwargs())
+            return report, stats
+        stream = stream_analysis(self.client, inputs, stats, cache=cache, semantic=semantic, gate=gate,
+                                 **self._model_kwargs())
+        for chunk in stream:
+            if on_chunk is not None:
+                on_chunk(chunk)
+        return stream.report, stats
+
+    def batch(self, path: str, out_dir: Optional[str] = None, concurrency: Optional[int] = None,
+              on_progress: Optional[Callable[[Any], None]] = None) -> Dict[str, Any]:
+        """Analyse every row of a CSV/JSONL survey, resuming from its checkpoint.
+
+        When ``out_dir`` is given, ``results.jsonl`` and ``reports.zip`` are
+        written there. Returns the throughput summary.
+        """
+        from batch import DEFAULT_CONCURRENCY, BatchRun, batch_id, read_rows
+
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        run = BatchRun(read_rows(data, path), batch_id(data))
+        summary = run.run(self.analyze, concurrency or DEFAULT_CONCURRENCY, on_progress)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+            with open(os.path.join(out_dir, 'results.jsonl'), 'wb') as fh:
+                fh.write(run.to_jsonl())
+            with open(os.path.join(out_dir, 'reports.zip'), 'wb') as fh:
+                fh.write(run.to_zip())
+        return summary
+
+    @staticmethod
+    def quote(width_cm: float, height_cm: float, artwork_type: str, damage_index: int,
+              urgency: str = DEFAULT_URGENCY, services: Iterable[str] = ()) -> Dict[str, Any]:
+        """Conservation cost estimate; see `costing.estimate_cost`."""
+        return estimate_cost(width_cm, height_cm, artwork_type, damage_index, urgency, services)
+
+
+def _build_parser():
+    # argparse is only needed by the CLI, not by library users of Engine
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m engine", description="ArtRestorer AI without the web UI.")
+    parser.add_argument('--backend', help="LLM backend: openai or standin (default: ARTRESTORER_LLM_BACKEND)")
+    parser.add_argument('--model', help="model name (default: OPENAI_MODEL or gpt-4o-mini)")
+    parser.add_argument('--no-cache', action='store_true', help="bypass the on-disk analysis cache")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    analyze = commands.add_parser('analyze', help="generate one restoration analysis")
+    analyze.add_argument('--description', required=True)
+    analyze.add_argument('--style', default="", help="art style or period")
+    analyze.add_argument('--damage', default="", help="damage type")
+    analyze.add_argument('--context', default="", help="cultural context")
+    analyze.add_argument('--feature', help="analysis type: number 1-10, key such as 'textile', or full label")
+    analyze.add_argument('--temperature', type=float, default=0.6)
+    analyze.add_argument('--image', help="photograph or scan to measure damage indicators in (PNG, JPEG or TIFF); "
+                                         "also sent to the model unless ARTRESTORER_VISION=0")
+    analyze.add_argument('--sections', action='store_true', help="generate all sections in parallel")
+    analyze.add_argument('--json', action='store_true', help="print the report and stats as one JSON object")
+
+    batch = commands.add_parser('batch', help="analyse a CSV/JSONL condition survey")
+    batch.add_argument('survey')
+    batch.add_argument('--out', help="directory for results.jsonl and reports.zip")
+    batch.add_argument('--concurrency', type=int)
+
+    quote = commands.add_parser('quote', help="estimate conservation costs")
+    quote.add_argument('--width', type=float, required=True, help="width in cm")
+    quote.add_argument('--height', type=float, required=True, help="height in cm")
+    quote.add_argument('--type', required=True, choices=list(ARTWORK_TYPES), help="artwork type")
+    quote.add_argument('--severity', type=int, default=1, choices=range(len(DAMAGE_LEVELS)),
+                       help="damage severity, 0 (minor) to 4 (critical)")
+    quote.add_argument('--urgency', default=DEFAULT_URGENCY, choices=list(URGENCY_OPTIONS))
+    quote.add_argument('--service', action='append', default=[], help="additional service (repeatable)")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _build_parser().parse_args(argv)
+    if args.command == 'quote':
+        try:
+            result = Engine.quote(args.width, args.height, args.type, args.severity, args.urgency, args.service)
+        except KeyError as exc:
+            print(f"unknown service: {exc}", file=sys.stderr)
+            return 2
+        print(json.dumps(result, indent=2))
+        return 0
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    engine = Engine(args.backend, model=args.model, use_cache=not args.no_cache)
+    if args.command == 'analyze':
+        inputs = {
+            'description': args.description,
+            'art_style': args.style,
+            'damage_type': args.damage,
+            'cultural_context': args.context,
+            'feature': resolve_feature(args.feature),
+            'temperature': args.temperature,
+            'mode': 'sections' if args.sections else 'stream',
+        }
+        if args.image:
+            import vision
+            from damage import assess_image
+            from images import ImageError, file_digest
+            path = os.path.abspath(args.image)
+            try:
+                inputs['image_findings'] = assess_image(path).findings()
+                if vision.ENABLED:
+                    vision_input = vision.prepare_image(path)
+                    inputs['vision'] = vision_input.to_request(file_digest(path))
+                    print(vision_input.summary(), file=sys.stderr)
+            except ImageError as exc:
+                print(f"{args.image}: {exc}", file=sys.stderr)
+                return 2
+        if args.json:
+            report, stats = engine.analyze(inputs)
+            print(json.dumps({'report': report.to_text(), 'analysis': report.to_dict(), 'stats': stats},
+                             ensure_ascii=False, indent=2))
+        else:
+            _, stats = engine.analyze(inputs, on_chunk=lambda chunk: print(chunk, end="", flush=True))
+            print()
+            print(json.dumps(stats), file=sys.stderr)
+        return 0
+
+    def progress(run) -> None:
+        print(f"\r{run.done}/{len(run.rows)} objects", end="", file=sys.stderr, flush=True)
+
+    try:
+        summary = engine.batch(args.survey, args.out, args.concurrency, progress)
+    except (OSError, ValueError) as exc:
+        print(f"cannot run batch: {exc}", file=sys.stderr)
+        return 2
+    print(file=sys.stderr)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
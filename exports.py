@@ -0,0 +1,434 @@
+"""Downloadable reports: plain text, Markdown, standalone HTML, PDF and Word.
+
+Nothing is rendered until a format is asked for: the results page hands
+`st.download_button` a callable, which Streamlit only calls when the button
+is clicked. Every format is built from the structured `report_model.Report`
+and a cover (who it was prepared for, and when). Rendered files are kept by
+report digest, cover and format, and concurrent requests for the same file
+share one rendering. PDF and DOCX are built in a small process pool, so
+their CPU time is not spent under the GIL of the Streamlit server.
+
+Only the standard library is used. The PDF uses the built-in Helvetica
+fonts, which cover Windows-1252; other characters (emoji, box drawing) are
+left out of the PDF.
+"""
+import hashlib
+import html
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape as xml_escape
+
+from assets import REPORT_STYLESHEET, read_css
+from report import SEPARATOR
+from report_html import report_html
+from report_model import Report
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Processes rendering PDF and DOCX files; 0 renders them on the calling thread
+EXPORT_WORKERS = int(os.getenv('ARTRESTORER_EXPORT_WORKERS', 2))
+# Rendered files kept in memory, across every session of the process
+CACHE_SIZE = 128
+RENDER_TIMEOUT = 60
+
+TITLE = "ArtRestorer AI - Restoration Analysis Report"
+FOOTER = ("Generated by ArtRestorer AI", "Powered by OpenAI", "HeritaTech Solutions")
+NOTICE = "This analysis is advisory only. Always consult certified conservators for physical restoration work."
+
+# An outline is the report as a flat list of (kind, lead, text) lines shared by
+# the Markdown, PDF and Word writers. Kinds: h1, h2, h3, p, li, hr and small;
+# ``lead`` is a bold prefix such as "Challenge 1:" or a cover field.
+Line = Tuple[str, str, str]
+
+
+def _outline(report: Report, cover: Dict[str, str]) -> List[Line]:
+    lines: List[Line] = [('h1', "", "COMPREHENSIVE RESTORATION ANALYSIS")]
+    lines.extend(('p', f"{key}:", value) for key, value in cover.items())
+    lines.append(('hr', "", ""))
+    if not report.structured:
+        lines.extend(('p', "", line.strip()) for line in report.header.splitlines()
+                     if line.strip() and line.strip() != SEPARATOR)
+    else:
+        lines.extend(('p', f"{key}:", value) for key, value in report.details.items())
+        lines.append(('h2', "", "EXPERT RESTORATION GUIDANCE"))
+        for section in report.sections:
+            lines.append(('h3', "", section.title.rstrip(':')))
+            for block in section.blocks:
+                if block.kind == 'paragraph':
+                    lines.extend(('p', "", line.strip()) for line in block.text.splitlines() if line.strip())
+                elif block.kind == 'challenge':
+                    lines.append(('p', f"{block.label}:", block.text))
+                    if block.solution:
+                        lines.append(('p', "Solution:", block.solution))
+                else:
+                    if block.label:
+                        lines.append(('p', block.label if block.kind == 'phase' else f"{block.label}:", ""))
+                    lines.extend(('li', "", item) for item in block.items)
+        if report.disclaimer:
+            lines.append(('h3', "", "IMPORTANT DISCLAIMER"))
+            lines.append(('p', "", report.disclaimer))
+    lines.append(('hr', "", ""))
+    lines.extend(('small', "", text) for text in FOOTER + (NOTICE,))
+    return lines
+
+
+def render_text(report: Report, cover: Dict[str, str]) -> bytes:
+    """The plain-text download: cover, the report as written and the footer."""
+    details = "\n".join(f"{key}: {value}" for key, value in cover.items())
+    footer = "\n".join(FOOTER)
+    return (f"{TITLE}\n{SEPARATOR}\n\n{details}\n\n{SEPARATOR}\n\n{report.to_text()}\n\n"
+            f"{SEPARATOR}\n{footer}\n\n{NOTICE}\n").encode('utf-8')
+
+
+def render_markdown(report: Report, cover: Dict[str, str]) -> bytes:
+    prefixes = {'h1': "# ", 'h2': "## ", 'h3': "### ", 'li': "- "}
+    parts: List[str] = []
+    previous = ""
+    for kind, lead, text in _outline(report, cover):
+        if kind == 'hr':
+            line = "---"
+        elif kind == 'small':
+            line = f"*{text}*"
+        else:
+            line = prefixes.get(kind, "") + " ".join(filter(None, (f"**{lead}**" if lead else "", text)))
+        # List items stay together; everything else is its own paragraph
+        parts.append(line if kind == 'li' and previous == 'li' else f"\n{line}")
+        previous = kind
+    return ("\n".join(parts).strip() + "\n").encode('utf-8')
+
+
+_HTML_PAGE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>body{{max-width:52rem;margin:2rem auto;padding:0 1rem;font-family:Georgia,serif;line-height:1.8;color:#3E2723}}
+h2,h3{{font-family:"Playfair Display",Georgia,serif}}footer{{font-size:.85rem;color:#6D4C41}}{report_css}</style>
+</head><body>
+<h1>{title}</h1>
+<p>{cover}</p>
+<main>{body}</main>
+<footer><p>{footer}</p><p>{notice}</p></footer>
+</body></html>
+"""
+
+
+_REPORT_CSS = read_css(REPORT_STYLESHEET)
+
+
+def render_html(report: Report, cover: Dict[str, str]) -> bytes:
+    """One HTML file with its styles inline, readable offline."""
+    return _HTML_PAGE.format(
+        title=html.escape(TITLE),
+        cover="<br>".join(f"<strong>{html.escape(key)}:</strong> {html.escape(value)}" for key, value in cover.items()),
+        # The classes report_html puts on headings and labels
+        report_css=_REPORT_CSS,
+        body=report_html(report),
+        footer="<br>".join(html.escape(text) for text in FOOTER),
+        notice=html.escape(NOTICE),
+    ).encode('utf-8')
+
+
+# -- PDF ---------------------------------------------------------------------
+
+_PAGE_WIDTH, _PAGE_HEIGHT, _MARGIN = 595, 842, 56
+# Advance widths (1/1000 em) of printable ASCII in Helvetica and Helvetica-Bold
+_WIDTHS = {
+    'F1': [int(w) for w in (
+        "278 278 355 556 556 889 667 191 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 "
+        "278 278 584 584 584 556 1015 667 667 722 722 667 611 778 722 278 500 667 556 833 722 778 667 778 722 667 "
+        "611 722 667 944 667 667 611 278 278 278 469 556 333 556 556 500 556 556 278 556 556 222 222 500 222 833 "
+        "556 556 556 556 333 500 278 556 500 722 500 500 500 334 260 334 584").split()],
+    'F2': [int(w) for w in (
+        "278 333 474 556 556 889 722 238 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 "
+        "333 333 584 584 584 611 975 722 722 722 722 667 611 778 722 278 556 722 611 833 722 778 667 778 722 667 "
+        "611 722 667 944 667 667 611 333 278 333 584 556 333 556 611 556 611 556 333 611 611 278 278 556 278 889 "
+        "611 611 611 611 389 556 333 611 556 778 556 556 500 389 280 389 584").split()],
+}
+# kind -> (font of the text, size, space above)
+_PDF_STYLES = {'h1': ('F2', 18, 6), 'h2': ('F2', 14, 14), 'h3': ('F2', 12, 12),
+               'p': ('F1', 10, 4), 'li': ('F1', 10, 1), 'small': ('F1', 8, 2)}
+_BULLET_INDENT = 14
+
+
+def _winansi(text: str) -> str:
+    """``text`` limited to what the standard PDF fonts can show."""
+    return " ".join(text.encode('cp1252', 'ignore').decode('cp1252').split())
+
+
+def _text_width(text: str, font: str, size: float) -> float:
+    widths = _WIDTHS[font]
+    return sum(widths[ord(c) - 32] if 32 <= ord(c) < 127 else 556 for c in text) * size / 1000
+
+
+def _pdf_string(text: str) -> str:
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def _wrap(runs: List[Tuple[str, str]], size: float, width: float) -> List[List[Tuple[str, str]]]:
+    """Break (font, text) runs into lines of at most ``width`` points."""
+    lines: List[List[Tuple[str, str]]] = [[]]
+    used = 0.0
+    for font, text in runs:
+        for word in text.split():
+            advance = _text_width(word, font, size)
+            space = _text_width(" ", font, size) if lines[-1] else 0.0
+            if lines[-1] and used + space + advance > width:
+                lines.append([])
+                used, space = 0.0, 0.0
+            line = lines[-1]
+            if line and line[-1][0] == font:
+                line[-1] = (font, f"{line[-1][1]} {word}")
+            else:
+                line.append((font, f" {word}" if line else word))
+            used += space + advance
+    return lines
+
+
+def render_pdf(report: Report, cover: Dict[str, str]) -> bytes:
+    """An A4 PDF of the report, set in Helvetica."""
+    pages: List[List[str]] = [[]]
+    y = _PAGE_HEIGHT - _MARGIN
+
+    def new_page() -> None:
+        nonlocal y
+        pages.append([])
+        y = _PAGE_HEIGHT - _MARGIN
+
+    for kind, lead, text in _outline(report, cover):
+        if kind == 'hr':
+            if y - 12 < _MARGIN:
+                new_page()
+            y -= 8
+            pages[-1].append(f"0.82 0.41 0.12 RG 1 w {_MARGIN} {y} m {_PAGE_WIDTH - _MARGIN} {y} l S")
+            y -= 4
+            continue
+        font, size, above = _PDF_STYLES[kind]
+        indent = _BULLET_INDENT if kind == 'li' else 0
+        runs = [('F2', _winansi(lead)), (font, _winansi(text))]
+        leading = size * 1.35
+        wrapped = _wrap(runs, size, _PAGE_WIDTH - 2 * _MARGIN - indent)
+        y -= above
+        for index, line in enumerate(wrapped):
+            if y - leading < _MARGIN:
+                new_page()
+            y -= leading
+            ops = [f"BT {_MARGIN + indent} {y:.1f} Td"]
+            if kind == 'li' and index == 0:
+                ops.append(f"/F1 {size} Tf -{_BULLET_INDENT - 4} 0 Td {_pdf_string('•')} Tj {_BULLET_INDENT - 4} 0 Td")
+            for run_font, run_text in line:
+                ops.append(f"/{run_font} {size} Tf {_pdf_string(run_text)} Tj")
+            ops.append("ET")
+            pages[-1].append(" ".join(ops))
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # the page tree, once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+        f"<< /Title {_pdf_string(_winansi(TITLE))} /Producer (ArtRestorer AI) >>",
+    ]
+    streams: Dict[int, bytes] = {}
+    kids = []
+    for number, content in enumerate(pages, 1):
+        footer = f"BT /F1 8 Tf {_MARGIN} {_MARGIN / 2} Td {_pdf_string(f'ArtRestorer AI - page {number}')} Tj ET"
+        streams[len(objects) + 2] = zlib.compress("\n".join(content + [footer]).encode('cp1252'))
+        kids.append(f"{len(objects) + 1} 0 R")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_PAGE_WIDTH} {_PAGE_HEIGHT}] "
+                       f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects) + 2} 0 R >>")
+        objects.append("")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode('ascii'))
+        if number in streams:
+            data = streams[number]
+            out.write(f"<< /Length {len(data)} /Filter /FlateDecode >>\nstream\n".encode('ascii') + data + b"\nendstream")
+        else:
+            out.write(body.encode('cp1252'))
+        out.write(b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('ascii'))
+    out.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('ascii'))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info 5 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+              .encode('ascii'))
+    return out.getvalue()
+
+
+# -- DOCX --------------------------------------------------------------------
+
+_XML_INVALID = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# kind -> run properties of the text (sizes in half-points)
+_DOCX_STYLES = {
+    'h1': '<w:b/><w:color w:val="8B4513"/><w:sz w:val="36"/>',
+    'h2': '<w:b/><w:color w:val="8B4513"/><w:sz w:val="28"/>',
+    'h3': '<w:b/><w:color w:val="A0522D"/><w:sz w:val="24"/>',
+    'p': '<w:sz w:val="21"/>',
+    'li': '<w:sz w:val="21"/>',
+    'small': '<w:i/><w:sz w:val="16"/>',
+}
+_DOCX_PARAGRAPHS = {
+    'h1': '<w:keepNext/><w:spacing w:after="120"/>',
+    'h2': '<w:keepNext/><w:spacing w:before="360" w:after="120"/>',
+    'h3': '<w:keepNext/><w:spacing w:before="240" w:after="80"/>',
+    'p': '<w:spacing w:after="80"/>',
+    'li': '<w:spacing w:after="40"/><w:ind w:left="426" w:hanging="213"/>',
+    'small': '<w:spacing w:after="0"/>',
+    'hr': '<w:pBdr><w:bottom w:val="single" w:sz="12" w:space="1" w:color="D2691E"/></w:pBdr>',
+}
+_DOCX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="word/document.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+}
+
+
+def _docx_run(text: str, properties: str) -> str:
+    text = xml_escape(_XML_INVALID.sub("", text))
+    return f'<w:r><w:rPr>{properties}</w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>'
+
+
+def render_docx(report: Report, cover: Dict[str, str]) -> bytes:
+    """A Word document of the report (WordprocessingML, no template needed)."""
+    body = []
+    for kind, lead, text in _outline(report, cover):
+        runs = ""
+        if kind != 'hr':
+            properties = _DOCX_STYLES[kind]
+            if kind == 'li':
+                text = f"•\t{text}"
+            if lead:
+                runs += _docx_run(f"{lead} " if text else lead, '<w:b/>' + properties.replace('<w:b/>', ''))
+            runs += _docx_run(text, properties) if text else ""
+        body.append(f"<w:p><w:pPr>{_DOCX_PARAGRAPHS[kind]}</w:pPr>{runs}</w:p>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        + "".join(body)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+          '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" w:header="708" w:footer="708" w:gutter="0"/>'
+          '</w:sectPr></w:body></w:document>')
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+        # Fixed timestamps: the same report always gives the same bytes
+        for name, content in list(_DOCX_PARTS.items()) + [('word/document.xml', document)]:
+            archive.writestr(zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0)), content,
+                             compress_type=zipfile.ZIP_DEFLATED)
+    return out.getvalue()
+
+
+class ExportFormat:
+    """A download format: how it is named, served and rendered."""
+
+    def __init__(self, key: str, label: str, extension: str, mime: str,
+                 render: Callable[[Report, Dict[str, str]], bytes], offload: bool = False):
+        self.key = key
+        self.label = label
+        self.extension = extension
+        self.mime = mime
+        self.render = render
+        # Rendered in the process pool rather than on the requesting thread
+        self.offload = offload
+
+
+EXPORT_FORMATS: Dict[str, ExportFormat] = OrderedDict((f.key, f) for f in (
+    ExportFormat('txt', "Text (.txt)", 'txt', 'text/plain', render_text),
+    ExportFormat('md', "Markdown (.md)", 'md', 'text/markdown', render_markdown),
+    ExportFormat('html', "Web page (.html)", 'html', 'text/html', render_html),
+    ExportFormat('pdf', "PDF (.pdf)", 'pdf', 'application/pdf', render_pdf, offload=True),
+    ExportFormat('docx', "Word (.docx)", 'docx',
+                 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', render_docx, offload=True),
+))
+
+
+def render_export(key: str, report: Report, cover: Dict[str, str]) -> bytes:
+    """``report`` in the format ``key``; the entry point of pool workers."""
+    return EXPORT_FORMATS[key].render(report, cover)
+
+
+def export_key(report: Report, cover: Dict[str, str], key: str) -> str:
+    cover_json = json.dumps(cover, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{key}\0{report.digest}\0{cover_json}".encode('utf-8')).hexdigest()
+
+
+class Exporter:
+    """Renders exports on request and keeps the most recent ones in memory."""
+
+    def __init__(self, workers: int = EXPORT_WORKERS, max_entries: int = CACHE_SIZE):
+        self._workers = workers
+        self._max_entries = max_entries
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'offloaded': 0}
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is None and self._workers > 0:
+                # Spawned, not forked: the server process has threads and open sockets
+                self._pool = ProcessPoolExecutor(self._workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _render(self, key: str, report: Report, cover: Dict[str, str]) -> bytes:
+        pool = self._executor() if EXPORT_FORMATS[key].offload else None
+        if pool is not None:
+            try:
+                data = pool.submit(render_export, key, report, cover).result(timeout=RENDER_TIMEOUT)
+                with self._lock:
+                    self.stats['offloaded'] += 1
+                return data
+            except BrokenProcessPool:
+                logger.warning("export worker pool broke; rendering %s in-process", key)
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+        return render_export(key, report, cover)
+
+    def export(self, report: Report, cover: Dict[str, str], key: str) -> bytes:
+        """``report`` rendered as ``key`` (see EXPORT_FORMATS), from the cache when possible."""
+        cache_key = export_key(report, cover, key)
+        with self._lock:
+            data = self._cache.get(cache_key)
+            if data is not None:
+                self._cache.move_to_end(cache_key)
+                self.stats['hits'] += 1
+                return data
+            self.stats['misses'] += 1
+        data = self._flights.join(cache_key, lambda publish, stats: self._render(key, report, cover)).wait()
+        with self._lock:
+            self._cache[cache_key] = data
+            while len(self._cache) > self._max_entries:
+                self._cache.popitem(last=False)
+        return data
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._cache), bytes=sum(map(len, self._cache.values())),
+                        workers=self._workers, coalesced=self._flights.stats['coalesced'])
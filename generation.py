@@ -0,0 +1,292 @@
+"""Streaming generation of restoration analyses.
+
+`stream_analysis` yields the report text chunk by chunk as the model
+produces it, falling back to the template report when the model cannot be
+reached, and records time-to-first-token and total latency for every
+request. The chunks are parsed into a `report_model.Report` as they
+arrive. `generate_sections` is the parallel alternative: every report
+section is requested concurrently and delivered as soon as it is done.
+Completed reports are stored as JSON in an optional `AnalysisCache`
+so repeated requests are answered without an API call, and an optional
+`SemanticCache` serves near-duplicate descriptions from earlier analyses.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, ContextManager, Dict, Generator, Iterator, Optional
+
+from instrumentation import observe
+from llm_client import async_call_with_retries, call_with_retries
+from report import (SECTION_TITLES, analysis_key, build_messages, build_section_messages,
+                    build_template_report, message_text, split_report_sections)
+from report_model import Report, ReportParser, ReportSchemaError, load_report, parse_report
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+SECTION_CONCURRENCY = int(os.getenv('ARTRESTORER_SECTION_CONCURRENCY', 6))
+# Expected completion lengths, used to charge the tokens-per-minute budget up front
+REPORT_COMPLETION_TOKENS = 1500
+SECTION_COMPLETION_TOKENS = 300
+
+Gate = Callable[[int, int], ContextManager[Any]]
+
+# Latency of the most recent requests, newest last
+latency_log = deque(maxlen=500)
+
+
+def _record(stats: Dict[str, Any]) -> None:
+    latency_log.append(dict(stats))
+    observe(f"generation.{stats['source']}", stats['total'])
+    if stats['ttft'] is not None:
+        observe(f"generation.{stats['source']}.ttft", stats['ttft'])
+    logger.info(
+        "analysis generated source=%s ttft=%.3fs total=%.3fs chars=%d",
+        stats['source'], stats['ttft'] or 0.0, stats['total'], stats['chars'],
+    )
+
+
+def estimate_tokens(messages, completion_tokens: int, image_tokens: int = 0) -> int:
+    """Rough prompt + completion token count (about four characters per token), plus attached images."""
+    return sum(len(message_text(message)) for message in messages) // 4 + completion_tokens + image_tokens
+
+
+def _image_tokens(inputs: Dict[str, Any], stats: Dict[str, Any]) -> int:
+    # Estimated tokens of the images sent with the request (see `vision`), recorded with what they saved
+    vision = inputs.get('vision')
+    if not vision or not vision.get('parts'):
+        return 0
+    stats.update(image_tokens=vision['tokens'], image_tokens_saved=vision['saved'])
+    return vision['tokens']
+
+
+def _admission(gate: Optional[Gate], requests: int, tokens: int) -> ContextManager[Any]:
+    return gate(requests, tokens) if gate is not None else nullcontext()
+
+
+def _load(stored: str) -> Optional[Report]:
+    try:
+        return load_report(stored)
+    except ReportSchemaError as exc:
+        logger.warning("ignoring unreadable cache entry: %s", exc)
+        return None
+
+
+def _lookup_cached(inputs: Dict[str, Any], key: str, stats: Dict[str, Any],
+                   cache=None, semantic=None) -> Optional[Report]:
+    if cache is not None:
+        cached = cache.get(key)
+        report = _load(cached) if cached is not None else None
+        if report is not None:
+            stats['source'] = 'cache'
+            return report
+    if semantic is not None:
+        match = semantic.lookup(inputs)
+        report = _load(match[0]) if match is not None else None
+        if report is not None:
+            stats['source'] = 'semantic'
+            stats['similarity'] = match[1]
+            return report
+    return None
+
+
+class AnalysisStream:
+    """Text chunks of one analysis; ``report`` holds the parsed report once iteration ends."""
+
+    def __init__(self, chunks: Generator[str, None, Report]):
+        self._chunks = chunks
+        self.report: Optional[Report] = None
+
+    def __iter__(self) -> Iterator[str]:
+        self.report = yield from self._chunks
+
+    def collect(self) -> Report:
+        """Consume the remaining chunks and return the report."""
+        for _ in self:
+            pass
+        return self.report
+
+
+def stream_analysis(client, inputs: Dict[str, Any], stats: Optional[Dict[str, Any]] = None,
+                    model: str = DEFAULT_MODEL, cache=None, semantic=None,
+                    gate: Optional[Gate] = None) -> AnalysisStream:
+    """Stream the analysis for ``inputs`` as it is generated.
+
+    Iterating the result yields text chunks; afterwards its ``report`` is
+    the parsed `Report`. ``stats`` is filled in place with ``source``
+    ('cache', 'semantic', 'openai' or 'template'), ``ttft`` and ``total``
+    (seconds) and ``chars`` once the stream ends. ``gate(requests, tokens)``, if given, returns a context
+    manager held around the upstream call (see `scheduler.FairScheduler.slot`);
+    cache hits never pass through it.
+    """
+    return AnalysisStream(_stream(client, inputs, {} if stats is None else stats, model, cache, semantic, gate))
+
+
+def _stream(client, inputs: Dict[str, Any], stats: Dict[str, Any], model: str, cache, semantic,
+            gate: Optional[Gate]) -> Generator[str, None, Report]:
+    stats.update({'source': 'openai', 'model': model, 'ttft': None, 'total': 0.0, 'chars': 0})
+    started = time.perf_counter()
+
+    def emit(text: str) -> str:
+        if stats['ttft'] is None:
+            stats['ttft'] = time.perf_counter() - started
+        stats['chars'] += len(text)
+        return text
+
+    key = analysis_key(inputs)
+    cached = _lookup_cached(inputs, key, stats, cache, semantic)
+    if cached is not None:
+        yield emit(cached.to_text())
+        stats['total'] = time.perf_counter() - started
+        _record(stats)
+        return cached
+
+    parser = ReportParser()
+    try:
+        if client is None:
+            raise RuntimeError("no OpenAI client configured")
+        messages = build_messages(inputs)
+        with _admission(gate, 1, estimate_tokens(messages, REPORT_COMPLETION_TOKENS, _image_tokens(inputs, stats))):
+            response = call_with_retries(
+                client.chat.completions.create,
+                model=model,
+                messages=messages,
+                temperature=inputs.get('temperature', 0.6),
+                stream=True,
+            )
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parser.feed(delta)
+                    yield emit(delta)
+        report = parser.close()
+        if cache is not None and stats['chars']:
+            cache.put(key, report.to_json())
+            if semantic is not None:
+                semantic.add(inputs, key)
+        return report
+    except Exception as exc:
+        if stats['chars'] == 0:
+            # Nothing was streamed yet: serve the offline template instead
+            logger.warning("falling back to template report: %s", exc)
+            stats['source'] = 'template'
+            stats['error'] = str(exc)
+            text = build_template_report(inputs)
+            yield emit(text)
+            return parse_report(text)
+        logger.warning("analysis stream interrupted: %s", exc)
+        stats['error'] = str(exc)
+        notice = "\n\n[Generation was interrupted — the analysis above may be incomplete.]\n"
+        parser.feed(notice)
+        yield emit(notice)
+        return parser.close()
+    finally:
+        stats['total'] = time.perf_counter() - started
+        _record(stats)
+
+
+async def _generate_section(client, inputs: Dict[str, Any], index: int, title: str, scaffold: str,
+                            model: str, semaphore: asyncio.Semaphore):
+    try:
+        async with semaphore:
+            response = await async_call_with_retries(
+                client.chat.completions.create,
+                model=model,
+                messages=build_section_messages(inputs, title, scaffold),
+                temperature=inputs.get('temperature', 0.6),
+            )
+        return index, (response.choices[0].message.content or "").strip("\n"), None
+    except Exception as exc:
+        return index, None, exc
+
+
+def generate_sections(async_client, inputs: Dict[str, Any],
+                      on_section: Optional[Callable[[int, str, str], None]] = None,
+                      stats: Optional[Dict[str, Any]] = None, model: str = DEFAULT_MODEL,
+                      cache=None, semantic=None, concurrency: int = SECTION_CONCURRENCY,
+                      runner: Callable[[Awaitable[Any]], Any] = asyncio.run,
+                      gate: Optional[Gate] = None) -> Report:
+    """Generate all report sections concurrently and return the assembled `Report`.
+
+    ``async_client`` is an AsyncOpenAI client usable on the event loop that
+    ``runner`` executes coroutines on (see `llm_client.AsyncRunner`).
+    ``on_section(index, title, body)`` is called in completion order as each
+    section finishes; sections that fail fall back to their template text.
+    ``stats`` is filled in as for `stream_analysis`, with ``ttft`` measured
+    to the first finished section; ``gate`` is acquired once for all sections.
+    """
+    if stats is None:
+        stats = {}
+    stats.update({'source': 'openai', 'model': model, 'ttft': None, 'total': 0.0, 'chars': 0,
+                  'mode': 'sections', 'fallback_sections': 0})
+    started = time.perf_counter()
+
+    key = analysis_key(inputs)
+    cached = _lookup_cached(inputs, key, stats, cache, semantic)
+    if cached is not None:
+        stats['ttft'] = stats['total'] = time.perf_counter() - started
+        stats['chars'] = len(cached.to_text())
+        _record(stats)
+        return cached
+
+    header, scaffolds, footer = split_report_sections(build_template_report(inputs))
+    bodies = [body for _, body in scaffolds]
+
+    def deliver(index: int, body: str) -> None:
+        if stats['ttft'] is None:
+            stats['ttft'] = time.perf_counter() - started
+        stats['chars'] += len(body)
+        bodies[index] = body
+        if on_section is not None:
+            on_section(index, scaffolds[index][0], body)
+
+    async def run() -> None:
+        client = async_client
+        try:
+            if client is None:
+                raise RuntimeError("no OpenAI client configured")
+            semaphore = asyncio.Semaphore(concurrency)
+            pending = [
+                asyncio.ensure_future(_generate_section(client, inputs, i, title, scaffold, model, semaphore))
+                for i, (title, scaffold) in enumerate(scaffolds)
+            ]
+            for future in asyncio.as_completed(pending):
+                index, body, exc = await future
+                if exc is not None:
+                    logger.warning("section %s fell back to template: %s", scaffolds[index][0], exc)
+                    stats['fallback_sections'] += 1
+                    stats['error'] = str(exc)
+                    body = scaffolds[index][1]
+                deliver(index, body)
+            if stats['fallback_sections'] == len(scaffolds):
+                stats['source'] = 'template'
+        except Exception as exc:
+            logger.warning("falling back to template report: %s", exc)
+            stats['source'] = 'template'
+            stats['error'] = str(exc)
+            for i, (_, scaffold) in enumerate(scaffolds):
+                deliver(i, scaffold)
+
+    try:
+        if async_client is None:
+            runner(run())
+        else:
+            tokens = sum(estimate_tokens(build_section_messages(inputs, title, scaffold), SECTION_COMPLETION_TOKENS)
+                         for title, scaffold in scaffolds) + _image_tokens(inputs, stats)
+            with _admission(gate, len(scaffolds), tokens):
+                runner(run())
+    finally:
+        stats['total'] = time.perf_counter() - started
+        _record(stats)
+
+    report = Report.from_parts(header, list(zip(SECTION_TITLES, bodies)), footer)
+    if cache is not None and stats['source'] == 'openai' and not stats['fallback_sections']:
+        cache.put(key, report.to_json())
+        if semantic is not None:
+            semantic.add(inputs, key)
+    return report
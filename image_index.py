@@ -0,0 +1,243 @@
+"""Perceptual-hash index of uploaded artworks.
+
+Every stored image gets two 64-bit perceptual hashes of its display
+thumbnail: a pHash (the low 8x8 DCT coefficients of a 32x32 greyscale copy,
+each above or below their median) and a dHash (whether each pixel of a 9x8
+greyscale copy is brighter than its right neighbour). A re-photographed,
+re-scanned, resized or re-compressed copy of an artwork lands within a few
+bits of the original, so two images match when both hashes are within
+``radius`` bits of each other.
+
+Lookups use multi-index hashing. Each pHash is split into four 16-bit words,
+and two hashes within ``radius`` bits must agree to within ``radius // 4``
+bits on at least one word. Each word has its own sorted table, so a lookup
+binary-searches the few buckets near each of its words and checks only the
+hashes found there. Hashes live in the analyses database, next to the
+analyses generated for each image.
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from images import ImageError, ImageStore, StoredImage
+from report import analysis_key
+
+DEFAULT_RADIUS = int(os.getenv('ARTRESTORER_IMAGE_MATCH_BITS') or 10)
+
+_WORDS = 4
+# Additions kept unsorted, and scanned in full by every lookup, before the word tables are rebuilt
+_TAIL = 4096
+_SIDE = 32
+# Rows of the DCT-II basis for the 8 lowest frequencies of a 32-sample signal
+_DCT = np.cos(np.pi * np.outer(np.arange(8), 2 * np.arange(_SIDE) + 1) / (2 * _SIDE))
+_VALUES = np.arange(1 << 16, dtype=np.uint16)
+# Word values within 0, 1, 2... bits of zero, i.e. the XOR masks to probe around a word
+_FLIPS = [_VALUES[np.bitwise_count(_VALUES) <= bits] for bits in range(4)]
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def perceptual_hashes(image: Image.Image) -> Tuple[int, int]:
+    """(pHash, dHash) of ``image`` as unsigned 64-bit integers."""
+    grey = image.convert('L')
+    small = np.asarray(grey.resize((_SIDE, _SIDE), Image.Resampling.BOX), dtype=np.float64)
+    low = (_DCT @ small @ _DCT.T).ravel()
+    strip = np.asarray(grey.resize((9, 8), Image.Resampling.BOX), dtype=np.int16)
+    return _pack(low > np.median(low)), _pack(strip[:, 1:] > strip[:, :-1])
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class _MultiIndex:
+    """pHashes in sorted 16-bit word tables, plus an unsorted tail of recent additions, and their dHashes."""
+
+    def __init__(self):
+        self.hashes = np.zeros(1024, dtype=np.uint64)
+        self.dhashes = np.zeros(1024, dtype=np.uint64)
+        self.size = 0
+        self.rebuilds = 0
+        self._sorted = 0
+        self._tables: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def extend(self, hashes: np.ndarray, dhashes: np.ndarray) -> None:
+        if self.size + len(hashes) > len(self.hashes):
+            capacity = max(len(self.hashes) * 2, self.size + len(hashes))
+            for name in ('hashes', 'dhashes'):
+                grown = np.zeros(capacity, dtype=np.uint64)
+                grown[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, grown)
+        self.hashes[self.size:self.size + len(hashes)] = hashes
+        self.dhashes[self.size:self.size + len(hashes)] = dhashes
+        self.size += len(hashes)
+        if self.size - self._sorted > _TAIL:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        hashes = self.hashes[:self.size]
+        self._tables = []
+        for word in range(_WORDS):
+            values = ((hashes >> np.uint64(16 * word)) & np.uint64(0xFFFF)).astype(np.uint16)
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            # Bucket v of this word is order[offsets[v]:offsets[v + 1]]; its hashes are copied alongside
+            # so the distance check reads them in sequence
+            offsets = np.zeros(len(_VALUES) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(values, minlength=len(_VALUES)), out=offsets[1:])
+            self._tables.append((offsets, order, hashes[order]))
+        self._sorted = self.size
+        self.rebuilds += 1
+
+    def within(self, value: int, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Positions of the hashes within ``radius`` bits of ``value``, and their distances."""
+        flips = _FLIPS[radius // _WORDS] if radius // _WORDS < len(_FLIPS) else _VALUES
+        target = np.uint64(value)
+        tail = np.arange(self._sorted, self.size, dtype=np.int32)
+        found = [tail[np.bitwise_count(self.hashes[tail] ^ target) <= radius]]
+        for word, (offsets, order, hashes) in enumerate(self._tables):
+            probes = flips ^ np.uint16((value >> (16 * word)) & 0xFFFF)
+            starts = offsets[probes]
+            lengths = offsets[1:][probes] - starts
+            total = int(lengths.sum())
+            if total:
+                # Concatenated [start, start + length) ranges, without a Python loop over buckets
+                slots = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+                found.append(order[slots[np.bitwise_count(hashes[slots] ^ target) <= radius]])
+        # A hash near on several words is found once per word
+        close = np.unique(np.concatenate(found))
+        return close, np.bitwise_count(self.hashes[close] ^ target)
+
+
+class ImageIndex:
+    """Perceptual hashes of every stored image, and the analyses generated for each one."""
+
+    def __init__(self, cache, store: ImageStore, radius: int = DEFAULT_RADIUS):
+        self.cache = cache
+        self.store = store
+        self.radius = radius
+        self.stats = {'indexed': 0, 'lookups': 0, 'matches': 0, 'lookup_seconds': 0.0}
+        self._index = _MultiIndex()
+        self._digests: List[str] = []
+        self._names: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_index ("
+            " digest TEXT PRIMARY KEY, phash INTEGER NOT NULL, dhash INTEGER NOT NULL,"
+            " name TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_analyses ("
+            " digest TEXT NOT NULL, key TEXT NOT NULL, request TEXT NOT NULL, label TEXT NOT NULL,"
+            " created REAL NOT NULL, PRIMARY KEY (digest, key))"
+        )
+        self._load()
+
+    def _load(self) -> None:
+        rows = self._conn.execute("SELECT digest, phash, dhash, name FROM image_index ORDER BY created").fetchall()
+        if rows:
+            digests, phashes, dhashes, names = zip(*rows)
+            self._append(list(digests), list(names), np.array(phashes, dtype=np.int64).view(np.uint64),
+                         np.array(dhashes, dtype=np.int64).view(np.uint64))
+
+    def _append(self, digests: List[str], names: List[str], phashes: np.ndarray, dhashes: np.ndarray) -> None:
+        self._positions.update((digest, len(self._digests) + i) for i, digest in enumerate(digests))
+        self._digests.extend(digests)
+        self._names.extend(names)
+        self._index.extend(phashes, dhashes)
+
+    def add(self, image: StoredImage) -> None:
+        """Index ``image`` by the hashes of its display thumbnail; already indexed images are skipped."""
+        with self._lock:
+            if image.digest in self._positions:
+                return
+        try:
+            with Image.open(io.BytesIO(self.store.thumbnail(image))) as thumbnail:
+                phash, dhash = perceptual_hashes(thumbnail)
+        except OSError as exc:
+            raise ImageError(f"cannot hash {image.name}: {exc}") from exc
+        with self._lock:
+            if image.digest in self._positions:
+                return
+            self._append([image.digest], [image.name], np.array([phash], dtype=np.uint64),
+                         np.array([dhash], dtype=np.uint64))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_index (digest, phash, dhash, name, created) VALUES (?, ?, ?, ?, ?)",
+                (image.digest, _signed(phash), _signed(dhash), image.name, time.time()),
+            )
+            self.stats['indexed'] += 1
+
+    def matches(self, image: StoredImage) -> List[Tuple[str, str, int]]:
+        """(digest, name, pHash distance) of every indexed image that looks like ``image``, closest first."""
+        started = time.perf_counter()
+        with self._lock:
+            position = self._positions.get(image.digest)
+            if position is None:
+                return []
+            phash = int(self._index.hashes[position])
+            candidates, distances = self._index.within(phash, self.radius)
+            dhashes = self._index.dhashes
+            close = np.bitwise_count(dhashes[candidates] ^ dhashes[position]) <= self.radius
+            found = sorted((int(distance), self._digests[candidate], self._names[candidate])
+                           for candidate, distance in zip(candidates[close], distances[close]))
+            self.stats['lookups'] += 1
+            self.stats['matches'] += len(found) - 1
+            self.stats['lookup_seconds'] += time.perf_counter() - started
+        return [(digest, name, distance) for distance, digest, name in found]
+
+    def link(self, image: StoredImage, request: Dict[str, Any], label: str) -> None:
+        """Record that the analysis ``request`` was generated for ``image``."""
+        if request.get('vision'):
+            # The images sent with it are not kept; the content hash still gives the request its key
+            request = dict(request, vision={key: value for key, value in request['vision'].items() if key != 'parts'})
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO image_analyses (digest, key, request, label, created) VALUES (?, ?, ?, ?, ?)",
+                (image.digest, analysis_key(request), json.dumps(request, ensure_ascii=False), label, time.time()),
+            )
+
+    def earlier_analyses(self, image: StoredImage, matches=None) -> List[Dict[str, Any]]:
+        """Analyses still in the cache for ``image`` or any image like it, newest first.
+
+        ``matches`` is the result of `matches` for ``image``, when the caller already has it.
+        """
+        found = {digest: (name, distance) for digest, name, distance in
+                 (self.matches(image) if matches is None else matches)}
+        if not found:
+            return []
+        marks = ", ".join("?" * len(found))
+        with self._lock:
+            # Only analyses that are still cached can be opened without generating them again
+            rows = self._conn.execute(
+                "SELECT l.digest, l.key, l.request, l.label, l.created FROM image_analyses l"
+                " JOIN analyses a ON a.key = l.key"
+                f" WHERE l.digest IN ({marks}) AND a.expires > ? ORDER BY l.created DESC",
+                (*found, time.time()),
+            ).fetchall()
+        analyses, seen = [], set()
+        for digest, key, request, label, created in rows:
+            if key in seen:
+                continue
+            seen.add(key)
+            name, distance = found[digest]
+            analyses.append({'key': key, 'request': json.loads(request), 'label': label, 'created': created,
+                             'name': name, 'distance': distance, 'same_file': digest == image.digest})
+        return analyses
+
+    def metrics(self) -> Dict[str, Any]:
+        """Lookup counters plus the number of indexed images."""
+        with self._lock:
+            lookups = self.stats['lookups']
+            return dict(self.stats, entries=len(self._digests), radius=self.radius, rebuilds=self._index.rebuilds,
+                        mean_lookup_ms=1000 * self.stats['lookup_seconds'] / lookups if lookups else 0.0)
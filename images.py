@@ -0,0 +1,326 @@
+"""Uploaded artwork images, stored by content hash.
+
+An upload is read once, in chunks: it is hashed while it is spooled to
+``<cache dir>/images/originals/<sha256>``, so neither the session nor the
+store keeps the original in memory. Only the header is parsed at that
+point. Pixels are decoded when a thumbnail is first asked for, with the
+EXIF orientation applied; thumbnails come in fixed sizes (``display`` for
+the page, ``analysis`` for local image analysis), are written next to the
+originals and kept in a small in-memory LRU, so every session showing the
+same scan shares them. The store is evicted least-recently-used first once
+it exceeds its size budget.
+
+TIFF scans are never decoded whole: they are read in bands into a tile
+pyramid (see `tiles`) under ``images/pyramids/<sha256>``, and thumbnails,
+analysis working copies and the zoomable viewer all read from it. JPEG and
+PNG images get a pyramid too, when the viewer first asks for one.
+"""
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from analysis_cache import CACHE_DIR
+from tiles import TILE, Box, Pyramid, is_tiff, open_source, to_rgb
+
+IMAGE_DIR = os.path.join(CACHE_DIR, 'images')
+DEFAULT_MAX_BYTES = int(float(os.getenv('ARTRESTORER_IMAGE_STORE_MAX_MB', 2048)) * 1024 * 1024)
+# Longest edge in pixels, encoder and its options for each thumbnail kind
+THUMBNAILS = {
+    'display': (960, 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'analysis': (1024, 'PNG', {'compress_level': 1}),
+}
+# Thumbnail bytes kept in memory, across every session of the process
+MEMORY_BYTES = 32 * 1024 * 1024
+# Decoded viewer tiles kept in memory, across every session of the process
+TILE_MEMORY_BYTES = 64 * 1024 * 1024
+FORMATS = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'TIFF': 'image/tiff'}
+CHUNK_SIZE = 1024 * 1024
+
+# EXIF orientations that turn the image by 90 degrees
+_TRANSPOSED = {5, 6, 7, 8}
+
+
+class ImageError(ValueError):
+    """The upload is not an image this store can read."""
+
+
+class StoredImage:
+    """An ingested upload: where the original is and what it is, without its pixels."""
+
+    def __init__(self, digest: str, path: str, name: str, size: int, image_format: str,
+                 width: int, height: int):
+        self.digest = digest
+        self.path = path
+        self.name = name
+        self.size = size
+        self.format = image_format
+        # As displayed, i.e. after the EXIF orientation is applied
+        self.width = width
+        self.height = height
+
+    @property
+    def mime(self) -> str:
+        return FORMATS[self.format]
+
+    @property
+    def megapixels(self) -> float:
+        return self.width * self.height / 1e6
+
+    def open(self) -> Image.Image:
+        """The original, decoded lazily by Pillow; the caller closes it."""
+        return Image.open(self.path)
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of the file at ``path``, read in chunks; the name the store gives the same upload."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _oriented_size(image: Image.Image) -> Tuple[int, int]:
+    width, height = image.size
+    orientation = image.getexif().get(0x0112)
+    return (height, width) if orientation in _TRANSPOSED else (width, height)
+
+
+_pyramid_locks: Dict[str, threading.Lock] = {}
+_pyramid_locks_guard = threading.Lock()
+
+
+def pyramid_directory(path: str) -> str:
+    """Where the pyramid of the image at ``path`` is kept: next to the originals for stored images."""
+    parent, name = os.path.split(os.path.abspath(path))
+    if os.path.basename(parent) == 'originals':
+        return os.path.join(os.path.dirname(parent), 'pyramids', name)
+    stat = os.stat(path)
+    key = hashlib.sha256(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return os.path.join(IMAGE_DIR, 'pyramids', key)
+
+
+def pyramid(path: str) -> Pyramid:
+    """The tile pyramid of the image at ``path``, built on first use; raises ImageError if it cannot be read."""
+    directory = pyramid_directory(path)
+    with _pyramid_locks_guard:
+        lock = _pyramid_locks.setdefault(directory, threading.Lock())
+    # One build per image in this process; concurrent callers wait for it and share the result
+    with lock:
+        try:
+            if os.path.exists(os.path.join(directory, 'pyramid.json')):
+                return Pyramid(directory)
+            return Pyramid.build(open_source(path), directory)
+        except (Image.DecompressionBombError, OSError, ValueError) as exc:
+            raise ImageError(f"cannot read image: {exc}") from exc
+
+
+def load_rgb(path: str, edge: int) -> Image.Image:
+    """The image at ``path`` upright, in RGB and no more than ``edge`` pixels on its longest side."""
+    if is_tiff(path):
+        return pyramid(path).image(edge)
+    with Image.open(path) as image:
+        # JPEG decodes straight to a reduced scale (1/2 .. 1/8) that is still larger than the result
+        scale = edge / max(image.size)
+        if scale < 1:
+            image.draft('RGB', (int(image.width * scale), int(image.height * scale)))
+        image = to_rgb(ImageOps.exif_transpose(image))
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+def render_thumbnail(path: str, kind: str) -> bytes:
+    """The encoded ``kind`` thumbnail of the image at ``path``."""
+    edge, image_format, options = THUMBNAILS[kind]
+    out = io.BytesIO()
+    load_rgb(path, edge).save(out, image_format, **options)
+    return out.getvalue()
+
+
+class ImageStore:
+    """Originals spooled to disk by content hash, and their thumbnails."""
+
+    def __init__(self, directory: str = IMAGE_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 memory_bytes: int = MEMORY_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self._originals = os.path.join(directory, 'originals')
+        self._thumbnails = os.path.join(directory, 'thumbnails')
+        self._pyramids = os.path.join(directory, 'pyramids')
+        for path in (self._originals, self._thumbnails, self._pyramids):
+            os.makedirs(path, exist_ok=True)
+        self._memory: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._tiles: "OrderedDict[Tuple[str, int, int, int], np.ndarray]" = OrderedDict()
+        self._tiles_used = 0
+        self._lock = threading.Lock()
+        self.stats = {'ingested': 0, 'duplicates': 0, 'rendered': 0, 'memory_hits': 0, 'disk_hits': 0,
+                      'evictions': 0, 'tiles_read': 0, 'tile_hits': 0}
+
+    def ingest(self, upload: BinaryIO, name: str) -> StoredImage:
+        """Hash and spool ``upload`` to disk; raises ImageError if it is not a PNG, JPEG or TIFF image."""
+        digest = hashlib.sha256()
+        size = 0
+        upload.seek(0)
+        fd, tmp_path = tempfile.mkstemp(dir=self._originals, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                for chunk in iter(lambda: upload.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+            key = digest.hexdigest()
+            path = os.path.join(self._originals, key)
+            image_format, width, height = self._probe(tmp_path)
+            duplicate = os.path.exists(path)
+            if duplicate:
+                os.remove(tmp_path)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+            with self._lock:
+                self.stats['duplicates' if duplicate else 'ingested'] += 1
+            if not duplicate:
+                self._evict(keep=key)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredImage(key, path, name, size, image_format, width, height)
+
+    @staticmethod
+    def _probe(path: str) -> Tuple[str, int, int]:
+        # Reads the header only; the pixels are decoded when a thumbnail is made. Opening the source
+        # also refuses images that could not be decoded within the memory budget.
+        try:
+            source = open_source(path)
+            if source.format not in FORMATS:
+                raise ImageError(f"unsupported image format {source.format}")
+            if source.format == 'TIFF':
+                return source.format, source.width, source.height
+            with Image.open(path) as image:
+                return (image.format,) + _oriented_size(image)
+        except UnidentifiedImageError as exc:
+            raise ImageError("not a PNG, JPEG or TIFF image") from exc
+        except ImageError:
+            raise
+        except (Image.DecompressionBombError, OSError, ValueError) as exc:
+            raise ImageError(f"cannot read image: {exc}") from exc
+
+    def thumbnail(self, image: StoredImage, kind: str = 'display') -> bytes:
+        """The ``kind`` thumbnail of ``image`` (see THUMBNAILS), rendered on first use."""
+        key = (image.digest, kind)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return data
+        path = os.path.join(self._thumbnails, f"{image.digest}.{kind}")
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+            source = 'disk_hits'
+        except FileNotFoundError:
+            try:
+                data = render_thumbnail(image.path, kind)
+            except (Image.DecompressionBombError, OSError) as exc:
+                raise ImageError(f"cannot decode {image.name}: {exc}") from exc
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+            source = 'rendered'
+        with self._lock:
+            self.stats[source] += 1
+            if key not in self._memory:
+                self._memory[key] = data
+                self._memory_used += len(data)
+            while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_used -= len(dropped)
+        return data
+
+    def pyramid(self, image: StoredImage) -> Pyramid:
+        """The tile pyramid of ``image``, built on first use."""
+        return pyramid(image.path)
+
+    def view(self, image: StoredImage, level: int, box: Box) -> bytes:
+        """JPEG of ``box`` at pyramid ``level``, assembled from only the tiles it overlaps."""
+        levels = self.pyramid(image)
+        x0, y0, x1, y1 = box
+        canvas = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for row in range(y0 // TILE, (y1 - 1) // TILE + 1):
+            for col in range(x0 // TILE, (x1 - 1) // TILE + 1):
+                tile = self._tile(image.digest, levels, level, col, row)
+                left, top = col * TILE, row * TILE
+                cx0, cy0 = max(x0, left), max(y0, top)
+                cx1, cy1 = min(x1, left + tile.shape[1]), min(y1, top + tile.shape[0])
+                canvas[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = tile[cy0 - top:cy1 - top, cx0 - left:cx1 - left]
+        out = io.BytesIO()
+        Image.fromarray(canvas).save(out, 'JPEG', quality=85)
+        return out.getvalue()
+
+    def _tile(self, digest: str, levels: Pyramid, level: int, col: int, row: int) -> np.ndarray:
+        key = (digest, level, col, row)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.stats['tile_hits'] += 1
+                return tile
+        tile = levels.tile(level, col, row)
+        with self._lock:
+            self.stats['tiles_read'] += 1
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self._tiles_used += tile.nbytes
+            while self._tiles_used > TILE_MEMORY_BYTES and len(self._tiles) > 1:
+                _, dropped = self._tiles.popitem(last=False)
+                self._tiles_used -= dropped.nbytes
+        return tile
+
+    def _evict(self, keep: str) -> None:
+        # Oldest originals first (ingest touches re-uploads), with their thumbnails and pyramids
+        entries = []
+        for entry in os.scandir(self._originals):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                levels = os.path.join(self._pyramids, entry.name)
+                size = stat.st_size + (sum(level.stat().st_size for level in os.scandir(levels))
+                                       if os.path.isdir(levels) else 0)
+                entries.append((stat.st_mtime, size, entry.name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            for path in [os.path.join(self._originals, name)] + [
+                    os.path.join(self._thumbnails, f"{name}.{kind}") for kind in THUMBNAILS]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            shutil.rmtree(os.path.join(self._pyramids, name), ignore_errors=True)
+            total -= size
+            self.stats['evictions'] += 1
+        with self._lock:
+            for key in [key for key in self._memory if not os.path.exists(os.path.join(self._originals, key[0]))]:
+                self._memory_used -= len(self._memory.pop(key))
+            for key in [key for key in self._tiles if not os.path.exists(os.path.join(self._originals, key[0]))]:
+                self._tiles_used -= self._tiles.pop(key).nbytes
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory), memory_bytes=self._memory_used,
+                        tile_entries=len(self._tiles), tile_bytes=self._tiles_used)
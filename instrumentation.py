@@ -0,0 +1,242 @@
+"""Lightweight timing spans aggregated into latency histograms.
+
+Wrap a hot-path block in ``with span('name'):`` (or ``start_span(name)`` /
+``.stop()`` where a block cannot be indented, ``@timed('name')`` for a
+whole function) and its duration lands in a process-wide histogram with
+Prometheus-style cumulative buckets. The histograms can be read as a dict for the diagnostics page, rendered in the
+Prometheus text exposition format, served over HTTP or written to a file
+for the node_exporter textfile collector.
+
+Set ``ARTRESTORER_METRICS=0`` to disable: spans then return a shared no-op
+object, so an instrumented block costs one function call.
+"""
+import functools
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+ENABLED = os.getenv('ARTRESTORER_METRICS', '1').lower() not in ('0', 'false', 'no', 'off')
+METRICS_PORT = int(os.getenv('ARTRESTORER_METRICS_PORT', 0))
+METRICS_FILE = os.getenv('ARTRESTORER_METRICS_FILE', '')
+# Minimum seconds between rewrites of METRICS_FILE
+METRICS_FILE_INTERVAL = float(os.getenv('ARTRESTORER_METRICS_FILE_INTERVAL', 15))
+
+# Upper bounds in seconds; chosen to resolve both sub-millisecond blocks and LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Bucketed distribution of durations with count and sum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Upper bound of the bucket holding the ``fraction`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+_histograms: Dict[str, Histogram] = {}
+_lock = threading.Lock()
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record one duration for ``name``."""
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+
+    def stop(self) -> None:
+        observe(self.name, time.perf_counter() - self.started)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def stop(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Context manager timing the enclosed block as ``name``."""
+    return _Span(name) if ENABLED else _NOOP
+
+
+def start_span(name: str):
+    """Start timing ``name`` now; call ``.stop()`` on the result to record it."""
+    return _Span(name) if ENABLED else _NOOP
+
+
+def timed(name: str):
+    """Decorator timing every call of the wrapped function as ``name``."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Per-span count, total, mean and approximate p50/p95/p99 in seconds."""
+    with _lock:
+        items = sorted(_histograms.items())
+        return {
+            name: {
+                'count': h.count,
+                'total': h.sum,
+                'mean': h.sum / h.count if h.count else 0.0,
+                'p50': h.quantile(0.50),
+                'p95': h.quantile(0.95),
+                'p99': h.quantile(0.99),
+            }
+            for name, h in items
+        }
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == math.inf else repr(bound)
+
+
+def prometheus_text(gauges: Optional[Dict[str, float]] = None) -> str:
+    """All span histograms, plus ``gauges`` (name -> value), in Prometheus text format."""
+    lines: List[str] = [
+        '# HELP artrestorer_span_seconds Duration of instrumented code blocks.',
+        '# TYPE artrestorer_span_seconds histogram',
+    ]
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            label = f'span="{_escape(name)}"'
+            cumulative = 0
+            for bound, count in zip(h.buckets + (math.inf,), h.counts):
+                cumulative += count
+                lines.append(f'artrestorer_span_seconds_bucket{{{label},le="{_format_bound(bound)}"}} {cumulative}')
+            lines.append(f'artrestorer_span_seconds_sum{{{label}}} {h.sum!r}')
+            lines.append(f'artrestorer_span_seconds_count{{{label}}} {h.count}')
+    for name, value in sorted((gauges or {}).items()):
+        metric = 'artrestorer_' + ''.join(c if c.isalnum() else '_' for c in name)
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {float(value)!r}')
+    return "\n".join(lines) + "\n"
+
+
+def flatten(metrics: Dict[str, object], prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a nested metrics dict as ``a_b_c`` -> value, for use as gauges."""
+    flat: Dict[str, float] = {}
+    for key, value in metrics.items():
+        name = f"{prefix}_{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def write_prometheus_file(path: str, gauges: Optional[Dict[str, float]] = None) -> None:
+    """Atomically replace ``path`` with the current metrics (textfile collector format)."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as fh:
+        fh.write(prometheus_text(gauges))
+    os.replace(tmp_path, path)
+
+
+_file_written = -math.inf
+
+
+def export_to_file(gauges: Callable[[], Dict[str, float]] = dict, path: str = METRICS_FILE,
+                   interval: float = METRICS_FILE_INTERVAL) -> bool:
+    """Rewrite ``path`` if ``interval`` seconds have passed since the last write; True if written."""
+    global _file_written
+    if not path:
+        return False
+    now = time.monotonic()
+    with _lock:
+        if now - _file_written < interval:
+            return False
+        _file_written = now
+    write_prometheus_file(path, gauges())
+    return True
+
+
+def serve_metrics(port: int, gauges: Callable[[], Dict[str, float]] = dict,
+                  host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve ``GET /metrics`` in Prometheus text format from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = prometheus_text(gauges()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
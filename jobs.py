@@ -0,0 +1,125 @@
+"""Background analysis jobs.
+
+Generation runs on a process-wide thread pool instead of inside a Streamlit
+script run, so the UI stays interactive while analyses are produced and a
+job keeps running when its session navigates to another page. Sessions only
+keep job ids; progress is read back from the `Job` by polling.
+"""
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 32
+# Finished jobs are forgotten after this many seconds
+RETENTION_SECONDS = 3600
+
+
+class Job:
+    """State of one background analysis, safe to read from any thread."""
+
+    def __init__(self, job_id: str, label: str, owner: str):
+        self.id = job_id
+        self.label = label
+        self.owner = owner
+        self.state = 'queued'
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.items: List[Any] = []
+        self.info: Dict[str, Any] = {}
+        self.stats: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.state in ('done', 'failed')
+
+    def publish(self, item: Any) -> None:
+        """Append a partial result (stream chunk or finished section)."""
+        with self._lock:
+            self.items.append(item)
+
+    def snapshot(self) -> List[Any]:
+        """Partial results published so far."""
+        with self._lock:
+            return list(self.items)
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps them addressable by id."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-job")
+        self._jobs: Dict[str, Job] = {}
+        # Job id last submitted under each key of `submit_once`
+        self._keys: Dict[str, str] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., Any], *args, label: str = "", owner: str = "", **kwargs) -> Job:
+        """Schedule ``fn(job, *args, **kwargs)``; its return value becomes ``job.result``."""
+        self._prune()
+        with self._lock:
+            job = Job(f"job-{next(self._ids)}", label, owner)
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def submit_once(self, key: str, fn: Callable[..., Any], *args, label: str = "", owner: str = "",
+                    **kwargs) -> Job:
+        """Like `submit`, unless the job last submitted with ``key`` is unfinished: that job is returned instead."""
+        self._prune()
+        with self._lock:
+            job = self._jobs.get(self._keys.get(key, ''))
+            if job is not None and not job.done:
+                return job
+            job = Job(f"job-{next(self._ids)}", label, owner)
+            self._jobs[job.id] = job
+            self._keys[key] = job.id
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def running(self, key: str) -> Optional[Job]:
+        """The unfinished job last submitted with ``key``, if any."""
+        with self._lock:
+            job = self._jobs.get(self._keys.get(key, ''))
+            return job if job is not None and not job.done else None
+
+    def _run(self, job: Job, fn, args, kwargs) -> None:
+        job.state = 'running'
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.state = 'done'
+        except Exception as exc:
+            logger.exception("background job %s failed", job.id)
+            job.error = str(exc)
+            job.state = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - RETENTION_SECONDS
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished < cutoff]:
+                del self._jobs[job_id]
+            for key in [key for key, job_id in self._keys.items() if job_id not in self._jobs]:
+                del self._keys[key]
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """The job with ``job_id``, or None if it is unknown or was pruned."""
+        with self._lock:
+            return self._jobs.get(job_id) if job_id else None
+
+    def metrics(self) -> Dict[str, int]:
+        """Number of known jobs in each state."""
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+        return counts
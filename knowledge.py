@@ -0,0 +1,47 @@
+"""Reference data shared by the UI, the analysis engine and the CLI.
+
+Feature choices and descriptions, the style/damage/context vocabularies
+offered in the analysis form, the feature gallery and the cultural
+insights, derived once per process from the frozen data `catalog`.
+"""
+from typing import Optional
+
+from catalog import get_catalog
+
+_catalog = get_catalog()
+
+# The analysis form's feature choices, numbered in catalog order, and the short key of each
+FEATURE_OPTIONS = tuple(f"{number}. {feature['icon']} {feature.get('option_label', feature['title'])}"
+                        for number, feature in enumerate(_catalog.features, 1))
+FEATURE_KEYS = tuple(feature['key'] for feature in _catalog.features)
+FEATURE_DESCRIPTIONS = {feature['key']: feature['description'] for feature in _catalog.features}
+
+ART_STYLES = _catalog.art_styles
+DAMAGE_TYPES = _catalog.damage_types
+CULTURAL_CONTEXTS = _catalog.cultural_contexts
+# Select box options, with a leading blank for "not specified"
+ART_STYLE_CHOICES = ("",) + ART_STYLES
+DAMAGE_TYPE_CHOICES = ("",) + DAMAGE_TYPES
+CULTURAL_CONTEXT_CHOICES = ("",) + CULTURAL_CONTEXTS
+
+# Gallery cards: icon, title, description and use cases of every feature
+FEATURE_GALLERY = _catalog.features
+FEATURE_TITLES = tuple(feature['title'] for feature in FEATURE_GALLERY)
+# Quiz pool: every use case with the title of the feature it belongs to
+QUIZ_CASES = tuple({'case': case, 'feature': feature['title']} for feature in FEATURE_GALLERY for case in feature['cases'])
+
+# Insight name -> emoji, period, background, importance, restoration, techniques, famous_works
+CULTURAL_INSIGHTS = _catalog.cultural_insights
+INSIGHT_NAMES = tuple(CULTURAL_INSIGHTS)
+
+
+def resolve_feature(value: Optional[str]) -> str:
+    """Map a feature number (1-10), short key or full label to its FEATURE_OPTIONS label."""
+    if not value:
+        return FEATURE_OPTIONS[0]
+    value = str(value).strip()
+    if value.isdigit() and 1 <= int(value) <= len(FEATURE_OPTIONS):
+        return FEATURE_OPTIONS[int(value) - 1]
+    if value in FEATURE_KEYS:
+        return FEATURE_OPTIONS[FEATURE_KEYS.index(value)]
+    return value
@@ -0,0 +1,78 @@
+"""Selectable LLM backends.
+
+A backend says where chat completions are sent and with which
+credentials; the pooled clients from `llm_client` are built from it. Two
+backends ship with the app and more can be added with `register_backend`:
+
+* ``openai`` (default): the OpenAI API with ``OPENAI_API_KEY``, or any
+  compatible endpoint given as ``OPENAI_BASE_URL``.
+* ``standin``: the local `standin_server`, at ``ARTRESTORER_STANDIN_URL``
+  or, when that is unset, embedded in this process on a free port.
+
+Select one with ``ARTRESTORER_LLM_BACKEND``.
+"""
+import os
+from typing import Any, Callable, Dict, Optional
+
+from llm_client import AsyncRunner, create_client
+
+BACKEND = os.getenv('ARTRESTORER_LLM_BACKEND', 'openai')
+STANDIN_URL = os.getenv('ARTRESTORER_STANDIN_URL')
+
+
+class LLMBackend:
+    """Endpoint and credentials for an OpenAI-compatible chat-completions service."""
+
+    def __init__(self, name: str, api_key: str, base_url: Optional[str] = None):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {'base_url': self.base_url} if self.base_url else {}
+
+    def create_client(self):
+        """Sync pooled client for this backend."""
+        return create_client(self.api_key, **self._client_kwargs())
+
+    def create_runner(self) -> AsyncRunner:
+        """Event loop thread owning an async pooled client for this backend."""
+        return AsyncRunner(self.api_key, **self._client_kwargs())
+
+    def describe(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'base_url': self.base_url or 'https://api.openai.com/v1'}
+
+
+def _openai_backend() -> Optional[LLMBackend]:
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        return None
+    return LLMBackend('openai', api_key, os.getenv('OPENAI_BASE_URL'))
+
+
+def _standin_backend() -> LLMBackend:
+    base_url = STANDIN_URL
+    if not base_url:
+        from standin_server import serve_in_thread
+        base_url = serve_in_thread().base_url
+    # The stand-in ignores credentials, but the client requires a key
+    return LLMBackend('standin', 'standin', base_url)
+
+
+_BACKENDS: Dict[str, Callable[[], Optional[LLMBackend]]] = {
+    'openai': _openai_backend,
+    'standin': _standin_backend,
+}
+
+
+def register_backend(name: str, factory: Callable[[], Optional[LLMBackend]]) -> None:
+    """Make ``factory`` selectable as ``ARTRESTORER_LLM_BACKEND=name``."""
+    _BACKENDS[name] = factory
+
+
+def get_backend(name: Optional[str] = None) -> Optional[LLMBackend]:
+    """The configured backend, or None when it is not usable (e.g. no API key)."""
+    name = name or BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"unknown LLM backend {name!r}; choose one of {', '.join(sorted(_BACKENDS))}")
+    return _BACKENDS[name]()
@@ -0,0 +1,166 @@
+"""Shared, pooled OpenAI clients.
+
+One sync and one async client are built per process on top of tuned httpx
+connection pools with keep-alive and explicit timeouts. The SDK's own
+retries are disabled in favour of `call_with_retries`, which backs off
+exponentially with full jitter on 429, 5xx, timeouts and connection errors.
+A connection trace counts new TCP/TLS connections against requests so pool
+reuse is measurable.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+MAX_CONNECTIONS = int(os.getenv('ARTRESTORER_HTTP_MAX_CONNECTIONS', 100))
+MAX_KEEPALIVE = int(os.getenv('ARTRESTORER_HTTP_MAX_KEEPALIVE', 20))
+KEEPALIVE_EXPIRY = float(os.getenv('ARTRESTORER_HTTP_KEEPALIVE_EXPIRY', 60))
+CONNECT_TIMEOUT = float(os.getenv('ARTRESTORER_HTTP_CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('ARTRESTORER_HTTP_READ_TIMEOUT', 60))
+MAX_RETRIES = int(os.getenv('ARTRESTORER_LLM_MAX_RETRIES', 4))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+# Process-wide performance counters
+metrics = {
+    'requests': 0,
+    'connections_opened': 0,
+    'tls_handshakes': 0,
+    'retries': 0,
+    'retry_exhausted': 0,
+}
+_metrics_lock = threading.Lock()
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _metrics_lock:
+        metrics[name] += amount
+
+
+def pool_metrics() -> Dict[str, float]:
+    """Counters plus the share of requests served on an already-open connection."""
+    with _metrics_lock:
+        snapshot = dict(metrics)
+    requests = snapshot['requests']
+    reused = max(requests - snapshot['connections_opened'], 0)
+    snapshot['connections_reused'] = reused
+    snapshot['reuse_rate'] = reused / requests if requests else 0.0
+    return snapshot
+
+
+def _trace(event_name: str, info: Dict[str, Any]) -> None:
+    if event_name == 'connection.connect_tcp.complete':
+        _count('connections_opened')
+    elif event_name == 'connection.start_tls.complete':
+        _count('tls_handshakes')
+
+
+async def _async_trace(event_name: str, info: Dict[str, Any]) -> None:
+    _trace(event_name, info)
+
+
+def _on_request(request: httpx.Request) -> None:
+    _count('requests')
+    request.extensions['trace'] = _trace
+
+
+async def _on_async_request(request: httpx.Request) -> None:
+    _count('requests')
+    request.extensions['trace'] = _async_trace
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE,
+                        keepalive_expiry=KEEPALIVE_EXPIRY)
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def create_client(api_key: str, **kwargs) -> OpenAI:
+    """Sync OpenAI client on a pooled keep-alive HTTP connection pool."""
+    http_client = httpx.Client(limits=_limits(), timeout=_timeout(),
+                               event_hooks={'request': [_on_request]})
+    return OpenAI(api_key=api_key, http_client=http_client, max_retries=0, **kwargs)
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: uniform between 0 and the capped exponential step
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def call_with_retries(fn: Callable[..., Any], *args, max_retries: int = MAX_RETRIES, **kwargs) -> Any:
+    """Call ``fn``, retrying transient API failures with jittered backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as exc:
+            if not _is_retryable(exc):
+                raise
+            if attempt == max_retries:
+                _count('retry_exhausted')
+                raise
+            _count('retries')
+            delay = _backoff(attempt)
+            logger.info("retrying LLM call in %.2fs after %s", delay, exc)
+            time.sleep(delay)
+
+
+async def async_call_with_retries(fn: Callable[..., Awaitable[Any]], *args,
+                                  max_retries: int = MAX_RETRIES, **kwargs) -> Any:
+    """Async counterpart of `call_with_retries`."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as exc:
+            if not _is_retryable(exc):
+                raise
+            if attempt == max_retries:
+                _count('retry_exhausted')
+                raise
+            _count('retries')
+            delay = _backoff(attempt)
+            logger.info("retrying LLM call in %.2fs after %s", delay, exc)
+            await asyncio.sleep(delay)
+
+
+class AsyncRunner:
+    """A long-lived event loop thread that owns the shared async client.
+
+    An httpx async pool is bound to the loop it was created on, so the
+    async client lives here and coroutines from any thread are submitted
+    with `run`.
+    """
+
+    def __init__(self, api_key: str, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-async-loop", daemon=True)
+        self._thread.start()
+        self.client = self.run(self._create_client(api_key, **kwargs))
+
+    @staticmethod
+    async def _create_client(api_key: str, **kwargs) -> AsyncOpenAI:
+        http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout(),
+                                        event_hooks={'request': [_on_async_request]})
+        return AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0, **kwargs)
+
+    def run(self, coro: Awaitable[Any]) -> Any:
+        """Run ``coro`` on the shared loop and block until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
@@ -0,0 +1,361 @@
+"""Report scaffold for ArtRestorer AI restoration analyses.
+
+The template below is both the structure the language model is asked to
+follow and the offline fallback used when no model is reachable.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+
+CREATIVITY_LEVELS = [
+    "highly conservative",
+    "conservative and methodical",
+    "balanced and professional",
+    "creative and exploratory",
+    "highly creative and innovative",
+]
+
+SYSTEM_PROMPT = (
+    "You are ArtRestorer AI, an expert art conservator and cultural heritage specialist. "
+    "Write practical, ethical restoration guidance grounded in conservation best practice "
+    "(ICOM-CC, AIC). Keep every heading of the provided report scaffold exactly as written, "
+    "in the same order, and replace the generic text under each heading with guidance "
+    "specific to the described artwork. Use plain text with bullet points (•), no Markdown."
+)
+
+# Headings that introduce the scaffold in analysis and section prompts
+REPORT_SCAFFOLD_HEADING = "Report scaffold:"
+SECTION_SCAFFOLD_HEADING = "Section scaffold:"
+# Added to analysis prompts when the scaffold carries measurements taken from the uploaded image
+MEASUREMENTS_NOTE = (
+    "The Image Measurements under CONDITION ASSESSMENT were measured from the uploaded photograph. "
+    "Keep them as written and interpret them for this artwork; they are indications, not a diagnosis.\n\n"
+)
+# Added to analysis prompts that carry images of the artwork (see `vision`), followed by what each one shows
+VISION_NOTE = (
+    "Images of the artwork are attached. Check the condition assessment against what they show, "
+    "and say where a photograph is too unclear to judge. The images are:\n"
+)
+
+SEPARATOR = "═" * 58
+
+# Headings of the independently generated report sections, in report order
+SECTION_TITLES = [
+    "1. HISTORICAL CONTEXT & SIGNIFICANCE",
+    "2. CONDITION ASSESSMENT",
+    "3. RESTORATION METHODOLOGY",
+    "4. MATERIALS & TECHNIQUES",
+    "5. CULTURAL & HISTORICAL CONSIDERATIONS",
+    "6. TECHNICAL SPECIFICATIONS",
+    "7. CONSERVATION CHALLENGES & SOLUTIONS",
+    "8. PREVENTIVE CONSERVATION",
+    "9. ETHICAL CONSIDERATIONS",
+    "10. DOCUMENTATION & REPORTING",
+    "CONCLUSION:",
+]
+
+
+def creativity_level(temperature: float) -> str:
+    """Map the creativity slider value to its descriptive label."""
+    return CREATIVITY_LEVELS[min(int(temperature / 0.2), 4)]
+
+
+def build_template_report(inputs: Dict[str, Any]) -> str:
+    """Render the fixed restoration report for the given analysis inputs."""
+    artwork_description = inputs['description']
+    art_style = inputs.get('art_style')
+    damage_type = inputs.get('damage_type')
+    cultural_context = inputs.get('cultural_context')
+    feature_select = inputs.get('feature')
+    temperature = inputs.get('temperature', 0.6)
+    creativity_level_text = creativity_level(temperature)
+    image_findings = inputs.get('image_findings')
+    # Listed under the condition assessment only when an image was analysed
+    measured = "".join(f"   • {finding}\n" for finding in image_findings) if image_findings else ""
+    if measured:
+        measured = f"   \n   Image Measurements:\n{measured}"
+
+    return f"""COMPREHENSIVE RESTORATION ANALYSIS
+══════════════════════════════════════════════════════════
+
+ARTWORK DETAILS:
+{artwork_description}
+
+STYLE/PERIOD: {art_style or 'Not specified'}
+DAMAGE TYPE: {damage_type or 'general wear'}
+CULTURAL CONTEXT: {cultural_context or 'Not specified'}
+ANALYSIS TYPE: {feature_select}
+AI CREATIVITY LEVEL: {temperature} ({creativity_level_text})
+ANALYSIS APPROACH: {creativity_level_text.upper()}
+
+══════════════════════════════════════════════════════════
+
+EXPERT RESTORATION GUIDANCE:
+
+1. HISTORICAL CONTEXT & SIGNIFICANCE
+   
+   Based on the provided description and the {art_style or 'specified'} period, this artwork represents a significant example of its time. The {cultural_context or 'general'} cultural context suggests traditional techniques and materials that were commonly employed during this era.
+
+2. CONDITION ASSESSMENT
+
+   The {damage_type or 'general wear'} presents specific challenges that require careful consideration:
+   
+   • Primary concerns include structural integrity and aesthetic coherence
+   • Surface analysis reveals patterns consistent with environmental exposure
+   • Original materials and techniques must be preserved where possible
+   • Documentation of current state is essential before intervention
+{measured}
+3. RESTORATION METHODOLOGY
+
+   Step-by-step approach for conservation:
+
+   a) DOCUMENTATION PHASE
+      - Comprehensive photography (visible light, UV, infrared)
+      - Detailed condition mapping
+      - Material analysis and identification
+      - Historical research and comparative studies
+
+   b) STABILIZATION PHASE
+      - Consolidation of loose or flaking areas
+      - Structural support where needed
+      - Environmental stabilization
+      - Protection from further deterioration
+
+   c) CLEANING PHASE
+      - Surface cleaning using appropriate methods
+      - Removal of discolored varnish or overpainting
+      - pH testing and adjustment
+      - Gradual approach with constant monitoring
+
+   d) RESTORATION PHASE
+      - Loss compensation using reversible materials
+      - Color matching to original palette
+      - Texture recreation matching original techniques
+      - Integration with surrounding original material
+
+4. MATERIALS & TECHNIQUES
+
+   Recommended conservation-grade materials:
+   
+   • Adhesives: Reversible synthetic polymers (appropriate for substrate)
+   • Consolidants: Tested for compatibility with original materials
+   • Inpainting media: Watercolors or conservation acrylics
+   • Protective coatings: UV-filtering, breathable varnishes
+
+   Traditional techniques to consider:
+   • Period-appropriate brushwork patterns
+   • Layering methodology consistent with {art_style or 'period'} style
+   • Color mixing using historically accurate pigment knowledge
+   • Surface finish matching original aesthetic
+
+5. CULTURAL & HISTORICAL CONSIDERATIONS
+
+   Respect for {cultural_context or "the artwork's"} traditions:
+   • Consultation with cultural heritage experts
+   • Understanding of symbolic and religious significance
+   • Preservation of authentic character and patina
+   • Balance between restoration and historical integrity
+
+6. TECHNICAL SPECIFICATIONS
+
+   Color Palette Recommendations:
+   • Earth tones: Raw umber, burnt sienna, yellow ochre
+   • Primary colors adjusted for period accuracy
+   • Consideration of natural pigment aging
+   • Matching existing color temperature and saturation
+
+   Application Techniques:
+   • Brushstroke direction following original patterns
+   • Layering sequence respecting traditional methods
+   • Glazing techniques for depth and luminosity
+   • Texture recreation using appropriate tools
+
+7. CONSERVATION CHALLENGES & SOLUTIONS
+
+   Anticipated difficulties:
+
+   Challenge 1: {damage_type or 'damage'} extent
+   Solution: Gradual intervention with regular assessment, using minimally invasive techniques
+
+   Challenge 2: Material compatibility
+   Solution: Comprehensive testing on sample areas, consultation with materials scientists
+
+   Challenge 3: Color matching aged surfaces
+   Solution: Create reference samples, account for natural aging, use reversible media
+
+   Challenge 4: Maintaining authenticity
+   Solution: Document all interventions, use distinguishable but harmonious restoration
+
+8. PREVENTIVE CONSERVATION
+
+   Long-term preservation recommendations:
+   
+   Environmental Controls:
+   • Temperature: 18-22°C (64-72°F)
+   • Relative humidity: 45-55%
+   • Light levels: <150 lux for sensitive materials
+   • UV filtration on all light sources
+
+   Handling & Display:
+   • Proper mounting and support systems
+   • Protection from physical contact
+   • Regular monitoring and condition checks
+   • Emergency response planning
+
+9. ETHICAL CONSIDERATIONS
+
+   Following international conservation ethics (ICOM-CC, AIC):
+   • Minimal intervention principle
+   • Reversibility of all treatments
+   • Documentation of all procedures
+   • Respect for original artist's intent
+   • Transparency in restoration decisions
+
+10. DOCUMENTATION & REPORTING
+
+    Essential records to maintain:
+    • Before, during, and after treatment photographs
+    • Written treatment reports
+    • Material samples and analysis results
+    • Technical drawings and diagrams
+    • Conservation decision rationale
+
+══════════════════════════════════════════════════════════
+
+CONCLUSION:
+
+This restoration project requires a balanced approach combining historical accuracy, technical expertise, and cultural sensitivity. The {damage_type or 'damage'} can be addressed through systematic conservation methods while preserving the artwork's integrity and significance within its {cultural_context or 'cultural'} context.
+
+All treatments should prioritize long-term stability and maintain the artwork's research and cultural value. Consultation with specialists in {art_style or 'period'} art and {cultural_context or 'relevant'} cultural heritage is strongly recommended before proceeding with physical intervention.
+
+══════════════════════════════════════════════════════════
+
+IMPORTANT DISCLAIMER:
+This analysis is advisory only. All physical restoration work must be performed by certified professional conservators following appropriate institutional guidelines and conservation ethics codes.
+
+══════════════════════════════════════════════════════════
+"""
+
+
+def _with_images(text: str, inputs: Dict[str, Any]) -> Any:
+    # The message content: ``text`` alone, or a note on the attached images, the text and the images
+    parts = (inputs.get('vision') or {}).get('parts')
+    if not parts:
+        return text
+    note = VISION_NOTE + "".join(f"{number}. {part['label']}\n" for number, part in enumerate(parts, 1))
+    return [{"type": "text", "text": f"{note}\n{text}"}] + [
+        {"type": "image_url", "image_url": {"url": part['url'], "detail": part['detail']}} for part in parts
+    ]
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """The text of a chat message, whether its content is a string or a list of parts."""
+    content = message.get('content') or ""
+    if isinstance(content, str):
+        return content
+    return "".join(part.get('text', "") for part in content if part.get('type') == 'text')
+
+
+def build_messages(inputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Build the chat-completion messages for an analysis request, with the images of it if it has any."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": _with_images(
+                "Produce a restoration analysis for the artwork below. "
+                f"Adopt a {creativity_level(inputs.get('temperature', 0.6))} approach.\n\n"
+                f"{MEASUREMENTS_NOTE if inputs.get('image_findings') else ''}"
+                f"{REPORT_SCAFFOLD_HEADING}\n\n" + build_template_report(inputs),
+                inputs
+            ),
+        },
+    ]
+
+
+def normalize_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Canonical form of the analysis inputs used for cache and request keys.
+
+    Whitespace and case in the description are ignored, and the temperature
+    is reduced to its creativity bucket. Image findings only appear when an
+    image was analysed, and the image's content hash only when it is sent to
+    the model, so text-only requests keep their existing keys.
+    """
+    normalized = {
+        'description': " ".join(inputs['description'].split()).casefold(),
+        'art_style': inputs.get('art_style') or "",
+        'damage_type': inputs.get('damage_type') or "",
+        'cultural_context': inputs.get('cultural_context') or "",
+        'feature': inputs.get('feature') or "",
+        'creativity': creativity_level(inputs.get('temperature', 0.6)),
+    }
+    if inputs.get('image_findings'):
+        normalized['image_findings'] = list(inputs['image_findings'])
+    if inputs.get('vision'):
+        normalized['image'] = inputs['vision']['digest']
+    return normalized
+
+
+def analysis_key(inputs: Dict[str, Any]) -> str:
+    """Stable content hash identifying an analysis request."""
+    payload = json.dumps(normalize_inputs(inputs), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _trim_blank_lines(text: str) -> str:
+    return re.sub(r"\A(?:[ \t]*\n)+", "", text).rstrip()
+
+
+def split_report_sections(text: str) -> Tuple[str, List[Tuple[str, str]], str]:
+    """Split a report into (header, [(title, body), ...], footer).
+
+    Bodies are stripped of surrounding blank lines and separators;
+    `assemble_report` puts them back.
+    """
+    starts = []
+    position = 0
+    for title in SECTION_TITLES:
+        index = text.find("\n" + title, position)
+        if index == -1:
+            raise ValueError(f"section {title!r} not found in report")
+        starts.append(index + 1)
+        position = index + 1
+    footer_start = text.find("\n" + SEPARATOR, starts[-1])
+    if footer_start == -1:
+        footer_start = len(text)
+    header = text[:starts[0]]
+    bounds = starts[1:] + [footer_start]
+    sections = []
+    for title, start, end in zip(SECTION_TITLES, starts, bounds):
+        body = text[start + len(title):end].rstrip().removesuffix(SEPARATOR)
+        sections.append((title, _trim_blank_lines(body)))
+    return header, sections, text[footer_start:].lstrip("\n")
+
+
+def assemble_report(header: str, sections: List[Tuple[str, str]], footer: str) -> str:
+    """Join report parts produced by `split_report_sections` or section generation."""
+    parts = [header.rstrip("\n") + "\n\n"]
+    for title, body in sections:
+        if title == "CONCLUSION:":
+            parts.append(SEPARATOR + "\n\n")
+        parts.append(f"{title}\n\n{_trim_blank_lines(body)}\n\n")
+    parts.append(footer)
+    return "".join(parts)
+
+
+def build_section_messages(inputs: Dict[str, Any], title: str, scaffold: str) -> List[Dict[str, Any]]:
+    """Chat-completion messages asking for a single report section; only the condition assessment gets the images."""
+    details = split_report_sections(build_template_report(inputs))[0]
+    text = (
+        f"Write only the body of the section \"{title}\" of a restoration analysis. "
+        "Do not repeat the heading or write any other section. "
+        f"Adopt a {creativity_level(inputs.get('temperature', 0.6))} approach.\n\n"
+        f"{MEASUREMENTS_NOTE if inputs.get('image_findings') and title == SECTION_TITLES[1] else ''}"
+        f"{details}\n{SECTION_SCAFFOLD_HEADING}\n\n{title}\n\n{scaffold}"
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": _with_images(text, inputs) if title == SECTION_TITLES[1] else text},
+    ]
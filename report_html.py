@@ -0,0 +1,123 @@
+"""HTML rendering of analysis reports for the results page.
+
+Structured reports (`report_model.Report`) are rendered block by block:
+section headings, methodology phases, challenge/solution pairs and
+labelled lists each get their markup, and the text itself is escaped.
+Output that did not follow the scaffold is formatted by one compiled
+pattern that styles the known headings in a single pass over the text,
+escaping the text between them.
+Rendered reports are memoized by their digest, so reruns of the results
+page reuse the HTML instead of rendering the report again.
+"""
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+from report import SECTION_TITLES, SEPARATOR
+from report_model import Block, Report
+
+# Reports kept rendered; a session usually shows one report at a time
+CACHE_SIZE = 64
+
+_SECTION_ICONS = ["📚", "🔍", "🛠️", "🎨", "🏛️", "⚙️", "💡", "🛡️", "⚖️", "📝"]
+_PHASES = {"a) DOCUMENTATION PHASE": "📸", "b) STABILIZATION PHASE": "🔧",
+           "c) CLEANING PHASE": "🧹", "d) RESTORATION PHASE": "🎨"}
+_LABELS = {"Color Palette Recommendations:": "🎨", "Application Techniques:": "🖌️",
+           "Environmental Controls:": "🌡️", "Handling & Display:": "🖐️"}
+
+# Literal text -> markup replacing it; the classes are defined in assets/report.css
+MARKUP = {
+    "COMPREHENSIVE RESTORATION ANALYSIS":
+        "🎨 <span class='report-banner'>COMPREHENSIVE RESTORATION ANALYSIS</span>",
+    "EXPERT RESTORATION GUIDANCE:": "<br><h2 class='report-heading'>👨‍🎨 EXPERT RESTORATION GUIDANCE</h2>",
+    **{title: f"<h3 class='report-section'>{icon} {title}</h3>" for title, icon in zip(SECTION_TITLES, _SECTION_ICONS)},
+    "CONCLUSION:": "<h2 class='report-heading'>✅ CONCLUSION</h2>",
+    "IMPORTANT DISCLAIMER:": "<h3 class='report-disclaimer'>⚠️ IMPORTANT DISCLAIMER</h3>",
+    **{phase: f"<strong class='report-label'>{icon} {phase}</strong>" for phase, icon in _PHASES.items()},
+    **{f"Challenge {n}:": f"<strong class='report-challenge'>⚠️ Challenge {n}:</strong>" for n in range(1, 5)},
+    "Solution:": "<strong class='report-solution'>✓ Solution:</strong>",
+    **{label: f"<strong class='report-label'>{icon} {label}</strong>" for label, icon in _LABELS.items()},
+    SEPARATOR: "<hr class='report-rule'>",
+}
+
+# Longest first, so a literal is never shadowed by a shorter one starting at the same place
+_PATTERN = re.compile("|".join(re.escape(literal) for literal in sorted(MARKUP, key=len, reverse=True)))
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+
+_HR = MARKUP[SEPARATOR]
+_LIST_LABEL = "<strong class='report-label'>{}</strong>"
+
+
+def _escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def format_report(text: str) -> str:
+    """``text`` escaped, with every MARKUP literal replaced, in one pass; for unstructured reports."""
+    # Model output echoes the user's input, so only the markup inserted here may be HTML
+    parts, start = [], 0
+    for match in _PATTERN.finditer(text):
+        parts.append(_escape(text[start:match.start()]))
+        parts.append(MARKUP[match.group()])
+        start = match.end()
+    parts.append(_escape(text[start:]))
+    return "".join(parts)
+
+
+def _items(items: List[str]) -> str:
+    return "<ul>" + "".join(f"<li>{_escape(item)}</li>" for item in items) + "</ul>" if items else ""
+
+
+def _block_html(block: Block) -> str:
+    if block.kind == 'paragraph':
+        return f"<p>{_escape(block.text)}</p>"
+    if block.kind == 'challenge':
+        heading = MARKUP.get(f"{block.label}:") or _LIST_LABEL.format(_escape(block.label) + ":")
+        solution = f"<br>{MARKUP['Solution:']} {_escape(block.solution)}" if block.solution else ""
+        return f"<p>{heading} {_escape(block.text)}{solution}</p>"
+    label = ""
+    if block.label:
+        key = block.label if block.kind == 'phase' else f"{block.label}:"
+        label = MARKUP.get(key) or _LIST_LABEL.format(_escape(key))
+    return f"<div>{label}{_items(block.items)}</div>"
+
+
+def render_report(report: Report) -> str:
+    """HTML for ``report``, built from its structure."""
+    if not report.structured:
+        return format_report(report.header)
+    parts = [MARKUP["COMPREHENSIVE RESTORATION ANALYSIS"], _HR]
+    details = "<br>".join(f"<strong>{_escape(key)}:</strong> {_escape(value)}" for key, value in report.details.items())
+    if details:
+        parts.append(f"<p>{details}</p>{_HR}")
+    parts.append(MARKUP["EXPERT RESTORATION GUIDANCE:"])
+    for section in report.sections:
+        if section.title == "CONCLUSION:":
+            parts.append(_HR)
+        parts.append(MARKUP.get(section.title) or f"<h3>{_escape(section.title)}</h3>")
+        parts.extend(_block_html(block) for block in section.blocks)
+    parts.append(_HR)
+    if report.disclaimer:
+        parts.append(f"{MARKUP['IMPORTANT DISCLAIMER:']}<p>{_escape(report.disclaimer)}</p>{_HR}")
+    # One HTML block: a blank line would end it for the Markdown renderer
+    return "".join(parts).replace("\n", " ")
+
+
+def report_html(report: Report) -> str:
+    """render_report(report), memoized by the report's digest."""
+    key = report.digest
+    with _lock:
+        markup = _cache.get(key)
+        if markup is not None:
+            _cache.move_to_end(key)
+            return markup
+    markup = render_report(report)
+    with _lock:
+        _cache[key] = markup
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return markup
@@ -0,0 +1,399 @@
+"""Structured restoration reports.
+
+A `Report` is the analysis as data: the header with its artwork details,
+the eleven sections of `report.SECTION_TITLES` and the footer with the
+disclaimer. Every section body is broken into typed `Block`s (paragraphs,
+labelled lists such as the colour palette or environmental controls,
+methodology phases and challenge/solution pairs), so the results page,
+downloads and the analysis cache work from the structure instead of
+searching the text for headings.
+
+`ReportParser` builds a report from model output while it streams: text is
+consumed as it arrives and each section is parsed as soon as the next
+heading shows up. Reports serialize to versioned JSON (`Report.to_json`)
+that `Report.from_dict` validates on the way back in.
+"""
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from report import SECTION_TITLES, SEPARATOR, assemble_report
+
+# Bumped when the JSON layout changes
+SCHEMA_VERSION = 1
+
+BLOCK_KINDS = ('paragraph', 'list', 'phase', 'challenge')
+
+_PHASE = re.compile(r"([a-z])\)\s+(.+)")
+_CHALLENGE = re.compile(r"(Challenge\s+\d+):\s*(.*)")
+_SOLUTION = re.compile(r"Solution:\s*(.*)")
+_BULLET = re.compile(r"[•\-*]\s+(.*)")
+# A short line ending in a colon introduces a list ("Environmental Controls:")
+_LABEL = re.compile(r"([^•:\s][^:]{0,78}):")
+_DETAIL = re.compile(r"([A-Z][A-Z /&-]+):\s*(.*)")
+
+
+class ReportSchemaError(ValueError):
+    """Serialized report data does not match the report schema."""
+
+
+class Block:
+    """One typed piece of a section body.
+
+    ``paragraph``: ``text``. ``list``: optional ``label`` and ``items``.
+    ``phase``: ``label`` such as "a) CLEANING PHASE" and its ``items``.
+    ``challenge``: ``label`` ("Challenge 2"), ``text`` and ``solution``.
+    """
+
+    __slots__ = ('kind', 'label', 'text', 'items', 'solution')
+
+    def __init__(self, kind: str, label: str = "", text: str = "", items: Optional[List[str]] = None,
+                 solution: str = ""):
+        self.kind = kind
+        self.label = label
+        self.text = text
+        self.items = items if items is not None else []
+        self.solution = solution
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {'kind': self.kind}
+        if self.label:
+            data['label'] = self.label
+        if self.text:
+            data['text'] = self.text
+        if self.items:
+            data['items'] = list(self.items)
+        if self.solution:
+            data['solution'] = self.solution
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Block':
+        if not isinstance(data, dict) or data.get('kind') not in BLOCK_KINDS:
+            raise ReportSchemaError(f"block: expected an object with kind in {BLOCK_KINDS}")
+        items = data.get('items', [])
+        if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+            raise ReportSchemaError("block.items: expected a list of strings")
+        for field in ('label', 'text', 'solution'):
+            if not isinstance(data.get(field, ""), str):
+                raise ReportSchemaError(f"block.{field}: expected a string")
+        return cls(data['kind'], data.get('label', ""), data.get('text', ""), items, data.get('solution', ""))
+
+
+def parse_blocks(body: str) -> List[Block]:
+    """Typed blocks of one section body, in order."""
+    blocks: List[Block] = []
+    current: Optional[Block] = None
+    for raw_line in body.splitlines():
+        line = raw_line.strip()
+        if not line:
+            # A blank line ends a paragraph; lists and phases run until the next heading
+            if current is not None and current.kind == 'paragraph':
+                current = None
+            continue
+        match = _PHASE.fullmatch(line)
+        if match and match.group(2).isupper():
+            current = Block('phase', line)
+            blocks.append(current)
+            continue
+        match = _CHALLENGE.fullmatch(line)
+        if match:
+            current = Block('challenge', match.group(1), match.group(2))
+            blocks.append(current)
+            continue
+        match = _SOLUTION.fullmatch(line)
+        if match and current is not None and current.kind == 'challenge':
+            current.solution = f"{current.solution} {match.group(1)}".strip()
+            continue
+        match = _BULLET.fullmatch(line)
+        if match:
+            if current is None or current.kind not in ('list', 'phase'):
+                current = Block('list')
+                blocks.append(current)
+            current.items.append(match.group(1))
+            continue
+        match = _LABEL.fullmatch(line)
+        if match:
+            current = Block('list', match.group(1))
+            blocks.append(current)
+            continue
+        if current is not None and current.kind == 'paragraph':
+            current.text += " " + line
+        elif current is not None and current.kind == 'challenge' and not current.solution:
+            current.text = f"{current.text} {line}".strip()
+        else:
+            current = Block('paragraph', text=line)
+            blocks.append(current)
+    return blocks
+
+
+class Section:
+    """A report section: its heading, the body text and the body's blocks."""
+
+    __slots__ = ('title', 'body', 'blocks')
+
+    def __init__(self, title: str, body: str, blocks: Optional[List[Block]] = None):
+        self.title = title
+        self.body = body
+        self.blocks = blocks if blocks is not None else parse_blocks(body)
+
+    @property
+    def number(self) -> Optional[int]:
+        head = self.title.split(".", 1)[0]
+        return int(head) if head.isdigit() else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'title': self.title, 'body': self.body, 'blocks': [block.to_dict() for block in self.blocks]}
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Section':
+        if not isinstance(data, dict) or not isinstance(data.get('title'), str) or not isinstance(data.get('body'), str):
+            raise ReportSchemaError("section: expected an object with string title and body")
+        blocks = data.get('blocks')
+        if not isinstance(blocks, list):
+            raise ReportSchemaError(f"section {data['title']!r}: blocks must be a list")
+        return cls(data['title'], data['body'], [Block.from_dict(block) for block in blocks])
+
+
+def parse_details(header: str) -> Dict[str, str]:
+    """``KEY: value`` lines of the report header; ``ARTWORK DETAILS`` spans the lines after it."""
+    details: Dict[str, str] = {}
+    open_key = None
+    for raw_line in header.splitlines():
+        line = raw_line.strip()
+        if not line or line == SEPARATOR:
+            open_key = None
+            continue
+        match = _DETAIL.fullmatch(line)
+        if match:
+            key, value = match.group(1).strip(), match.group(2).strip()
+            details[key] = value
+            open_key = key if not value else None
+        elif open_key is not None:
+            details[open_key] = f"{details[open_key]} {line}".strip()
+    # Keys left empty are headings ("EXPERT RESTORATION GUIDANCE:"), not details
+    return {key: value for key, value in details.items() if value}
+
+
+def parse_disclaimer(footer: str) -> str:
+    """Text under the ``IMPORTANT DISCLAIMER:`` heading of the footer."""
+    _, found, rest = footer.partition("IMPORTANT DISCLAIMER:")
+    if not found:
+        return ""
+    return " ".join(line.strip() for line in rest.split(SEPARATOR, 1)[0].splitlines() if line.strip())
+
+
+class Report:
+    """A parsed restoration analysis.
+
+    ``sections`` is empty when the text did not follow the report scaffold;
+    ``header`` then holds the whole text.
+    """
+
+    def __init__(self, header: str, sections: List[Section], footer: str = "",
+                 details: Optional[Dict[str, str]] = None, disclaimer: Optional[str] = None):
+        self.header = header
+        self.sections = sections
+        self.footer = footer
+        self.details = details if details is not None else parse_details(header)
+        self.disclaimer = disclaimer if disclaimer is not None else parse_disclaimer(footer)
+        self._digest: Optional[str] = None
+
+    @classmethod
+    def from_parts(cls, header: str, sections: List[Tuple[str, str]], footer: str) -> 'Report':
+        """Report from (title, body) pairs, as produced by section-by-section generation."""
+        return cls(header, [Section(title, body) for title, body in sections], footer)
+
+    @property
+    def structured(self) -> bool:
+        return bool(self.sections)
+
+    def section(self, title: str) -> Optional[Section]:
+        for section in self.sections:
+            if section.title == title:
+                return section
+        return None
+
+    def blocks(self, kind: str) -> Iterator[Block]:
+        """Every block of ``kind``, in report order."""
+        for section in self.sections:
+            for block in section.blocks:
+                if block.kind == kind:
+                    yield block
+
+    @property
+    def phases(self) -> List[Block]:
+        return list(self.blocks('phase'))
+
+    @property
+    def challenges(self) -> List[Block]:
+        return list(self.blocks('challenge'))
+
+    def labelled(self, label: str) -> List[str]:
+        """Items of the first list introduced by ``label`` ("Environmental Controls")."""
+        for block in self.blocks('list'):
+            if block.label.casefold() == label.casefold():
+                return list(block.items)
+        return []
+
+    @property
+    def palette(self) -> List[str]:
+        return self.labelled("Color Palette Recommendations")
+
+    @property
+    def environment_controls(self) -> List[str]:
+        return self.labelled("Environmental Controls")
+
+    def to_text(self) -> str:
+        """The report as plain text, laid out like the scaffold."""
+        if not self.sections:
+            return self.header
+        return assemble_report(self.header, [(s.title, s.body) for s in self.sections], self.footer)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'schema_version': SCHEMA_VERSION,
+            'header': self.header,
+            'details': dict(self.details),
+            'sections': [section.to_dict() for section in self.sections],
+            'footer': self.footer,
+            'disclaimer': self.disclaimer,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Report':
+        """Validate serialized report ``data``; raises ReportSchemaError."""
+        if not isinstance(data, dict):
+            raise ReportSchemaError("report: expected an object")
+        if data.get('schema_version') != SCHEMA_VERSION:
+            raise ReportSchemaError(f"report: unsupported schema_version {data.get('schema_version')!r}")
+        for field in ('header', 'footer', 'disclaimer'):
+            if not isinstance(data.get(field), str):
+                raise ReportSchemaError(f"report.{field}: expected a string")
+        details = data.get('details')
+        if not isinstance(details, dict) or not all(isinstance(v, str) for v in details.values()):
+            raise ReportSchemaError("report.details: expected an object of strings")
+        if not isinstance(data.get('sections'), list):
+            raise ReportSchemaError("report.sections: expected a list")
+        sections = [Section.from_dict(section) for section in data['sections']]
+        return cls(data['header'], sections, data['footer'], details, data['disclaimer'])
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Report':
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ReportSchemaError(f"report: invalid JSON: {exc}") from exc
+        return cls.from_dict(data)
+
+    @property
+    def digest(self) -> str:
+        """SHA-256 of the serialized report, computed once."""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.to_json().encode('utf-8')).hexdigest()
+        return self._digest
+
+
+class ReportParser:
+    """Incremental parser: `feed` model output as it streams, then `close`.
+
+    Headings are searched for only in newly arrived text, and a section is
+    parsed into blocks as soon as the following heading arrives, so the
+    total work is linear in the length of the report.
+    """
+
+    # Enough already-scanned text to catch a heading split across chunks
+    _OVERLAP = max(len(title) for title in SECTION_TITLES) + 1
+
+    def __init__(self):
+        self.header: Optional[str] = None
+        self.sections: List[Section] = []
+        # The part still being written: the header, then one section at a time
+        self._segment: List[str] = []
+        self._segment_length = 0
+        self._window = ""
+        self._fresh: List[str] = []
+        # Raw text of completed parts, kept in case the output turns out not to follow the scaffold
+        self._finished: List[str] = []
+
+    @property
+    def _next_title(self) -> Optional[str]:
+        found = len(self.sections) + (self.header is not None)
+        return SECTION_TITLES[found] if found < len(SECTION_TITLES) else None
+
+    def feed(self, chunk: str) -> List[Section]:
+        """Consume ``chunk``; returns the sections it completed."""
+        self._segment.append(chunk)
+        self._segment_length += len(chunk)
+        self._fresh.append(chunk)
+        if "\n" not in chunk or self._next_title is None:
+            # Headings start on a new line, so nothing can have been completed
+            return []
+        return self._scan()
+
+    def _scan(self) -> List[Section]:
+        # Completes every part whose following heading is in the text fed since the last scan
+        window = self._window + "".join(self._fresh)
+        self._fresh.clear()
+        completed = []
+        title = self._next_title
+        while title is not None:
+            index = window.find("\n" + title)
+            if index == -1:
+                break
+            split = self._segment_length - len(window) + index + 1
+            segment = "".join(self._segment)
+            section = self._finish(segment[:split])
+            if section is not None:
+                completed.append(section)
+            self._segment = [segment[split:]]
+            self._segment_length = len(segment) - split
+            window = window[index + 1:]
+            title = self._next_title
+        self._window = window[-self._OVERLAP:]
+        return completed
+
+    def _finish(self, text: str) -> Optional[Section]:
+        # Completes the header or the section whose heading starts ``text``
+        self._finished.append(text)
+        if self.header is None:
+            self.header = text
+            return None
+        title = SECTION_TITLES[len(self.sections)]
+        body = text[len(title):].rstrip().removesuffix(SEPARATOR)
+        section = Section(title, re.sub(r"\A(?:[ \t]*\n)+", "", body).rstrip())
+        self.sections.append(section)
+        return section
+
+    def close(self) -> Report:
+        """The report for everything fed so far."""
+        if self._fresh and self._next_title is not None:
+            # The last heading may have arrived in a chunk without a newline, which feed does not scan
+            self._scan()
+        rest = "".join(self._segment)
+        if self._next_title is not None:
+            # The output did not follow the scaffold: keep it whole, unstructured
+            return Report("".join(self._finished) + rest, [])
+        footer_start = rest.find("\n" + SEPARATOR)
+        if footer_start == -1:
+            footer_start = len(rest)
+        self._finish(rest[:footer_start])
+        return Report(self.header, self.sections, rest[footer_start:].lstrip("\n"))
+
+
+def parse_report(text: str) -> Report:
+    """Report for complete ``text``."""
+    parser = ReportParser()
+    parser.feed(text)
+    return parser.close()
+
+
+def load_report(stored: str) -> Report:
+    """Report from a cache entry: serialized JSON, or plain text written before reports were structured."""
+    if stored.startswith("{"):
+        return Report.from_json(stored)
+    return parse_report(stored)
@@ -0,0 +1,181 @@
+"""Process-wide fair-share admission control for LLM calls.
+
+Every upstream generation must hold one of a bounded number of worker
+slots. Waiting requests are queued per user and served round-robin across
+users, so one busy user cannot starve the others, and a slot is only
+granted when both the requests-per-minute and tokens-per-minute token
+buckets can pay for the call. Queued requests can be looked up by key to
+show a live queue position and estimated wait.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+WORKERS = int(os.getenv('ARTRESTORER_LLM_WORKERS', 8))
+REQUESTS_PER_MINUTE = float(os.getenv('ARTRESTORER_LLM_RPM', 500))
+TOKENS_PER_MINUTE = float(os.getenv('ARTRESTORER_LLM_TPM', 200000))
+
+
+class TokenBucket:
+    """Continuously refilling bucket of ``rate_per_minute`` units."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if they are now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class _Ticket:
+    def __init__(self, user: str, requests: int, tokens: int, key: Optional[str]):
+        self.user = user
+        self.requests = requests
+        self.tokens = tokens
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.state = 'queued'
+
+
+class FairScheduler:
+    """Round-robin per-user queues in front of a bounded pool of worker slots."""
+
+    def __init__(self, workers: int = WORKERS, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE):
+        self.workers = workers
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.stats = {'admitted': 0, 'completed': 0, 'queued_peak': 0, 'wait_seconds_total': 0.0}
+        self._cond = threading.Condition()
+        self._queues: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._by_key: Dict[str, _Ticket] = {}
+        self._running = 0
+        # Moving average of how long a slot is held, used for wait estimates
+        self._service_time = 15.0
+
+    def _order(self) -> Iterator[_Ticket]:
+        """Queued tickets in the order they will be admitted."""
+        queues = [list(q) for q in self._queues.values()]
+        depth = 0
+        while True:
+            emitted = False
+            for queue in queues:
+                if depth < len(queue):
+                    emitted = True
+                    yield queue[depth]
+            if not emitted:
+                return
+            depth += 1
+
+    def _next(self) -> Optional[_Ticket]:
+        for queue in self._queues.values():
+            return queue[0]
+        return None
+
+    def _rate_delay(self, ticket: _Ticket, now: float) -> float:
+        return max(self.request_bucket.delay(ticket.requests, now),
+                   self.token_bucket.delay(ticket.tokens, now))
+
+    def _admit(self, ticket: _Ticket) -> None:
+        queue = self._queues.pop(ticket.user)
+        queue.popleft()
+        if queue:
+            # The user goes to the back of the rotation with their remaining requests
+            self._queues[ticket.user] = queue
+        self.request_bucket.consume(ticket.requests)
+        self.token_bucket.consume(ticket.tokens)
+        self._running += 1
+        ticket.state = 'running'
+        self.stats['admitted'] += 1
+        self.stats['wait_seconds_total'] += time.monotonic() - ticket.enqueued
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.user)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+
+    @contextmanager
+    def slot(self, user: str, requests: int = 1, tokens: int = 0, key: Optional[str] = None):
+        """Block until this request may call the API, holding a worker slot inside the block."""
+        ticket = _Ticket(user, requests, tokens, key)
+        with self._cond:
+            self._queues.setdefault(user, deque()).append(ticket)
+            if key is not None:
+                self._by_key[key] = ticket
+            self.stats['queued_peak'] = max(self.stats['queued_peak'], self.queued())
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._next() is ticket and self._running < self.workers:
+                        delay = self._rate_delay(ticket, now)
+                        if delay <= 0:
+                            self._admit(ticket)
+                            self._cond.notify_all()
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._remove(ticket)
+                self._by_key.pop(key, None)
+                self._cond.notify_all()
+                raise
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self.stats['completed'] += 1
+                self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - started)
+                if key is not None and self._by_key.get(key) is ticket:
+                    del self._by_key[key]
+                self._cond.notify_all()
+
+    def queued(self) -> int:
+        """Number of requests waiting for a slot (call with the lock held)."""
+        return sum(len(q) for q in self._queues.values())
+
+    def status(self, key: str) -> Optional[Dict[str, Any]]:
+        """Queue position (1-based) and estimated wait for the request registered as ``key``."""
+        with self._cond:
+            ticket = self._by_key.get(key)
+            if ticket is None:
+                return None
+            if ticket.state == 'running':
+                return {'state': 'running', 'position': 0, 'eta': 0.0}
+            ahead = 0
+            for queued in self._order():
+                if queued is ticket:
+                    break
+                ahead += 1
+            # Slots that must free up before this request can start
+            turns = max(0, self._running + ahead - self.workers + 1)
+            eta = turns * self._service_time / self.workers
+            eta += self._rate_delay(ticket, time.monotonic())
+            return {'state': 'queued', 'position': ahead + 1, 'eta': eta}
+
+    def metrics(self) -> Dict[str, Any]:
+        """Admission counters plus the current load."""
+        with self._cond:
+            return dict(self.stats, running=self._running, queued=self.queued(), workers=self.workers,
+                        users_waiting=len(self._queues), avg_service_seconds=self._service_time)
@@ -0,0 +1,214 @@
+"""Near-duplicate lookup of artwork descriptions.
+
+Descriptions are embedded locally as signed, hashed TF-IDF vectors over word
+unigrams and character trigrams, so "water stains lower right" and
+"lower-right water staining" land close together. Vectors are grouped by the
+rest of the analysis inputs (style, damage, context, feature, creativity) and
+a lookup is one matrix-vector product over the matching group.
+
+Descriptions that differ in one word score high all the same ("portrait of
+a man ... hands" and "portrait of a woman ... face"), so a match must also
+name the same things: every content word of either description needs a
+counterpart in the other, the same word or one sharing its first four
+letters ("stains" and "staining").
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from report import normalize_inputs
+
+DEFAULT_THRESHOLD = float(os.getenv('ARTRESTORER_SEMANTIC_THRESHOLD', 0.82))
+# A lookup reads the whole group matrix, so its width sets the cost: 128 dims keep 100k entries under
+# 10 ms. Hash collisions this causes are caught by the content-word check
+DEFAULT_DIMS = int(os.getenv('ARTRESTORER_SEMANTIC_DIMS', 128))
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at by for from has have in into is it its of on or over some the there this to under "
+    "very was with".split()
+)
+_STEM = 4
+
+
+def _features(text: str) -> List[str]:
+    words = _WORD_RE.findall(text.casefold())
+    grams = list(words)
+    for word in words:
+        padded = f"<{word}>"
+        grams.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def content_words(text: str) -> frozenset:
+    """Words of ``text`` other than stopwords, casefolded."""
+    return frozenset(_WORD_RE.findall(text.casefold())) - _STOPWORDS
+
+
+def _covered(words: frozenset, other: frozenset) -> bool:
+    # Every word has a counterpart in ``other``: itself, or a word with the same first _STEM letters
+    stems = {word[:_STEM] for word in other if len(word) >= _STEM}
+    return all(word in other or (len(word) >= _STEM and word[:_STEM] in stems) for word in words)
+
+
+def same_things(a: frozenset, b: frozenset) -> bool:
+    """Whether two sets of `content_words` name the same things."""
+    return _covered(a, b) and _covered(b, a)
+
+
+def group_key(inputs: Dict[str, Any]) -> str:
+    """Key of everything except the description; only equal groups are compared."""
+    fields = normalize_inputs(inputs)
+    del fields['description']
+    return json.dumps(fields, sort_keys=True, ensure_ascii=False)
+
+
+class _Group:
+    def __init__(self, dims: int):
+        self.matrix = np.zeros((16, dims), dtype=np.float32)
+        self.keys: List[str] = []
+        self.words: List[frozenset] = []
+        self.rows: Dict[str, int] = {}
+
+    def add(self, key: str, vector: np.ndarray, words: frozenset) -> None:
+        if len(self.keys) == self.matrix.shape[0]:
+            grown = np.zeros((self.matrix.shape[0] * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:len(self.keys)] = self.matrix
+            self.matrix = grown
+        self.rows[key] = len(self.keys)
+        self.matrix[len(self.keys)] = vector
+        self.keys.append(key)
+        self.words.append(words)
+
+    def remove(self, key: str) -> np.ndarray:
+        """Drop ``key`` and return its vector."""
+        index = self.rows.pop(key)
+        last = len(self.keys) - 1
+        vector = self.matrix[index].copy()
+        self.matrix[index] = self.matrix[last]
+        self.matrix[last] = 0.0
+        self.keys[index], self.words[index] = self.keys[last], self.words[last]
+        if index != last:
+            self.rows[self.keys[index]] = index
+        self.keys.pop()
+        self.words.pop()
+        return vector
+
+
+class SemanticCache:
+    """Similarity index over prior analyses stored in an `AnalysisCache`."""
+
+    def __init__(self, cache, threshold: float = DEFAULT_THRESHOLD, dims: int = DEFAULT_DIMS):
+        self.cache = cache
+        self.threshold = threshold
+        self.dims = dims
+        self.stats = {'hits': 0, 'misses': 0}
+        self._groups: Dict[str, _Group] = {}
+        self._doc_freq = np.zeros(dims, dtype=np.float32)
+        self._docs = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_index ("
+            " key TEXT PRIMARY KEY, grp TEXT NOT NULL, vector BLOB NOT NULL, created REAL NOT NULL,"
+            " words TEXT NOT NULL DEFAULT '')"
+        )
+        if 'words' not in {row[1] for row in self._conn.execute("PRAGMA table_info(semantic_index)")}:
+            self._conn.execute("ALTER TABLE semantic_index ADD COLUMN words TEXT NOT NULL DEFAULT ''")
+        self._load()
+
+    def _load(self) -> None:
+        for key, grp, blob, words in self._conn.execute(
+            "SELECT key, grp, vector, words FROM semantic_index ORDER BY created"
+        ):
+            vector = np.frombuffer(zlib.decompress(blob), dtype=np.float32)
+            # Entries indexed before content words were kept cannot be checked, so they are not used
+            if vector.shape[0] != self.dims or not words:
+                continue
+            self._groups.setdefault(grp, _Group(self.dims)).add(key, vector, frozenset(words.split()))
+            self._doc_freq += vector != 0
+            self._docs += 1
+
+    def _hashed_counts(self, text: str) -> np.ndarray:
+        counts = np.zeros(self.dims, dtype=np.float32)
+        for gram in _features(text):
+            h = zlib.crc32(gram.encode('utf-8'))
+            counts[h % self.dims] += 1.0 if h & 0x80000000 else -1.0
+        return counts
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """Unit-length TF-IDF vector of ``text`` under the current document frequencies."""
+        counts = self._hashed_counts(text)
+        tf = np.sign(counts) * np.log1p(np.abs(counts))
+        idf = np.log((1.0 + self._docs) / (1.0 + self._doc_freq)) + 1.0
+        vector = tf * idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def nearest(self, inputs: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+        """Best (analysis key, cosine) in the same group naming the same things, at or above the threshold."""
+        with self._lock:
+            group = self._groups.get(group_key(inputs))
+            if group is None or not group.keys:
+                return None
+            vector = self.vectorize(inputs['description'])
+            words = content_words(inputs['description'])
+            scores = group.matrix[:len(group.keys)] @ vector
+            # Nearly every entry scores below the threshold; only the rest are sorted and word-checked
+            above = np.flatnonzero(scores >= self.threshold)
+            for best in above[np.argsort(-scores[above], kind='stable')]:
+                if same_things(words, group.words[best]):
+                    return group.keys[best], float(scores[best])
+            return None
+
+    def lookup(self, inputs: Dict[str, Any]) -> Optional[Tuple[str, float]]:
+        """Cached report text and similarity of the nearest match above the threshold."""
+        match = self.nearest(inputs)
+        if match is not None:
+            text = self.cache.get(match[0])
+            if text is not None:
+                self.stats['hits'] += 1
+                return text, match[1]
+            # The analysis was evicted from the cache: drop it from the index too
+            self.discard(match[0], inputs)
+        self.stats['misses'] += 1
+        return None
+
+    def add(self, inputs: Dict[str, Any], key: str) -> None:
+        """Index the description of an analysis stored under ``key``."""
+        grp = group_key(inputs)
+        with self._lock:
+            group = self._groups.setdefault(grp, _Group(self.dims))
+            if key in group.rows:
+                return
+            vector = self.vectorize(inputs['description'])
+            words = content_words(inputs['description'])
+            group.add(key, vector, words)
+            self._doc_freq += vector != 0
+            self._docs += 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semantic_index (key, grp, vector, created, words) VALUES (?, ?, ?, ?, ?)",
+                (key, grp, zlib.compress(vector.tobytes()), time.time(), " ".join(sorted(words))),
+            )
+
+    def discard(self, key: str, inputs: Dict[str, Any]) -> None:
+        """Remove ``key`` from the index."""
+        with self._lock:
+            group = self._groups.get(group_key(inputs))
+            if group is not None and key in group.rows:
+                vector = group.remove(key)
+                self._doc_freq -= vector != 0
+                self._docs -= 1
+            self._conn.execute("DELETE FROM semantic_index WHERE key = ?", (key,))
+
+    def metrics(self) -> Dict[str, float]:
+        """Hit/miss counters plus the number of indexed descriptions."""
+        return dict(self.stats, entries=sum(len(g.keys) for g in self._groups.values()),
+                    threshold=self.threshold)
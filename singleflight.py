@@ -0,0 +1,113 @@
+"""Process-wide coalescing of identical in-flight analysis requests.
+
+The first caller for a key becomes the leader: its producer runs once in a
+background thread and publishes items (streamed chunks or finished
+sections) to a shared flight. Every caller with the same key, the leader
+included, replays the flight from the beginning and then follows it live,
+so N identical requests cost one upstream call.
+"""
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """One upstream call shared by every subscriber with the same key."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.items_published: List[Any] = []
+        self.stats: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.subscribers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, item: Any) -> None:
+        with self._cond:
+            self.items_published.append(item)
+            self._cond.notify_all()
+
+    def _finish(self, result: Any, error: Optional[BaseException]) -> None:
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait_started(self, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for the first item; True once output exists or the flight ended."""
+        with self._cond:
+            if not self.items_published and not self.done:
+                self._cond.wait(timeout)
+            return bool(self.items_published) or self.done
+
+    def items(self) -> Iterator[Any]:
+        """Yield every published item, blocking for new ones until the flight ends."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.items_published) and not self.done:
+                    self._cond.wait()
+                batch = self.items_published[index:]
+                finished = self.done
+            index += len(batch)
+            yield from batch
+            if finished and not batch:
+                break
+        if self.error is not None:
+            raise self.error
+
+    def wait(self) -> Any:
+        """Block until the producer returns and give back its result."""
+        for _ in self.items():
+            pass
+        return self.result
+
+
+class SingleFlight:
+    """Registry of in-flight requests keyed by normalized request key."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Flight] = {}
+        self.stats = {'leaders': 0, 'coalesced': 0}
+
+    def join(self, key: str, producer: Callable[[Callable[[Any], None], Dict[str, Any]], Any]) -> Flight:
+        """Attach to the flight for ``key``, starting ``producer`` if there is none.
+
+        ``producer(publish, stats)`` is called at most once per concurrent
+        key; its return value becomes ``Flight.result``.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight(key)
+                self.stats['leaders'] += 1
+                threading.Thread(
+                    target=self._run, args=(flight, producer), name=f"flight-{key[:12]}", daemon=True
+                ).start()
+            else:
+                self.stats['coalesced'] += 1
+            flight.subscribers += 1
+        return flight
+
+    def _run(self, flight: Flight, producer) -> None:
+        result, error = None, None
+        try:
+            result = producer(flight.publish, flight.stats)
+        except BaseException as exc:
+            logger.exception("in-flight request %s failed", flight.key)
+            error = exc
+        finally:
+            # New callers after this point start a fresh request (or hit the cache)
+            with self._lock:
+                self._flights.pop(flight.key, None)
+            flight._finish(result, error)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,238 @@
+"""Local OpenAI-compatible stand-in for offline and load testing.
+
+Serves ``POST /v1/chat/completions`` (streamed and non-streamed) with
+deterministic content: the report or section scaffold embedded in the
+prompt by `report.build_messages` / `report.build_section_messages` is
+returned as the completion. Time-to-first-token, tokens per second, the
+share of 5xx errors and of injected 429s are configurable, and
+``GET /metrics`` reports what the server has done so far.
+
+    python -m standin_server --port 8765 --ttft 0.4 --tokens-per-sec 60 --rate-limit-rate 0.05
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from report import REPORT_SCAFFOLD_HEADING, SECTION_SCAFFOLD_HEADING, message_text
+
+TTFT = float(os.getenv('ARTRESTORER_STANDIN_TTFT', 0.3))
+TOKENS_PER_SEC = float(os.getenv('ARTRESTORER_STANDIN_TOKENS_PER_SEC', 50))
+ERROR_RATE = float(os.getenv('ARTRESTORER_STANDIN_ERROR_RATE', 0))
+RATE_LIMIT_RATE = float(os.getenv('ARTRESTORER_STANDIN_429_RATE', 0))
+
+_TOKEN = re.compile(r"\s*\S+")
+
+
+class StandInConfig:
+    """Latency and failure behaviour of a stand-in server; may be changed while it runs."""
+
+    def __init__(self, ttft: float = TTFT, tokens_per_sec: float = TOKENS_PER_SEC,
+                 error_rate: float = ERROR_RATE, rate_limit_rate: float = RATE_LIMIT_RATE,
+                 seed: Optional[int] = None):
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {'ttft': self.ttft, 'tokens_per_sec': self.tokens_per_sec,
+                'error_rate': self.error_rate, 'rate_limit_rate': self.rate_limit_rate}
+
+
+def completion_text(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic completion for ``messages``, taken from the scaffold in the prompt."""
+    prompt = message_text(messages[-1]) if messages else ""
+    if SECTION_SCAFFOLD_HEADING in prompt:
+        scaffold = prompt.split(SECTION_SCAFFOLD_HEADING, 1)[1].strip()
+        # The first line is the section title, which the model is told not to repeat
+        return scaffold.split("\n", 1)[1].strip() if "\n" in scaffold else scaffold
+    if REPORT_SCAFFOLD_HEADING in prompt:
+        return prompt.split(REPORT_SCAFFOLD_HEADING, 1)[1].strip() + "\n"
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:12]
+    return f"Stand-in completion {digest} for a {len(prompt)}-character prompt."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: "StandInServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [{'id': 'stand-in', 'object': 'model', 'owned_by': 'local'}]})
+        elif self.path.rstrip('/') == '/metrics':
+            self._send_json(200, dict(self.server.metrics(), config=self.server.config.as_dict()))
+        else:
+            self._send_json(404, {'error': {'message': f"unknown path {self.path}", 'type': 'not_found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {'error': {'message': "invalid JSON body", 'type': 'invalid_request_error'}})
+            return
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"unknown path {self.path}", 'type': 'not_found'}})
+            return
+
+        outcome = self.server.draw_outcome()
+        if outcome == 'rate_limited':
+            self._send_json(429, {'error': {'message': "Rate limit reached (injected by stand-in)",
+                                            'type': 'rate_limit_error', 'code': 'rate_limit_exceeded'}},
+                            {'Retry-After': '1'})
+            return
+        if outcome == 'error':
+            self._send_json(500, {'error': {'message': "Internal error (injected by stand-in)", 'type': 'server_error'}})
+            return
+
+        config = self.server.config
+        model = request.get('model', 'stand-in')
+        tokens = _TOKEN.findall(completion_text(request.get('messages', [])))
+        completion_id = f"chatcmpl-standin-{next(self.server.completion_ids)}"
+        created = int(time.time())
+        time.sleep(config.ttft)
+
+        if not request.get('stream'):
+            time.sleep(len(tokens) / config.tokens_per_sec if config.tokens_per_sec > 0 else 0)
+            self.server.count('tokens', len(tokens))
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': "".join(tokens)},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': length // 4, 'completion_tokens': len(tokens),
+                          'total_tokens': length // 4 + len(tokens)},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            return b"data: " + json.dumps(chunk).encode('utf-8') + b"\n\n"
+
+        try:
+            self._send_chunk(event({'role': 'assistant', 'content': ""}))
+            started = time.monotonic()
+            for index, token in enumerate(tokens):
+                if config.tokens_per_sec > 0:
+                    # Pace against the start of the stream so write overhead does not accumulate
+                    delay = started + index / config.tokens_per_sec - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._send_chunk(event({'content': token}))
+                self.server.count('tokens')
+            self._send_chunk(event({}, 'stop'))
+            self._send_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.server.count('streams_completed')
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.count('streams_aborted')
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Threaded HTTP server speaking the chat-completions protocol."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: Optional[StandInConfig] = None):
+        super().__init__(address, _Handler)
+        self.config = config or StandInConfig()
+        self._counters = {'requests': 0, 'rate_limited': 0, 'errors': 0, 'tokens': 0,
+                          'streams_completed': 0, 'streams_aborted': 0}
+        # Separate from the request counter, which draw_outcome has already advanced
+        self.completion_ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            self._counters[name] += amount
+            return self._counters[name]
+
+    def draw_outcome(self) -> str:
+        """'ok', 'rate_limited' or 'error' for the next request, per the configured rates."""
+        self.count('requests')
+        with self._lock:
+            roll = self.config.random.random()
+        if roll < self.config.rate_limit_rate:
+            self.count('rate_limited')
+            return 'rate_limited'
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self.count('errors')
+            return 'error'
+        return 'ok'
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+def serve_in_thread(host: str = '127.0.0.1', port: int = 0,
+                    config: Optional[StandInConfig] = None) -> StandInServer:
+    """Start a stand-in server on a daemon thread; port 0 picks a free port."""
+    server = StandInServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="standin-server", daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m standin_server", description=__doc__.split("\n")[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttft', type=float, default=TTFT, help="seconds before the first token")
+    parser.add_argument('--tokens-per-sec', type=float, default=TOKENS_PER_SEC, help="0 sends tokens unthrottled")
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE, help="share of requests answered with 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=RATE_LIMIT_RATE, help="share of requests answered with 429")
+    parser.add_argument('--seed', type=int, help="seed for reproducible failure injection")
+    args = parser.parse_args(argv)
+    config = StandInConfig(args.ttft, args.tokens_per_sec, args.error_rate, args.rate_limit_rate, args.seed)
+    server = StandInServer((args.host, args.port), config)
+    print(f"stand-in LLM listening on {server.base_url} ({json.dumps(config.as_dict())})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
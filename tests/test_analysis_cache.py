@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import analysis_cache
+from analysis_cache import AnalysisCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(analysis_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(os.path.join(tmp_path, 'analyses.sqlite3'), ttl=60)
+
+
+def _text(n):
+    # Incompressible enough that every entry takes about the same room
+    return os.urandom(600).hex() + str(n)
+
+
+def test_entry_expires_after_its_ttl(cache, clock):
+    cache.put('key', "report")
+    clock[0] += 59
+    assert cache.get('key') == "report"
+    clock[0] += 2
+    assert cache.get('key') is None
+    assert cache.stats['expired'] == 1
+    assert cache.metrics()['entries'] == 0
+
+
+def test_per_entry_ttl_overrides_the_default(cache, clock):
+    cache.put('short', "report", ttl=1)
+    cache.put('long', "report")
+    clock[0] += 2
+    assert cache.get('short') is None
+    assert cache.get('long') == "report"
+
+
+def test_least_recently_used_entry_is_evicted_first(cache, clock):
+    cache.put('a', _text(1))
+    cache.max_bytes = int(cache.metrics()['bytes'] * 2.5)
+    clock[0] += 1
+    cache.put('b', _text(2))
+    clock[0] += 1
+    # Reading `a` makes `b` the least recently used
+    assert cache.get('a') is not None
+    clock[0] += 1
+    cache.put('c', _text(3))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.stats['evictions'] == 1
+    assert cache.metrics()['bytes'] <= cache.max_bytes
+
+
+def test_expired_entries_are_dropped_before_live_ones_are_evicted(cache, clock):
+    cache.put('old', _text(1), ttl=1)
+    cache.max_bytes = int(cache.metrics()['bytes'] * 1.5)
+    clock[0] += 2
+    cache.put('new', _text(2))
+    assert cache.get('new') is not None
+    assert cache.stats['evictions'] == 0
@@ -0,0 +1,65 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from analysis_cache import AnalysisCache
+from image_index import _TAIL, ImageIndex
+from images import ImageStore, StoredImage
+
+RADIUS = 10
+
+
+@pytest.fixture
+def index(tmp_path):
+    cache = AnalysisCache(os.path.join(tmp_path, 'analyses.sqlite3'))
+    return ImageIndex(cache, ImageStore(os.path.join(tmp_path, 'images')), radius=RADIUS)
+
+
+def _flip(value, bits, rng):
+    for bit in rng.choice(64, size=bits, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+
+def _image(digest):
+    return StoredImage(digest, "", digest, 0, 'PNG', 1, 1)
+
+
+@pytest.mark.parametrize('others', [0, 2 * _TAIL])
+def test_matches_are_exactly_the_hashes_within_the_radius(index, others):
+    # With more than _TAIL other hashes, lookups go through the sorted word tables
+    rng = np.random.default_rng(0)
+    base = int(rng.integers(0, 1 << 63)) << 1 | 1
+    near = {f"near-{bits}-{n}": _flip(base, bits, rng) for bits in range(RADIUS + 1) for n in range(20)}
+    far = {f"far-{bits}-{n}": _flip(base, bits, rng) for bits in range(RADIUS + 1, RADIUS + 6) for n in range(20)}
+    noise = {f"noise-{n}": int(value) for n, value in enumerate(rng.integers(0, 1 << 63, size=others))}
+    hashes = {'base': base, **near, **far, **noise}
+    # Same dHash everywhere, so only the pHash distance decides
+    index._append(list(hashes), list(hashes), np.array(list(hashes.values()), dtype=np.uint64),
+                  np.zeros(len(hashes), dtype=np.uint64))
+    found = index.matches(_image('base'))
+    assert {digest for digest, _, _ in found} == {'base', *near}
+    assert [distance for _, _, distance in found] == sorted(distance for _, _, distance in found)
+    assert found[0] == ('base', 'base', 0)
+
+
+def test_different_dhash_is_not_a_match(index):
+    index._append(['a', 'b'], ['a', 'b'], np.array([5, 5], dtype=np.uint64),
+                  np.array([0, (1 << 64) - 1], dtype=np.uint64))
+    assert [digest for digest, _, _ in index.matches(_image('a'))] == ['a']
+
+
+def test_resized_copy_matches(index):
+    blocks = np.random.default_rng(0).integers(0, 256, size=(12, 16, 3), dtype=np.uint8)
+    original = Image.fromarray(blocks).resize((640, 480), Image.Resampling.BILINEAR)
+    stored = []
+    for name, image, image_format in [("original.png", original, 'PNG'),
+                                      ("copy.jpg", original.resize((320, 240)), 'JPEG')]:
+        buffer = io.BytesIO()
+        image.save(buffer, image_format)
+        stored.append(index.store.ingest(buffer, name))
+        index.add(stored[-1])
+    assert [name for _, name, _ in index.matches(stored[0])] == ["original.png", "copy.jpg"]
@@ -0,0 +1,40 @@
+import pytest
+
+from report import build_template_report
+from report_html import MARKUP, format_report, render_report, report_html
+from report_model import parse_report
+
+ATTACK = "<script>alert('x')</script> & <img src=x onerror=alert(1)>"
+
+
+def _report(description):
+    return parse_report(build_template_report({'description': description, 'art_style': "Baroque",
+                                               'damage_type': "Water damage/stains", 'cultural_context': "",
+                                               'feature': "", 'temperature': 0.6}))
+
+
+def test_structured_report_escapes_its_text():
+    report = _report(ATTACK)
+    assert report.structured
+    markup = render_report(report)
+    assert "<script>" not in markup and "<img" not in markup
+    assert "&lt;script&gt;" in markup and "&amp;" in markup
+
+
+def test_unstructured_report_escapes_text_between_headings():
+    markup = format_report(f"CONCLUSION:\n{ATTACK}\nSolution: dry it slowly")
+    assert "<script>" not in markup and "<img" not in markup
+    assert markup.startswith(MARKUP["CONCLUSION:"])
+    assert MARKUP["Solution:"] in markup
+
+
+@pytest.mark.parametrize('literal', ["Handling & Display:", "Challenge 4:", "d) RESTORATION PHASE"])
+def test_headings_with_markup_characters_are_styled(literal):
+    # The literal is matched before escaping, so "&" does not stop it being recognised
+    assert format_report(f"{literal} text") == f"{MARKUP[literal]} text"
+
+
+def test_rendering_is_memoized_by_digest():
+    report = _report("Water stains in the lower right corner")
+    assert report_html(report) is report_html(_report("Water stains in the lower right corner"))
+    assert report_html(report) == render_report(report)
@@ -0,0 +1,42 @@
+import pytest
+
+from report import SECTION_TITLES, build_template_report
+from report_model import ReportParser, parse_report
+
+REPORT = build_template_report({'description': "Water stains in the lower right corner", 'art_style': "Baroque",
+                                'damage_type': "Water damage/stains", 'cultural_context': "", 'feature': "",
+                                'temperature': 0.6})
+
+
+def _chunked(text, size):
+    parser = ReportParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed, parser.close()
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 64, 1000])
+def test_chunk_boundaries_do_not_change_the_report(size):
+    whole = parse_report(REPORT)
+    completed, report = _chunked(REPORT, size)
+    assert whole.structured
+    assert report.to_dict() == whole.to_dict()
+    # Every section but the last is completed while streaming
+    assert [section.title for section in completed] == SECTION_TITLES[:-1]
+
+
+@pytest.mark.parametrize('size', [1, 5, 1000])
+def test_stream_ending_on_a_heading_stays_structured(size):
+    text = REPORT[:REPORT.index("\nCONCLUSION:") + len("\nCONCLUSION:")]
+    _, report = _chunked(text, size)
+    assert report.structured
+    assert [section.title for section in report.sections] == SECTION_TITLES
+    assert report.section("CONCLUSION:").body == ""
+
+
+def test_output_without_the_scaffold_is_kept_whole():
+    text = "The painting shows water stains.\nNothing else to report.\n"
+    report = parse_report(text)
+    assert not report.structured
+    assert report.to_text() == text
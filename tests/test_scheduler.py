@@ -0,0 +1,70 @@
+import threading
+import time
+
+from scheduler import FairScheduler
+
+
+def _hold(scheduler, user, key, admitted, release):
+    with scheduler.slot(user, key=key):
+        admitted.append(key)
+        release.wait(5)
+
+
+def _wait_queued(scheduler, count):
+    deadline = time.monotonic() + 5
+    while scheduler.metrics()['queued'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_users_are_served_round_robin():
+    scheduler = FairScheduler(workers=1, requests_per_minute=6000, tokens_per_minute=1e9)
+    admitted, releases, threads = [], {}, []
+    blocker = threading.Event()
+    first = threading.Thread(target=_hold, args=(scheduler, 'busy', 'busy-0', admitted, blocker))
+    first.start()
+    while admitted != ['busy-0']:
+        time.sleep(0.001)
+    # The busy user queues three more requests before the quiet user queues one
+    for user, key in [('busy', 'busy-1'), ('busy', 'busy-2'), ('busy', 'busy-3'), ('quiet', 'quiet-0')]:
+        releases[key] = threading.Event()
+        releases[key].set()
+        threads.append(threading.Thread(target=_hold, args=(scheduler, user, key, admitted, releases[key])))
+        threads[-1].start()
+        _wait_queued(scheduler, len(threads))
+    assert scheduler.status('quiet-0')['position'] == 2
+    blocker.set()
+    for thread in [first, *threads]:
+        thread.join(5)
+    assert admitted == ['busy-0', 'busy-1', 'quiet-0', 'busy-2', 'busy-3']
+
+
+def test_slots_bound_concurrency():
+    scheduler = FairScheduler(workers=2, requests_per_minute=6000, tokens_per_minute=1e9)
+    admitted, release = [], threading.Event()
+    threads = [threading.Thread(target=_hold, args=(scheduler, f"user-{n}", f"key-{n}", admitted, release))
+               for n in range(3)]
+    for thread in threads:
+        thread.start()
+    _wait_queued(scheduler, 1)
+    metrics = scheduler.metrics()
+    assert (metrics['running'], metrics['queued']) == (2, 1)
+    waiting = next(f"key-{n}" for n in range(3) if f"key-{n}" not in admitted)
+    assert scheduler.status(waiting)['state'] == 'queued'
+    assert scheduler.status(admitted[0]) == {'state': 'running', 'position': 0, 'eta': 0.0}
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.metrics()['completed'] == 3
+    assert scheduler.status(waiting) is None
+
+
+def test_request_bucket_delays_admission():
+    # One request per second: the second request waits for the bucket to refill
+    scheduler = FairScheduler(workers=4, requests_per_minute=60, tokens_per_minute=1e9)
+    scheduler.request_bucket.tokens = 1
+    started = time.monotonic()
+    for _ in range(2):
+        with scheduler.slot('user'):
+            pass
+    assert time.monotonic() - started >= 0.9
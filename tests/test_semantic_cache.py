@@ -0,0 +1,78 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from analysis_cache import AnalysisCache
+from report import analysis_key
+from semantic_cache import SemanticCache, _Group, group_key
+
+
+def _inputs(description):
+    return {'description': description, 'art_style': "Baroque", 'damage_type': "Cracking",
+            'cultural_context': "", 'feature': "", 'temperature': 0.6}
+
+
+@pytest.fixture
+def semantic(tmp_path):
+    cache = AnalysisCache(os.path.join(tmp_path, 'analyses.sqlite3'))
+    return SemanticCache(cache)
+
+
+def _store(semantic, description, text):
+    inputs = _inputs(description)
+    key = analysis_key(inputs)
+    semantic.cache.put(key, text)
+    semantic.add(inputs, key)
+    return key
+
+
+def test_rewording_is_served(semantic):
+    _store(semantic, "Water stains in the lower right corner of the canvas", "stains report")
+    assert semantic.lookup(_inputs("Water staining in the lower right corner of the canvas"))[0] == "stains report"
+
+
+@pytest.mark.parametrize('stored, asked', [
+    ("Portrait of a man with flaking paint on the hands", "Portrait of a woman with flaking paint on the face"),
+    ("Portrait of a man, oil on canvas, craquelure across the hands",
+     "Portrait of a woman, oil on canvas, craquelure across the face"),
+    ("Oil painting number 3 with water stains", "Oil painting number 7 with water stains"),
+    ("Water stains in the lower right corner of the canvas", "Water stains in the lower left corner of the canvas"),
+])
+def test_other_artwork_is_not_served(semantic, stored, asked):
+    _store(semantic, stored, "other artwork")
+    assert semantic.lookup(_inputs(asked)) is None
+
+
+def test_discard_forgets_document_frequencies(semantic):
+    before = semantic._doc_freq.copy()
+    key = _store(semantic, "Landscape with river, yellowed varnish", "landscape report")
+    semantic.discard(key, _inputs("Landscape with river, yellowed varnish"))
+    assert semantic._docs == 0
+    assert np.array_equal(semantic._doc_freq, before)
+    assert semantic.metrics()['entries'] == 0
+
+
+def test_index_survives_restart(semantic):
+    _store(semantic, "Water stains in the lower right corner of the canvas", "stains report")
+    reopened = SemanticCache(semantic.cache)
+    assert reopened.lookup(_inputs("water stains in lower right corner of canvas"))[0] == "stains report"
+
+
+def test_lookup_stays_under_10ms_at_100k_entries(semantic):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100_000, semantic.dims)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    inputs = _inputs("Water stains in the lower right corner of the canvas")
+    group = _Group(semantic.dims)
+    for index, vector in enumerate(vectors):
+        group.add(f"key-{index}", vector, frozenset({'water', 'stains'}))
+    semantic._groups[group_key(inputs)] = group
+    semantic.nearest(inputs)
+    timings = []
+    for _ in range(30):
+        started = time.perf_counter()
+        semantic.nearest(inputs)
+        timings.append(time.perf_counter() - started)
+    assert np.median(timings) < 0.010
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_identical_requests_share_one_call():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def producer(publish, stats):
+        calls.append(1)
+        publish("first")
+        release.wait(5)
+        publish("second")
+        return "result"
+
+    leader = flights.join("key", producer)
+    assert leader.wait_started(5)
+    follower = flights.join("key", producer)
+    assert follower is leader
+    release.set()
+    # A subscriber that joins late still replays every item from the start
+    assert list(follower.items()) == ["first", "second"]
+    assert leader.wait() == "result"
+    assert calls == [1]
+    assert flights.stats == {'leaders': 1, 'coalesced': 1}
+    assert leader.subscribers == 2
+
+
+def test_finished_flight_is_not_joined_again():
+    flights = SingleFlight()
+    first = flights.join("key", lambda publish, stats: 1)
+    assert first.wait() == 1
+    second = flights.join("key", lambda publish, stats: 2)
+    assert second is not first
+    assert second.wait() == 2
+    assert flights.in_flight() == 0
+
+
+def test_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def producer(publish, stats):
+        publish("partial")
+        release.wait(5)
+        raise RuntimeError("upstream failed")
+
+    flight = flights.join("key", producer)
+    flights.join("key", producer)
+    release.set()
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="upstream failed"):
+            list(flight.items())
+    assert flights.in_flight() == 0
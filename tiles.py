@@ -0,0 +1,468 @@
+"""Tiled, memory-mapped access to large scans.
+
+Conservation photography (visible, UV and IR scans) produces TIFF and
+BigTIFF files of hundreds of megapixels, too large to decode in one piece.
+`open_source` reads them a band of rows, or a few tiles, at a time:
+
+* uncompressed strips and tiles are memory-mapped straight from the file,
+  so reading a region touches only the pages it covers;
+* compressed ones (LZW, Deflate, JPEG, PackBits, ...) are decoded by
+  Pillow one band at a time, by repackaging the band's strips or tiles as
+  a small TIFF of their own;
+* every other image (PNG, JPEG, planar TIFF) is decoded whole by Pillow,
+  and refused above `DECODE_MAX_PIXELS` unless JPEG can decode it reduced.
+
+`Pyramid.build` streams a source once and halves it level by level down to
+a single tile. Every level is stored as an uncompressed ``.npy`` array and
+read back through a memory map that lives only as long as the read, so a
+tile, a viewport or a working copy costs its own pixels whatever the size
+of the scan. An uncompressed TIFF serves as its own full-size level.
+"""
+import io
+import json
+import os
+import shutil
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Side of the square tiles the viewer and the pyramid are cut into
+TILE = 256
+# Decoded bytes per band while a pyramid is built; `WORKERS` bands are in flight at once
+BAND_BYTES = 16 * 1024 * 1024
+# Largest image decoded whole (4 bytes per pixel in Pillow), for formats that cannot be read in bands
+DECODE_MAX_PIXELS = int(float(os.getenv('ARTRESTORER_DECODE_MAX_MP', 50)) * 1e6)
+# Threads decoding bands and measuring tiles; empty means one per CPU, up to 4
+WORKERS = max(1, int(os.getenv('ARTRESTORER_TILE_WORKERS') or min(4, os.cpu_count() or 1)))
+
+Box = Tuple[int, int, int, int]
+
+TIFF_MAGIC = (b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+')
+
+# TIFF field type -> (NumPy type code, values per count)
+_FIELD_TYPES = {1: ('u1', 1), 2: ('u1', 1), 3: ('u2', 1), 4: ('u4', 1), 5: ('u4', 2), 6: ('i1', 1),
+                7: ('u1', 1), 8: ('i2', 1), 9: ('i4', 1), 10: ('i4', 2), 11: ('f4', 1), 12: ('f8', 1),
+                13: ('u4', 1), 16: ('u8', 1), 17: ('i8', 1), 18: ('u8', 1)}
+_LONG = 4
+_LONG8_TYPES = (16, 17, 18)
+
+WIDTH, LENGTH, BITS, COMPRESSION, PHOTOMETRIC = 256, 257, 258, 259, 262
+STRIP_OFFSETS, SAMPLES, ROWS_PER_STRIP, STRIP_COUNTS, PLANAR = 273, 277, 278, 279, 284
+TILE_WIDTH, TILE_LENGTH, TILE_OFFSETS, TILE_COUNTS, SAMPLE_FORMAT = 322, 323, 324, 325, 339
+FILL_ORDER = 266
+# Tags describing the pixel encoding, copied into the small TIFF a band is decoded from
+_BAND_TAGS = (BITS, COMPRESSION, PHOTOMETRIC, FILL_ORDER, SAMPLES, ROWS_PER_STRIP, PLANAR,
+              317, 320, TILE_WIDTH, TILE_LENGTH, 338, SAMPLE_FORMAT, 347, 529, 530, 531, 532)
+
+
+def is_tiff(path: str) -> bool:
+    with open(path, 'rb') as fh:
+        return fh.read(4) in TIFF_MAGIC
+
+
+def to_rgb(image: Image.Image) -> Image.Image:
+    """``image`` in RGB, with any transparency flattened onto white."""
+    if image.mode in ('RGBA', 'LA', 'P', 'PA'):
+        image = image.convert('RGBA')
+        flattened = Image.new('RGB', image.size, (255, 255, 255))
+        flattened.paste(image, mask=image.getchannel('A'))
+        return flattened
+    if image.mode.startswith('I;16'):
+        # Pillow clips 16-bit greys when converting; keep the top byte instead
+        image = Image.fromarray((np.asarray(image) >> 8).astype(np.uint8))
+    return image if image.mode == 'RGB' else image.convert('RGB')
+
+
+class TiffSource:
+    """The first image of a TIFF or BigTIFF file, read region by region.
+
+    Only the header and the strip/tile tables are read when it is opened.
+    ``banded`` is False for layouts it cannot read in parts (separate
+    colour planes, floating-point samples); `open_source` decodes those whole.
+    """
+
+    format = 'TIFF'
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fh:
+            header = fh.read(16)
+            if header[:4] not in TIFF_MAGIC:
+                raise ValueError("not a TIFF file")
+            self.order = '<' if header[:2] == b'II' else '>'
+            self.big = header[2:4] in (b'+\x00', b'\x00+')
+            if self.big:
+                offset = struct.unpack(self.order + 'Q', header[8:16])[0]
+            else:
+                offset = struct.unpack(self.order + 'I', header[4:8])[0]
+            try:
+                self.tags = self._read_ifd(fh, offset)
+            except (struct.error, IndexError) as exc:
+                raise ValueError("damaged TIFF directory") from exc
+        self.width = self.value(WIDTH)
+        self.height = self.value(LENGTH)
+        self.samples = self.value(SAMPLES, 1)
+        self.bits = int(self.values(BITS, [1])[0])
+        self.compression = self.value(COMPRESSION, 1)
+        self.photometric = self.value(PHOTOMETRIC, 1 if self.samples < 3 else 2)
+        self.tiled = TILE_OFFSETS in self.tags
+        if self.tiled:
+            self.chunk_width, self.chunk_height = self.value(TILE_WIDTH), self.value(TILE_LENGTH)
+            self.offsets, self.counts = self.values(TILE_OFFSETS), self.values(TILE_COUNTS)
+        else:
+            self.chunk_width = self.width
+            self.chunk_height = min(self.value(ROWS_PER_STRIP, self.height), self.height)
+            self.offsets, self.counts = self.values(STRIP_OFFSETS), self.values(STRIP_COUNTS)
+        self.across = -(-self.width // self.chunk_width)
+        if not self.width or not self.height or not len(self.offsets):
+            raise ValueError("TIFF file has no image data")
+        self.banded = ((self.samples == 1 or self.value(PLANAR, 1) == 1)
+                       and self.value(SAMPLE_FORMAT, 1) == 1 and self.bits in (1, 2, 4, 8, 16))
+        # Uncompressed 8/16-bit greys and RGB are mapped, not decoded
+        self.memory_mapped = (self.banded and self.compression == 1 and self.bits in (8, 16)
+                              and self.photometric in (0, 1, 2) and self.value(FILL_ORDER, 1) == 1)
+        # One block of rows in file order: the whole image maps as one array
+        ends = self.offsets[:-1] + self.counts[:-1]
+        self.contiguous = self.memory_mapped and not self.tiled and bool(np.all(ends == self.offsets[1:]))
+
+    def _read_ifd(self, fh, offset: int) -> Dict[int, Tuple[int, int, bytes]]:
+        entry_size, count_format, inline = (20, 'Q', 8) if self.big else (12, 'H', 4)
+        fh.seek(offset)
+        count_size = 8 if self.big else 2
+        (count,) = struct.unpack(self.order + count_format, fh.read(count_size))
+        table = fh.read(entry_size * count)
+        tags = {}
+        for index in range(count):
+            entry = table[index * entry_size:(index + 1) * entry_size]
+            tag, field_type = struct.unpack(self.order + 'HH', entry[:4])
+            if field_type not in _FIELD_TYPES:
+                continue
+            values = struct.unpack(self.order + ('Q' if self.big else 'I'), entry[4:4 + inline])[0]
+            code, per_count = _FIELD_TYPES[field_type]
+            size = values * per_count * np.dtype(code).itemsize
+            if size <= inline:
+                raw = entry[4 + inline:4 + inline + size]
+            else:
+                (pointer,) = struct.unpack(self.order + ('Q' if self.big else 'I'), entry[4 + inline:])
+                position = fh.tell()
+                fh.seek(pointer)
+                raw = fh.read(size)
+                fh.seek(position)
+            tags[tag] = (field_type, values, raw)
+        return tags
+
+    def values(self, tag: int, default=None) -> np.ndarray:
+        if tag not in self.tags:
+            return np.asarray(default if default is not None else [], dtype=np.int64)
+        field_type, _, raw = self.tags[tag]
+        return np.frombuffer(raw, dtype=self.order + _FIELD_TYPES[field_type][0]).astype(np.int64)
+
+    def value(self, tag: int, default: int = 0) -> int:
+        values = self.values(tag)
+        return int(values[0]) if len(values) else default
+
+    def read(self, box: Box) -> np.ndarray:
+        """Pixels of ``box`` (left, top, right, bottom) as an RGB ``uint8`` array."""
+        x0, y0, x1, y1 = box
+        if self.contiguous:
+            return self._to_rgb(self._map(self.offsets[0], self.height, self.width)[y0:y1, x0:x1])
+        out = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        first_row, last_row = y0 // self.chunk_height, (y1 - 1) // self.chunk_height
+        first_col, last_col = x0 // self.chunk_width, (x1 - 1) // self.chunk_width
+        if self.memory_mapped:
+            for row in range(first_row, last_row + 1):
+                top = row * self.chunk_height
+                rows = self.chunk_height if self.tiled else min(self.chunk_height, self.height - top)
+                for col in range(first_col, last_col + 1):
+                    left = col * self.chunk_width
+                    chunk = self._map(self.offsets[row * self.across + col], rows, self.chunk_width)
+                    self._place(out, box, chunk, left, top, convert=True)
+        else:
+            left = first_col * self.chunk_width
+            self._place(out, box, self._decode(first_row, last_row, first_col, last_col), left,
+                        first_row * self.chunk_height)
+        return out
+
+    def _place(self, out: np.ndarray, box: Box, chunk: np.ndarray, left: int, top: int,
+               convert: bool = False) -> None:
+        # Copy the part of ``chunk`` (whose top-left pixel is at left, top) that falls inside ``box``
+        x0, y0, x1, y1 = box
+        cx0, cy0 = max(x0, left), max(y0, top)
+        cx1, cy1 = min(x1, left + chunk.shape[1], self.width), min(y1, top + chunk.shape[0], self.height)
+        if cx0 < cx1 and cy0 < cy1:
+            part = chunk[cy0 - top:cy1 - top, cx0 - left:cx1 - left]
+            out[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0] = self._to_rgb(part) if convert else part
+
+    def _map(self, offset: int, rows: int, width: int) -> np.ndarray:
+        dtype = np.dtype(self.order + ('u1' if self.bits == 8 else 'u2'))
+        # The map is released as soon as the caller's slice has been copied out of it
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=int(offset), shape=(rows, width, self.samples))
+
+    def _to_rgb(self, pixels: np.ndarray) -> np.ndarray:
+        if pixels.dtype != np.uint8:
+            pixels = (pixels >> 8).astype(np.uint8)
+        if self.photometric == 0:
+            pixels = 255 - pixels
+        if self.samples < 3:
+            return np.repeat(pixels[..., :1], 3, axis=2)
+        # A copy, never a view that would keep the file mapped
+        return np.array(pixels[..., :3])
+
+    def _decode(self, first_row: int, last_row: int, first_col: int, last_col: int) -> np.ndarray:
+        # The chunks in these rows and columns, repackaged as a TIFF of their own and decoded by Pillow
+        top = first_row * self.chunk_height
+        rows = min((last_row + 1) * self.chunk_height, self.height) - top
+        left = first_col * self.chunk_width
+        width = min((last_col + 1) * self.chunk_width, self.width) - left
+        indices = [row * self.across + col for row in range(first_row, last_row + 1)
+                   for col in range(first_col, last_col + 1)]
+        with open(self.path, 'rb') as fh:
+            chunks = []
+            for index in indices:
+                fh.seek(int(self.offsets[index]))
+                chunks.append(fh.read(int(self.counts[index])))
+        with Image.open(io.BytesIO(self._band_tiff(chunks, width, rows))) as image:
+            image.load()
+            return np.asarray(to_rgb(image))
+
+    def _band_tiff(self, chunks: List[bytes], width: int, rows: int) -> bytes:
+        # Classic TIFF in the source's byte order: header, chunk data, then the directory and its values
+        order = self.order
+        data = b"".join(chunks)
+        offsets, position = [], 8
+        for chunk in chunks:
+            offsets.append(position)
+            position += len(chunk)
+        fields = {}
+        for tag in _BAND_TAGS:
+            if tag in self.tags:
+                field_type, count, raw = self.tags[tag]
+                if field_type in _LONG8_TYPES:
+                    field_type, raw = _LONG, self.values(tag).astype(order + 'u4').tobytes()
+                fields[tag] = (field_type, count, raw)
+        fields[WIDTH] = (_LONG, 1, struct.pack(order + 'I', width))
+        fields[LENGTH] = (_LONG, 1, struct.pack(order + 'I', rows))
+        offsets_tag, counts_tag = (TILE_OFFSETS, TILE_COUNTS) if self.tiled else (STRIP_OFFSETS, STRIP_COUNTS)
+        fields[offsets_tag] = (_LONG, len(chunks), np.asarray(offsets, dtype=order + 'u4').tobytes())
+        fields[counts_tag] = (_LONG, len(chunks), np.asarray([len(c) for c in chunks], dtype=order + 'u4').tobytes())
+        directory = 8 + len(data) + len(data) % 2
+        values_at = directory + 2 + 12 * len(fields) + 4
+        entries, values = [], bytearray()
+        for tag in sorted(fields):
+            field_type, count, raw = fields[tag]
+            if len(raw) <= 4:
+                inline = raw.ljust(4, b'\x00')
+            else:
+                values += b'\x00' * (len(values) % 2)
+                inline = struct.pack(order + 'I', values_at + len(values))
+                values += raw
+            entries.append(struct.pack(order + 'HHI', tag, field_type, count) + inline)
+        magic = b'II*\x00' if order == '<' else b'MM\x00*'
+        return b"".join([magic, struct.pack(order + 'I', directory), data, b'\x00' * (len(data) % 2),
+                         struct.pack(order + 'H', len(entries)), *entries, b'\x00' * 4, bytes(values)])
+
+
+class PillowSource:
+    """An image Pillow decodes whole, on the first read, upright and in RGB."""
+
+    def __init__(self, path: str, max_pixels: int = DECODE_MAX_PIXELS):
+        self.path = path
+        self.max_pixels = max_pixels
+        with Image.open(path) as image:
+            self.format = image.format
+            width, height = image.size
+            orientation = image.getexif().get(0x0112)
+        self.scale = 1.0
+        if width * height > max_pixels:
+            if self.format != 'JPEG':
+                raise ValueError(f"{width}×{height} {self.format} image is too large to decode in memory; "
+                                 "save it as a TIFF to open it in parts")
+            # JPEG decodes straight to 1/2 .. 1/8 scale; the largest one within the budget is used
+            self.scale = next((s for s in (0.5, 0.25, 0.125) if width * height * s * s <= max_pixels), 0.125)
+            width, height = -(-width // int(1 / self.scale)), -(-height // int(1 / self.scale))
+        self.width, self.height = (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+        self._image: Optional[Image.Image] = None
+        self._lock = threading.Lock()
+
+    def _decoded(self) -> Image.Image:
+        with self._lock:
+            if self._image is None:
+                with Image.open(self.path) as image:
+                    if self.scale < 1:
+                        image.draft('RGB', (int(image.width * self.scale), int(image.height * self.scale)))
+                    image = to_rgb(ImageOps.exif_transpose(image))
+                    # Draft scaling rounds up; keep to the size announced when the source was opened
+                    self._image = image.crop((0, 0, self.width, self.height))
+            return self._image
+
+    def read(self, box: Box) -> np.ndarray:
+        return np.asarray(self._decoded().crop(box))
+
+
+Source = Union[TiffSource, PillowSource]
+
+
+def open_source(path: str, max_pixels: int = DECODE_MAX_PIXELS) -> Source:
+    """The image at ``path``, read in parts where its format allows; raises ValueError if it cannot be."""
+    if is_tiff(path):
+        source = TiffSource(path)
+        if source.banded:
+            return source
+    return PillowSource(path, max_pixels)
+
+
+def _halve(rows: np.ndarray) -> np.ndarray:
+    # 2x2 box average of an even number of rows; an odd last column is paired with itself
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    # Four strided adds; a reduction over a reshaped axis pair is many times slower
+    sums = rows[0::2, 0::2].astype(np.uint16)
+    sums += rows[1::2, 0::2]
+    sums += rows[0::2, 1::2]
+    sums += rows[1::2, 1::2]
+    sums += 2
+    sums >>= 2
+    return sums.astype(np.uint8)
+
+
+class _LevelWriter:
+    """Appends rows to one level's ``.npy`` file and feeds their halves to the next level."""
+
+    def __init__(self, path: Optional[str], size: Tuple[int, int], below: Optional['_LevelWriter']):
+        self.size = size
+        self.below = below
+        self.carry: Optional[np.ndarray] = None
+        self.rows = 0
+        self.file = None
+        if path is not None:
+            # Plain appends rather than a writable memory map, so written pages never count as ours
+            self.file = open(path, 'wb')
+            np.lib.format.write_array_header_1_0(self.file, {'descr': '|u1', 'fortran_order': False,
+                                                             'shape': (size[1], size[0], 3)})
+
+    def push(self, rows: np.ndarray) -> None:
+        if self.file is not None:
+            self.file.write(np.ascontiguousarray(rows).data)
+        self.rows += len(rows)
+        if self.below is None:
+            return
+        if self.carry is not None:
+            rows = np.concatenate([self.carry, rows])
+            self.carry = None
+        if len(rows) % 2:
+            self.carry = rows[-1:].copy()
+            rows = rows[:-1]
+        if len(rows):
+            self.below.push(_halve(rows))
+
+    def finish(self) -> None:
+        if self.carry is not None:
+            self.below.push(_halve(np.concatenate([self.carry, self.carry])))
+        if self.file is not None:
+            self.file.close()
+        if self.rows != self.size[1]:
+            raise ValueError(f"pyramid level has {self.rows} rows, expected {self.size[1]}")
+        if self.below is not None:
+            self.below.finish()
+
+
+class Pyramid:
+    """Every level of an image, from full size down to one tile, memory-mapped from ``directory``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, 'pyramid.json'), encoding='utf-8') as fh:
+            meta = json.load(fh)
+        self.sizes: List[Tuple[int, int]] = [tuple(size) for size in meta['sizes']]
+        # Level 0 of an uncompressed TIFF is the original file itself
+        self.source = TiffSource(meta['source']) if meta.get('source') else None
+        self._offsets = {}
+        for level in range(1 if self.source else 0, len(self.sizes)):
+            with open(self._path(level), 'rb') as fh:
+                if np.lib.format.read_magic(fh) == (1, 0):
+                    np.lib.format.read_array_header_1_0(fh)
+                else:
+                    np.lib.format.read_array_header_2_0(fh)
+                self._offsets[level] = fh.tell()
+
+    @property
+    def levels(self) -> int:
+        return len(self.sizes)
+
+    def _path(self, level: int) -> str:
+        return os.path.join(self.directory, f"{level}.npy")
+
+    @staticmethod
+    def level_sizes(width: int, height: int) -> List[Tuple[int, int]]:
+        sizes = [(width, height)]
+        while max(sizes[-1]) > TILE:
+            width, height = sizes[-1]
+            sizes.append(((width + 1) // 2, (height + 1) // 2))
+        return sizes
+
+    @classmethod
+    def build(cls, source: Source, directory: str, workers: int = WORKERS) -> 'Pyramid':
+        """Stream ``source`` once into a pyramid stored at ``directory``, replacing any partial one."""
+        sizes = cls.level_sizes(source.width, source.height)
+        in_place = isinstance(source, TiffSource) and source.memory_mapped
+        tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            writer = None
+            for level in reversed(range(len(sizes))):
+                path = None if level == 0 and in_place else os.path.join(tmp_dir, f"{level}.npy")
+                writer = _LevelWriter(path, sizes[level], writer)
+            width, height = sizes[0]
+            chunk_height = getattr(source, 'chunk_height', 1)
+            band = max(1, BAND_BYTES // (width * 3 * chunk_height)) * chunk_height
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pyramid') as pool:
+                # Bands are decoded in parallel but written in order, with a bounded number in flight
+                pending = deque()
+                for top in range(0, height, band):
+                    pending.append(pool.submit(source.read, (0, top, width, min(height, top + band))))
+                    if len(pending) > workers:
+                        writer.push(pending.popleft().result())
+                while pending:
+                    writer.push(pending.popleft().result())
+            writer.finish()
+            with open(os.path.join(tmp_dir, 'pyramid.json'), 'w', encoding='utf-8') as fh:
+                json.dump({'sizes': sizes, 'source': os.path.abspath(source.path) if in_place else None}, fh)
+            try:
+                os.replace(tmp_dir, directory)
+            except OSError:
+                # Another process finished the same pyramid first
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return cls(directory)
+
+    def read(self, level: int, box: Box) -> np.ndarray:
+        """Pixels of ``box`` at ``level`` (0 is full size) as an RGB ``uint8`` array."""
+        if level == 0 and self.source is not None:
+            return self.source.read(box)
+        x0, y0, x1, y1 = box
+        width = self.sizes[level][0]
+        rows = np.memmap(self._path(level), dtype=np.uint8, mode='r',
+                         offset=self._offsets[level] + y0 * width * 3, shape=(y1 - y0, width, 3))
+        return np.array(rows[:, x0:x1])
+
+    def tile(self, level: int, col: int, row: int) -> np.ndarray:
+        width, height = self.sizes[level]
+        return self.read(level, (col * TILE, row * TILE, min(width, (col + 1) * TILE), min(height, (row + 1) * TILE)))
+
+    def image(self, edge: int) -> Image.Image:
+        """The whole image no more than ``edge`` pixels on its longest side, from the smallest level that covers it."""
+        level = max([level for level, size in enumerate(self.sizes) if max(size) >= edge], default=0)
+        width, height = self.sizes[level]
+        image = Image.fromarray(self.read(level, (0, 0, width, height)))
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        return image
+
+    def nbytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
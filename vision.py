@@ -0,0 +1,263 @@
+"""Image input for multimodal analyses: the least image that still shows the damage.
+
+A full-resolution scan is slow to upload and expensive in image tokens, and
+the model scales it down anyway, so the cracks it was scanned for are lost.
+`prepare_image` builds the image parts of a request from the damage maps of
+`damage.assess_image` instead:
+
+* an overview of the whole artwork at low detail, for its composition and
+  the colour indicators (fading, yellowing);
+* crops of the regions of interest: the map cells where cracks, spots or
+  losses were measured, with a cell of context around them, joined into at
+  most `MAX_CROPS` boxes;
+* each crop at the smallest resolution tier that keeps its finest kind of
+  damage: `MIN_SCALE` of the working-copy scale, below which the detectors
+  in `damage` lose most of it. A crop larger than the model takes in one
+  image is sent in pieces;
+* encoded as JPEG.
+
+Image tokens follow OpenAI's accounting: a high-detail image is fitted into
+2048x2048, its short side scaled down to 768 px, and every 512-px tile of
+the result costs ``tile`` tokens on top of ``base``; a low-detail image
+costs ``base`` alone. The per-model numbers are in `TOKEN_COSTS`. The
+saving is measured against sending the original at high detail.
+"""
+import base64
+import functools
+import io
+import math
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from damage import CELL, WORK_EDGE, assess_image
+from generation import DEFAULT_MODEL
+from images import ImageError, load_rgb
+from tiles import Box, open_source
+
+ENABLED = os.getenv('ARTRESTORER_VISION', '1') != '0'
+# High-detail 512-px tiles allowed per request; crops are sent at lower tiers until they fit
+MAX_TILES = int(os.getenv('ARTRESTORER_VISION_MAX_TILES') or 8)
+MAX_CROPS = 3
+# Longest edge, in pixels, a region of interest is sent at
+TIERS = (512, 768, 1024, 1536, 2048)
+# Share of the working-copy scale each kind of damage needs to stay detectable
+MIN_SCALE = {'cracks': 1.0, 'spots': 0.5, 'losses': 0.25}
+# Share of a map cell a kind of damage has to cover for the cell to be of interest
+THRESHOLDS = {'cracks': 0.02, 'spots': 0.0005, 'losses': 0.1}
+# Crops covering more of the image than this are sent as one crop of the whole image
+WHOLE_SHARE = 0.6
+# (base, per tile) image tokens, by model name prefix; the longest matching prefix applies
+TOKEN_COSTS = {'gpt-4o-mini': (2833, 5667), 'gpt-4o': (85, 170), 'gpt-4.1': (85, 170), '': (85, 170)}
+JPEG_OPTIONS = {'quality': 85, 'optimize': True}
+
+# Largest image the model takes at high detail without scaling it down, as (long side, short side)
+_LONG, _SHORT = 2048, 768
+_OVERVIEW_EDGE = 512
+
+
+def _costs(model: str) -> Tuple[int, int]:
+    return TOKEN_COSTS[max((prefix for prefix in TOKEN_COSTS if model.startswith(prefix)), key=len)]
+
+
+def _tiles(width: float, height: float) -> int:
+    scale = min(1.0, _LONG / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, _SHORT / min(width, height))
+    return math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+def image_tokens(width: int, height: int, detail: str = 'high', model: str = DEFAULT_MODEL) -> int:
+    """Estimated input tokens of one ``width`` x ``height`` image sent at ``detail``."""
+    base, tile = _costs(model)
+    return base if detail == 'low' else base + tile * _tiles(width, height)
+
+
+def _components(mask: np.ndarray) -> List[Tuple[int, int, int, int]]:
+    # Bounding boxes (col0, row0, col1, row1), inclusive, of the 8-connected groups of set cells
+    rows, cols = mask.shape
+    seen = np.zeros_like(mask)
+    boxes = []
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack, box = [start], [start[1], start[0], start[1], start[0]]
+        while stack:
+            row, col = stack.pop()
+            box = [min(box[0], col), min(box[1], row), max(box[2], col), max(box[3], row)]
+            for r in range(max(0, row - 1), min(rows, row + 2)):
+                for c in range(max(0, col - 1), min(cols, col + 2)):
+                    if mask[r, c] and not seen[r, c]:
+                        seen[r, c] = True
+                        stack.append((r, c))
+        boxes.append(tuple(box))
+    return boxes
+
+
+def _merge(boxes: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int]]:
+    # Overlapping boxes become their union, until none overlap
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    boxes[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def regions(assessment) -> List[Tuple[Box, List[str], float]]:
+    """Boxes in working-copy pixels around the damage mapped in ``assessment``, with the kinds of damage in
+    each and its share of the damaged cells, most damaged first."""
+    if not assessment.maps:
+        return []
+    flagged = {kind: assessment.maps[kind] >= limit for kind, limit in THRESHOLDS.items()}
+    damaged = np.logical_or.reduce(list(flagged.values()))
+    total = int(damaged.sum())
+    if not total:
+        return []
+    # One cell of context all round
+    padded = np.pad(damaged, 1)
+    grown = np.logical_or.reduce([padded[dy:dy + damaged.shape[0], dx:dx + damaged.shape[1]]
+                                  for dy in range(3) for dx in range(3)])
+    width, height = assessment.size
+    found = []
+    for c0, r0, c1, r1 in _merge([tuple(map(int, box)) for box in _components(grown)]):
+        cells = (slice(r0, r1 + 1), slice(c0, c1 + 1))
+        kinds = [kind for kind in MIN_SCALE if flagged[kind][cells].any()]
+        box = (c0 * CELL, r0 * CELL, min(width, (c1 + 1) * CELL), min(height, (r1 + 1) * CELL))
+        found.append((box, kinds, int(damaged[cells].sum()) / total))
+    return sorted(found, key=lambda region: -region[2])
+
+
+def _pieces(width: float, height: float) -> Tuple[int, int]:
+    # The fewest columns and rows to cut a width x height image into so the model takes every piece unscaled
+    return min(((nx, ny) for nx in range(1, 9) for ny in range(1, 9)
+                if max(width / nx, height / ny) <= _LONG and min(width / nx, height / ny) <= _SHORT),
+               key=lambda grid: (grid[0] * grid[1], _tiles(width / grid[0], height / grid[1]) * grid[0] * grid[1]))
+
+
+def _plan(box: Box, edge: int) -> List[Tuple[Box, Tuple[int, int], str]]:
+    # (working-copy box, size sent, detail) of each piece of ``box`` sent with its long side at ``edge``
+    x0, y0, x1, y1 = box
+    scale = edge / max(x1 - x0, y1 - y0)
+    if edge <= _OVERVIEW_EDGE:
+        return [(box, (max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale))), 'low')]
+    nx, ny = _pieces((x1 - x0) * scale, (y1 - y0) * scale)
+    xs = np.linspace(x0, x1, nx + 1).round().astype(int)
+    ys = np.linspace(y0, y1, ny + 1).round().astype(int)
+    return [((int(xs[i]), int(ys[j]), int(xs[i + 1]), int(ys[j + 1])),
+             (max(1, round((xs[i + 1] - xs[i]) * scale)), max(1, round((ys[j + 1] - ys[j]) * scale))), 'high')
+            for j in range(ny) for i in range(nx)]
+
+
+def _plan_tiles(plan) -> int:
+    return sum(_tiles(*size) for _, size, detail in plan if detail == 'high')
+
+
+def _encode(image: Image.Image) -> bytes:
+    out = io.BytesIO()
+    image.save(out, 'JPEG', **JPEG_OPTIONS)
+    return out.getvalue()
+
+
+class VisionInput:
+    """The image parts of a multimodal request, with their estimated image tokens."""
+
+    def __init__(self, parts: List[Dict[str, Any]], full_tokens: int, original_bytes: int, coverage: float):
+        # label, box (working-copy pixels), size and scale as sent, detail, tokens and the JPEG under 'data'
+        self.parts = parts
+        self.tokens = sum(part['tokens'] for part in parts)
+        # What the original at high detail would have cost
+        self.full_tokens = full_tokens
+        self.original_bytes = original_bytes
+        # Share of the damaged map cells inside the crops
+        self.coverage = coverage
+
+    @property
+    def saved(self) -> int:
+        return self.full_tokens - self.tokens
+
+    @property
+    def bytes(self) -> int:
+        return sum(len(part['data']) for part in self.parts)
+
+    def summary(self) -> str:
+        crops = len(self.parts) - 1
+        shown = f"an overview and {crops} close-up(s) of the damaged areas" if crops else "an overview"
+        change = (f"{self.saved:,} fewer than the full image" if self.saved >= 0
+                  else f"{-self.saved:,} more than the full image, to keep fine damage visible")
+        return (f"The model is sent {shown}: about {self.tokens:,} image tokens, {change}; "
+                f"{self.bytes / 1024:,.0f} KB instead of {self.original_bytes / 1024:,.0f} KB")
+
+    def to_request(self, digest: str) -> Dict[str, Any]:
+        """The parts as data URLs, with the token estimates, to go into an analysis request."""
+        return {
+            'digest': digest, 'tokens': self.tokens, 'full_tokens': self.full_tokens, 'saved': self.saved,
+            'parts': [{'label': part['label'], 'detail': part['detail'],
+                       'url': "data:image/jpeg;base64," + base64.b64encode(part['data']).decode('ascii')}
+                      for part in self.parts],
+        }
+
+
+def prepare(rgb: Image.Image, assessment, full_size: Tuple[int, int], original_bytes: int = 0,
+            model: str = DEFAULT_MODEL, max_tiles: int = MAX_TILES) -> VisionInput:
+    """Image parts for the working copy ``rgb`` measured as ``assessment``, of an original of ``full_size``."""
+    width, height = rgb.size
+    found = regions(assessment)
+    kept = found[:MAX_CROPS]
+    if sum((x1 - x0) * (y1 - y0) for (x0, y0, x1, y1), _, _ in kept) > WHOLE_SHARE * width * height:
+        kinds = [kind for kind in MIN_SCALE if any(kind in region[1] for region in found)]
+        kept = [((0, 0, width, height), kinds, 1.0)]
+    # Smallest tier that keeps the finest damage in each crop, never larger than the crop itself
+    crops = []
+    for box, kinds, share in kept:
+        long_side = max(box[2] - box[0], box[3] - box[1])
+        needed = long_side * max(MIN_SCALE[kind] for kind in kinds)
+        edge = min(long_side, next((tier for tier in TIERS if tier >= needed), TIERS[-1]))
+        crops.append([box, kinds, share, edge])
+    # Over the tile budget: the crop costing the most tiles goes down a tier, until the request fits
+    plans = [_plan(box, edge) for box, _, _, edge in crops]
+    while sum(map(_plan_tiles, plans)) > max_tiles:
+        index = max(range(len(crops)), key=lambda i: _plan_tiles(plans[i]))
+        crops[index][3] = max([tier for tier in TIERS if tier < crops[index][3]] or [_OVERVIEW_EDGE])
+        plans[index] = _plan(crops[index][0], crops[index][3])
+
+    overview = rgb.copy()
+    overview.thumbnail((_OVERVIEW_EDGE, _OVERVIEW_EDGE), Image.Resampling.LANCZOS)
+    parts = [{'label': "overview of the whole artwork", 'box': (0, 0, width, height), 'size': overview.size,
+              'detail': 'low', 'tokens': image_tokens(*overview.size, 'low', model), 'data': _encode(overview)}]
+    for (_, kinds, _, edge), plan in zip(crops, plans):
+        for box, size, detail in plan:
+            piece = rgb.crop(box).resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            x0, y0, x1, y1 = box
+            parts.append({
+                'label': (f"close-up of the {' and '.join(kinds)} at x {x0 / width:.0%}-{x1 / width:.0%}, "
+                          f"y {y0 / height:.0%}-{y1 / height:.0%} of the image"),
+                'box': box, 'size': size, 'detail': detail, 'tokens': image_tokens(*size, detail, model),
+                'data': _encode(piece), 'scale': size[0] / max(1, x1 - x0),
+            })
+    coverage = sum(share for _, _, share, _ in crops) if found else 1.0
+    return VisionInput(parts, image_tokens(*full_size, 'high', model), original_bytes, min(1.0, coverage))
+
+
+@functools.lru_cache(maxsize=64)
+def prepare_image(path: str, model: str = DEFAULT_MODEL) -> VisionInput:
+    """Image parts for the image file at ``path``; stored images are named by content hash, so this is memoized."""
+    try:
+        assessment = assess_image(path)
+        source = open_source(path)
+        rgb = load_rgb(path, WORK_EDGE)
+    except (Image.DecompressionBombError, OSError, ValueError) as exc:
+        raise ImageError(f"cannot decode image: {exc}") from exc
+    return prepare(rgb, assessment, (source.width, source.height), os.path.getsize(path), model)